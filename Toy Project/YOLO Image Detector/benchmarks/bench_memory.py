@@ -0,0 +1,147 @@
+"""
+Per-stage memory profile of the detection pipeline
+
+Runs one request at a time through model load, decode, letterbox blob,
+inference, postprocessing, drawing the preview and encoding it. For every stage it
+reports the peak resident memory, how far the stage pushed RSS above
+where it started, and how much it still held afterwards, in total and
+private (anonymous) pages. File-backed pages, such as memory-mapped
+weights, are shared between processes. Each mode runs in a fresh child
+process, so LOW_MEMORY_MODE and the ORT settings apply from import time:
+
+    default  LOW_MEMORY_MODE=0
+    low      LOW_MEMORY_MODE=1
+
+A model exported with prepare_model.py --external-data shows the effect
+of memory-mapped weights in the model_load row.
+
+Example:
+    python benchmarks/bench_memory.py --model src/yolov5m.onnx --modes default,low \\
+        --resolutions 1280x720,4000x3000 --output bench_memory.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+MODES = {
+    "default": {"LOW_MEMORY_MODE": "0"},
+    "low": {"LOW_MEMORY_MODE": "1"},
+}
+
+
+def synthetic_image(width, height, seed=0):
+    """Random-texture BGR image encoded as JPEG bytes"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(max(1, height // 8), max(1, width // 8), 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def profile(model_path, resolutions, requests):
+    """Child process: profile every stage, return the report"""
+    # Imported here so LOW_MEMORY_MODE is read from this process's environment
+    from detector import (
+        create_blob, decode_upload, predictions_to_detections, render_preview,
+        session_manager
+    )
+    from rendering import encode_image
+    from memory_profile import LOW_MEMORY_MODE, MemoryProfile, release_memory, rss_bytes
+
+    memory = MemoryProfile()
+    started_rss = rss_bytes()
+    session_manager.model_path = model_path
+    with memory.stage("model_load"):
+        model = session_manager.load()
+
+    images = [
+        synthetic_image(*(int(v) for v in resolution.split("x")))
+        for resolution in resolutions
+    ]
+    for _ in range(requests):
+        for data in images:
+            with memory.stage("decode"):
+                img, _ = decode_upload(data, "never")
+            with memory.stage("preprocess"):
+                blob = create_blob(img)
+            with memory.stage("inference"):
+                outputs = model.run(blob)
+            with memory.stage("postprocess"):
+                detections = predictions_to_detections(outputs[0], img.shape)
+                del outputs, blob
+            with memory.stage("render"):
+                annotated = render_preview(img, detections)
+                del img
+            with memory.stage("encode"):
+                encode_image(annotated, in_place=True)
+                del annotated
+            if LOW_MEMORY_MODE:
+                release_memory()
+
+    to_mb = 1 / 1024 / 1024
+    return {
+        "low_memory_mode": LOW_MEMORY_MODE,
+        "startup_rss_mb": round(started_rss * to_mb, 1),
+        "final_rss_mb": round(rss_bytes() * to_mb, 1),
+        "stages": memory.report(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile peak memory per pipeline stage")
+    parser.add_argument("--model", default="yolov5m.onnx")
+    parser.add_argument("--modes", default="default,low",
+                        help=f"Comma-separated modes ({', '.join(MODES)})")
+    parser.add_argument("--resolutions", default="1280x720,4000x3000",
+                        help="Comma-separated synthetic image sizes")
+    parser.add_argument("--requests", type=int, default=3,
+                        help="Passes over the images per mode")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    resolutions = [r for r in args.resolutions.split(",") if r]
+    if args.child:
+        print(json.dumps(profile(args.model, resolutions, args.requests)))
+        return 0
+
+    results = {}
+    for mode in (m for m in args.modes.split(",") if m):
+        env = dict(os.environ, **MODES[mode])
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child",
+             "--model", args.model, "--resolutions", args.resolutions,
+             "--requests", str(args.requests)],
+            env=env, stdout=subprocess.PIPE, text=True, check=True
+        )
+        results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    for mode, result in results.items():
+        print(
+            f"{mode}: startup {result['startup_rss_mb']} MB, "
+            f"after requests {result['final_rss_mb']} MB"
+        )
+        for stage, stats in result["stages"].items():
+            print(
+                f"    {stage:<12} peak={stats['peak_rss_mb']:>7.1f}MB  "
+                f"growth={stats['peak_growth_mb']:>7.1f}MB  "
+                f"retained={stats['retained_mb']:>7.1f}MB "
+                f"(private {stats['retained_private_mb']:>6.1f}MB)"
+            )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
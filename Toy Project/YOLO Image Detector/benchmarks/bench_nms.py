@@ -0,0 +1,137 @@
+"""
+NMS benchmark: cv2.dnn.NMSBoxes vs the class-aware nms module
+
+Generates crowded scenes (clusters of overlapping boxes over 80 classes)
+at several candidate counts and times the OpenCV call used before against
+nms.non_max_suppression in class-aware, class-agnostic, soft-NMS and
+batched modes. Also checks that the class-agnostic mode keeps exactly the
+boxes OpenCV keeps.
+
+Example:
+    python benchmarks/bench_nms.py --counts 100,1000,5000,20000 --output bench_nms.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from nms import batched_nms, non_max_suppression  # noqa: E402
+
+
+def crowded_scene(count, num_classes=80, width=1920, height=1080, seed=0):
+    """Decoded (boxes, scores, class_ids) with clustered, jittered boxes"""
+    rng = np.random.default_rng(seed)
+    # Roughly 20 raw candidates per object, as YOLO produces around each one
+    objects = max(1, count // 20)
+    centers = rng.uniform((0, 0), (width, height), (objects, 2))
+    sizes = rng.uniform(20, 300, (objects, 2))
+    owner = rng.integers(0, objects, count)
+    jitter = rng.normal(0, 0.08, (count, 4))
+    wh = sizes[owner] * (1 + jitter[:, 2:])
+    xy = centers[owner] + sizes[owner] * jitter[:, :2] - wh / 2
+    boxes = np.concatenate([xy, wh], axis=1).astype(np.int32)
+    scores = rng.uniform(0.45, 1.0, count).astype(np.float32)
+    class_ids = rng.integers(0, num_classes, objects)[owner]
+    return boxes, scores, class_ids
+
+
+def time_call(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    values_ms = np.asarray(samples) * 1000
+    return {
+        "p50": round(float(np.percentile(values_ms, 50)), 3),
+        "p95": round(float(np.percentile(values_ms, 95)), 3),
+    }
+
+
+def run(count, iterations, iou_threshold, score_threshold, batch):
+    boxes, scores, class_ids = crowded_scene(count)
+    box_list, score_list = boxes.tolist(), scores.tolist()
+
+    def opencv():
+        return cv2.dnn.NMSBoxes(box_list, score_list, score_threshold, iou_threshold)
+
+    def ours(**options):
+        return non_max_suppression(
+            boxes, scores, class_ids, iou_threshold, score_threshold, **options
+        )
+
+    reference = np.asarray(opencv()).reshape(-1)
+    agnostic, _ = ours(class_agnostic=True, top_k=0, max_det=0)
+    aware, _ = ours(class_agnostic=False)
+    scenes = [crowded_scene(count, seed=seed) for seed in range(batch)]
+
+    return {
+        "boxes": count,
+        "opencv_kept": len(reference),
+        "class_aware_kept": len(aware),
+        "agnostic_matches_opencv": bool(np.array_equal(reference, agnostic)),
+        "ms": {
+            "opencv": time_call(opencv, iterations),
+            "class_agnostic": time_call(
+                lambda: ours(class_agnostic=True, top_k=0, max_det=0), iterations
+            ),
+            "class_aware": time_call(lambda: ours(class_agnostic=False), iterations),
+            "soft_nms": time_call(lambda: ours(soft=True), iterations),
+            f"opencv_x{batch}_loop": time_call(
+                lambda: [
+                    cv2.dnn.NMSBoxes(b.tolist(), s.tolist(), score_threshold, iou_threshold)
+                    for b, s, _ in scenes
+                ],
+                iterations
+            ),
+            f"batched_x{batch}": time_call(
+                lambda: batched_nms(scenes, iou_threshold, score_threshold),
+                iterations
+            ),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark NMS implementations")
+    parser.add_argument("--counts", default="100,1000,5000,20000",
+                        help="Comma-separated candidate box counts")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=4,
+                        help="Images per batched run")
+    parser.add_argument("--iou-threshold", type=float, default=0.45)
+    parser.add_argument("--score-threshold", type=float, default=0.45)
+    parser.add_argument("--output", help="Write results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = [
+        run(int(count), args.iterations, args.iou_threshold,
+            args.score_threshold, args.batch)
+        for count in args.counts.split(",") if count
+    ]
+    for result in results:
+        timings = "  ".join(
+            f"{name}={stats['p50']:.2f}ms" for name, stats in result["ms"].items()
+        )
+        print(
+            f"boxes={result['boxes']:>6}  kept(opencv/aware)="
+            f"{result['opencv_kept']}/{result['class_aware_kept']}  "
+            f"agnostic==opencv: {result['agnostic_matches_opencv']}\n    {timings}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r["agnostic_matches_opencv"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
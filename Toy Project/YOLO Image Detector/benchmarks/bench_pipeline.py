@@ -0,0 +1,277 @@
+"""
+Stage-level benchmark of the detection pipeline
+
+Times every stage of process_image separately: in-memory image decode
+(load_image, including colour conversion), letterbox blob, session.run,
+decoding of the 25,200 predictions, NMS, drawing the preview, encoding it
+(--preview-max-side, --render-format, --render-quality) and the JSON
+summary. Cases cover several input resolutions (synthetic or real images)
+and detection densities; a numeric density injects that many confident
+rows into the raw output so post-processing cost can be measured
+independently of what the model sees.
+
+Results are reported as p50/p95/p99 milliseconds and saved as JSON. Passing
+--baseline compares against a previous run and exits non-zero when any
+stage got slower than --max-regression.
+
+Example:
+    python benchmarks/bench_pipeline.py --model src/yolov5m.onnx \\
+        --resolutions 640x480,1920x1080,4000x3000 --densities 10,100,1000 \\
+        --output bench.json --baseline bench_main.json --max-regression 0.15
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from detector import (  # noqa: E402
+    INPUT_HEIGHT, INPUT_WIDTH, apply_nms, blob_buffers, count_detections,
+    create_blob, image_geometry, load_image, render_preview, session_manager,
+    summarize_detections
+)
+from postprocess import decode_predictions  # noqa: E402
+from rendering import (  # noqa: E402
+    IMAGE_FORMATS, RENDER_FORMAT, RENDER_MAX_SIDE, RENDER_QUALITY, encode_image
+)
+
+STAGES = [
+    "decode", "blob", "inference", "decode_predictions",
+    "nms", "draw", "encode", "summary",
+]
+NUM_PREDICTIONS = 25200
+NUM_OUTPUTS = 85
+
+
+def synthetic_image(width, height, seed=0):
+    """Random-texture BGR image encoded as JPEG bytes"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(max(1, height // 8), max(1, width // 8), 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def synthetic_predictions(density, seed=0):
+    """Raw (1, 25200, 85) output with `density` rows above any threshold"""
+    rng = np.random.default_rng(seed)
+    predictions = np.zeros((1, NUM_PREDICTIONS, NUM_OUTPUTS), dtype=np.float32)
+    predictions[0, :, 4] = rng.random(NUM_PREDICTIONS, dtype=np.float32) * 0.05
+    rows = rng.choice(NUM_PREDICTIONS, size=min(density, NUM_PREDICTIONS), replace=False)
+    predictions[0, rows, 0] = rng.uniform(0, INPUT_WIDTH, len(rows))
+    predictions[0, rows, 1] = rng.uniform(0, INPUT_HEIGHT, len(rows))
+    predictions[0, rows, 2:4] = rng.uniform(10, 120, (len(rows), 2))
+    predictions[0, rows, 4] = rng.uniform(0.5, 1.0, len(rows))
+    predictions[0, rows, 5 + rng.integers(0, 80, len(rows))] = rng.uniform(0.5, 1.0, len(rows))
+    return predictions
+
+
+def load_cases(args):
+    """(name, encoded image bytes) for every synthetic resolution and real image"""
+    cases = []
+    for resolution in filter(None, args.resolutions.split(",")):
+        width, height = (int(v) for v in resolution.lower().split("x"))
+        cases.append((f"synthetic-{width}x{height}", synthetic_image(width, height)))
+    if args.images:
+        for name in sorted(os.listdir(args.images))[:args.max_images]:
+            path = os.path.join(args.images, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            if cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) is not None:
+                cases.append((f"real-{name}", data))
+    return cases
+
+
+def run_case(data, density, iterations, warmup, confidence_threshold, nms_threshold, model,
+             render=(RENDER_MAX_SIDE, RENDER_FORMAT, RENDER_QUALITY)):
+    """
+    Time each stage `iterations` times and return per-stage samples in seconds
+    render is (preview max side, image format, quality)
+    """
+    max_side, image_format, quality = render
+    samples = {stage: [] for stage in STAGES}
+    fixed_predictions = None if density == "model" else synthetic_predictions(int(density))
+
+    for iteration in range(warmup + iterations):
+        timings = {}
+
+        started = time.perf_counter()
+        rgb = load_image(data)
+        timings["decode"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        blob = create_blob(rgb, blob_buffers.get(1))
+        timings["blob"] = time.perf_counter() - started
+
+        predictions = fixed_predictions
+        if model is not None:
+            started = time.perf_counter()
+            outputs = model.run(blob)
+            timings["inference"] = time.perf_counter() - started
+            if predictions is None:
+                predictions = outputs[0]
+
+        height, width = rgb.shape[:2]
+        started = time.perf_counter()
+        geometry = image_geometry(width, height)
+        boxes, scores, class_ids = decode_predictions(
+            predictions, confidence_threshold, geometry.x_factor,
+            geometry.y_factor, geometry.pad_x, geometry.pad_y
+        )[0]
+        timings["decode_predictions"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        detections = apply_nms(boxes, scores, class_ids, confidence_threshold, nms_threshold)
+        timings["nms"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        preview = render_preview(rgb, detections, max_side)
+        timings["draw"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        encode_image(preview, image_format, quality, in_place=True)
+        timings["encode"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        summarize_detections(*count_detections(detections))
+        timings["summary"] = time.perf_counter() - started
+
+        if iteration >= warmup:
+            for stage, value in timings.items():
+                samples[stage].append(value)
+    return samples
+
+
+def summarize_samples(samples):
+    report = {}
+    for stage, values in samples.items():
+        if not values:
+            continue
+        values_ms = np.asarray(values) * 1000
+        report[stage] = {
+            "p50": round(float(np.percentile(values_ms, 50)), 3),
+            "p95": round(float(np.percentile(values_ms, 95)), 3),
+            "p99": round(float(np.percentile(values_ms, 99)), 3),
+        }
+    return report
+
+
+def compare(current, baseline, metric, max_regression):
+    """List stages whose metric grew by more than max_regression (a ratio)"""
+    regressions = []
+    for case, stages in current["cases"].items():
+        for stage, stats in stages.items():
+            previous = baseline.get("cases", {}).get(case, {}).get(stage)
+            if not previous or previous[metric] <= 0:
+                continue
+            change = stats[metric] / previous[metric] - 1
+            if change > max_regression:
+                regressions.append(
+                    f"{case} / {stage}: {metric} {previous[metric]}ms -> "
+                    f"{stats[metric]}ms (+{change:.0%})"
+                )
+    return regressions
+
+
+def print_table(report):
+    print(f"{'case':<40} {'stage':<20} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for case, stages in report["cases"].items():
+        for stage in STAGES:
+            if stage in stages:
+                stats = stages[stage]
+                print(f"{case:<40} {stage:<20} {stats['p50']:>9.3f} "
+                      f"{stats['p95']:>9.3f} {stats['p99']:>9.3f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stage-level detection pipeline benchmark")
+    parser.add_argument("--model", default="yolov5m.onnx",
+                        help="ONNX model for the inference stage ('' to skip inference)")
+    parser.add_argument("--resolutions", default="640x480,1280x720,1920x1080,4000x3000",
+                        help="Comma-separated synthetic image sizes")
+    parser.add_argument("--images", help="Folder of real images to include")
+    parser.add_argument("--max-images", type=int, default=5)
+    parser.add_argument("--densities", default="model,10,100,1000",
+                        help="'model' uses real model output; numbers inject that many boxes")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--confidence-threshold", type=float, default=0.45)
+    parser.add_argument("--nms-threshold", type=float, default=0.45)
+    parser.add_argument("--preview-max-side", type=int, default=RENDER_MAX_SIDE,
+                        help="Longest side of the drawn preview (0 = decoded size)")
+    parser.add_argument("--render-format", choices=list(IMAGE_FORMATS), default=RENDER_FORMAT)
+    parser.add_argument("--render-quality", type=int, default=RENDER_QUALITY)
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--metric", choices=["p50", "p95", "p99"], default="p50")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed slowdown per stage as a ratio (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    model = None
+    if args.model:
+        session_manager.model_path = args.model
+        model = session_manager.load()
+
+    densities = [d for d in args.densities.split(",") if d]
+    if model is None:
+        densities = [d for d in densities if d != "model"]
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+        },
+        "settings": {
+            "iterations": args.iterations,
+            "confidence_threshold": args.confidence_threshold,
+            "nms_threshold": args.nms_threshold,
+            "preview_max_side": args.preview_max_side,
+            "render_format": args.render_format,
+            "render_quality": args.render_quality,
+            "model": args.model or None,
+        },
+        "cases": {},
+    }
+    for name, data in load_cases(args):
+        for density in densities:
+            samples = run_case(
+                data, density, args.iterations, args.warmup,
+                args.confidence_threshold, args.nms_threshold, model,
+                (args.preview_max_side, args.render_format, args.render_quality)
+            )
+            report["cases"][f"{name}/density-{density}"] = summarize_samples(samples)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_table(report)
+    print(f"\nSaved report to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.metric, args.max_regression)
+        if regressions:
+            print("\nStage regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo stage slower than baseline by more than {args.max_regression:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Tiled vs squashed inference: latency and recall
+
+Runs every image in a folder through the squashed single-blob path
+(tiling=never) and the tiled path (tiling=always) and reports latency
+percentiles and detection counts. With a labels folder in YOLO text
+format (one "class cx cy w h" line per object, normalized, same stem as
+the image) recall at IoU 0.5 is reported for both modes; without labels
+the squashed detections serve as the reference instead.
+
+Example:
+    python benchmarks/bench_tiling.py photos/ --labels labels/ \\
+        --model src/yolov5m.onnx --tile-size 640 --overlap 0.2 --output tiling.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from detector import run_detection, run_tiled_detection, session_manager  # noqa: E402
+from postprocess import box_iou  # noqa: E402
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+MATCH_IOU = 0.5
+
+
+def load_labels(path, width, height):
+    """YOLO-format labels as (class_ids, [left, top, width, height] boxes)"""
+    class_ids, boxes = [], []
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            cx, cy, w, h = (float(v) for v in parts[1:5])
+            class_ids.append(int(parts[0]))
+            boxes.append([(cx - w / 2) * width, (cy - h / 2) * height, w * width, h * height])
+    return np.array(class_ids, dtype=np.int64), np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def matched(reference_ids, reference_boxes, detections):
+    """Number of reference objects found by a same-class detection with IoU >= 0.5"""
+    if not len(reference_ids) or not detections:
+        return 0
+    iou = box_iou(reference_boxes, [d["box"] for d in detections])
+    same_class = reference_ids[:, None] == np.array([d["class_id"] for d in detections])[None]
+    iou[~same_class] = 0.0
+    found, used = 0, set()
+    for r in range(len(reference_ids)):
+        for d in np.argsort(-iou[r]):
+            if iou[r, d] < MATCH_IOU:
+                break
+            if d not in used:
+                used.add(d)
+                found += 1
+                break
+    return found
+
+
+def percentiles(values):
+    values_ms = np.asarray(values) * 1000
+    return {
+        "p50": round(float(np.percentile(values_ms, 50)), 2),
+        "p95": round(float(np.percentile(values_ms, 95)), 2),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare tiled and squashed inference")
+    parser.add_argument("images", help="Folder of (high-resolution) images")
+    parser.add_argument("--labels", help="Folder of YOLO-format label files")
+    parser.add_argument("--model", default="yolov5m.onnx")
+    parser.add_argument("--tile-size", type=int, default=640)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--no-full-image", action="store_true",
+                        help="Do not add the squashed whole image to the tile batch")
+    parser.add_argument("--confidence-threshold", type=float, default=0.45)
+    parser.add_argument("--nms-threshold", type=float, default=0.45)
+    parser.add_argument("--output", help="Write the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    session_manager.model_path = args.model
+    session_manager.load()
+
+    latency = {"squashed": [], "tiled": []}
+    counts = {"squashed": 0, "tiled": 0}
+    found = {"squashed": 0, "tiled": 0}
+    references = 0
+    images = 0
+    for name in sorted(os.listdir(args.images)):
+        if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        bgr = cv2.imread(os.path.join(args.images, name))
+        if bgr is None:
+            continue
+        img = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        height, width = img.shape[:2]
+
+        started = time.perf_counter()
+        squashed = run_detection(
+            img, args.confidence_threshold, args.nms_threshold, tiling="never"
+        )
+        latency["squashed"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        tiled = run_tiled_detection(
+            img, args.confidence_threshold, args.nms_threshold,
+            args.tile_size, args.overlap, not args.no_full_image
+        )
+        latency["tiled"].append(time.perf_counter() - started)
+
+        labels = None
+        if args.labels:
+            labels = load_labels(
+                os.path.join(args.labels, os.path.splitext(name)[0] + ".txt"),
+                width, height
+            )
+        if labels is None:
+            # Without ground truth, measure how much of the squashed output survives
+            labels = (
+                np.array([d["class_id"] for d in squashed], dtype=np.int64),
+                np.array([d["box"] for d in squashed], dtype=np.float64).reshape(-1, 4)
+            )
+        references += len(labels[0])
+        for mode, detections in (("squashed", squashed), ("tiled", tiled)):
+            counts[mode] += len(detections)
+            found[mode] += matched(labels[0], labels[1], detections)
+        images += 1
+
+    if not images:
+        raise SystemExit(f"No readable images in {args.images}")
+
+    report = {
+        "images": images,
+        "reference": "labels" if args.labels else "squashed detections",
+        "reference_objects": references,
+        "settings": {
+            "tile_size": args.tile_size,
+            "overlap": args.overlap,
+            "full_image": not args.no_full_image,
+        },
+    }
+    for mode in ("squashed", "tiled"):
+        report[mode] = {
+            "latency_ms": percentiles(latency[mode]),
+            "detections": counts[mode],
+            "recall": round(found[mode] / references, 4) if references else None,
+        }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
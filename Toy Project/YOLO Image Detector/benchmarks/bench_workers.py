@@ -0,0 +1,135 @@
+"""
+Execution engine benchmark: in-process vs worker processes
+
+Drives the batch scheduler with a number of concurrent clients for each
+engine configuration and reports throughput and latency percentiles, to
+pick INFERENCE_WORKERS / INFERENCE_WORKER_THREADS / BATCH_MAX_SIZE for a
+host. A configuration is WORKERSxTHREADS; 0xT runs in-process with T ORT
+intra-op threads (0 = ORT default).
+
+Example:
+    python benchmarks/bench_workers.py --model src/yolov5m.onnx \\
+        --configs 0x0,1x2,2x1 --clients 1,4,8 --requests 40 --output bench_workers.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from batching import BatchScheduler  # noqa: E402
+from session_manager import SessionManager, create_session_options  # noqa: E402
+from worker_pool import WorkerPool  # noqa: E402
+
+INPUT_SIZE = 640
+
+
+def build_engine(model, workers, threads, batch_size):
+    """(scheduler, cleanup) for one configuration"""
+    manager = SessionManager(
+        model, INPUT_SIZE, INPUT_SIZE, poll_interval=0,
+        session_options=create_session_options(intra_op_threads=threads)
+    )
+    if workers == 0:
+        manager.load()
+        backend, cleanup = manager, lambda: None
+    else:
+        backend = WorkerPool(manager, workers, threads or None)
+        backend.start()
+        cleanup = backend.stop
+    scheduler = BatchScheduler(
+        backend, max_batch_size=batch_size, stats_log_every=0,
+        concurrency=max(1, workers), max_queue_depth=0
+    )
+    return scheduler, cleanup
+
+
+def drive(scheduler, clients, requests):
+    """Send `requests` single-image blobs from `clients` threads"""
+    blob = np.random.default_rng(0).random(
+        (1, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32
+    )
+    latencies = []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            scheduler.infer(blob)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    values_ms = np.asarray(latencies) * 1000
+    return {
+        "images_per_second": round(requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(float(np.percentile(values_ms, 50)), 2),
+            "p95": round(float(np.percentile(values_ms, 95)), 2),
+            "p99": round(float(np.percentile(values_ms, 99)), 2),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare inference execution engines")
+    parser.add_argument("--model", default="yolov5m.onnx")
+    parser.add_argument("--configs", default="0x0,1x0,2x0",
+                        help="Comma-separated WORKERSxTHREADS (0 workers = in-process)")
+    parser.add_argument("--clients", default="1,4,8",
+                        help="Comma-separated concurrent client counts")
+    parser.add_argument("--requests", type=int, default=40,
+                        help="Images per (config, clients) run")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--output", help="Write results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    for config in filter(None, args.configs.split(",")):
+        workers, threads = (int(v) for v in config.lower().split("x"))
+        scheduler, cleanup = build_engine(args.model, workers, threads, args.batch_size)
+        try:
+            # Warm up the scheduler (and every worker)
+            drive(scheduler, max(1, workers), max(1, workers) * 2)
+            for clients in (int(c) for c in args.clients.split(",") if c):
+                result = drive(scheduler, clients, args.requests)
+                result.update({"workers": workers, "threads": threads, "clients": clients})
+                results.append(result)
+                print(
+                    f"workers={workers} threads={threads} clients={clients:>3}  "
+                    f"{result['images_per_second']:>7.2f} img/s  "
+                    f"p50={result['latency_ms']['p50']:>8.2f}ms  "
+                    f"p99={result['latency_ms']['p99']:>8.2f}ms"
+                )
+        finally:
+            scheduler.stop()
+            cleanup()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import atexit
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger("gradio_app")
+
+# Activity store configuration (overridable from the container environment)
+ACTIVITY_STORE_BACKEND = os.environ.get("ACTIVITY_STORE_BACKEND", "jsonl")
+ACTIVITY_LOG_PATH = os.environ.get("ACTIVITY_LOG_PATH", "")
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get("ACTIVITY_FLUSH_INTERVAL", "1"))
+ACTIVITY_BATCH_SIZE = int(os.environ.get("ACTIVITY_BATCH_SIZE", "256"))
+ACTIVITY_FEED_SIZE = int(os.environ.get("ACTIVITY_FEED_SIZE", "100"))
+
+TAIL_READ_BLOCK = 64 * 1024
+
+DEFAULT_PATHS = {
+    "jsonl": "user_activity_log.jsonl",
+    "sqlite": "user_activity_log.db",
+}
+
+
+class JsonlActivityStore:
+    """Append-only JSON Lines file, one activity entry per line"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def append_many(self, entries):
+        """Append a batch of entries with a single write and fsync"""
+        if not entries:
+            return
+        data = "".join(
+            json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries
+        )
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def iter_entries(self):
+        """Yield stored entries in insertion order, skipping corrupt lines"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.error(f"Skipping corrupt activity log line in {self.path}")
+
+    def tail(self, count):
+        """Return the last count entries, reading backwards from the end"""
+        if count <= 0 or not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            data = b""
+            # Read blocks until there are count complete lines after a newline
+            while end > 0 and data.count(b"\n") <= count:
+                start = max(0, end - TAIL_READ_BLOCK)
+                f.seek(start)
+                data = f.read(end - start) + data
+                end = start
+        entries = []
+        for line in data.splitlines()[-count:]:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return entries
+
+    def close(self):
+        pass
+
+
+class SqliteActivityStore:
+    """Embedded SQLite table of activity entries"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS activity ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "username TEXT, "
+                "timestamp TEXT, "
+                "entry TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_activity_timestamp "
+                "ON activity (timestamp)"
+            )
+            self._conn.commit()
+
+    def append_many(self, entries):
+        """Insert a batch of entries in one transaction"""
+        if not entries:
+            return
+        rows = [
+            (
+                entry.get("username"),
+                entry.get("timestamp"),
+                json.dumps(entry, ensure_ascii=False),
+            )
+            for entry in entries
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO activity (username, timestamp, entry) "
+                    "VALUES (?, ?, ?)",
+                    rows
+                )
+
+    def iter_entries(self):
+        """Yield stored entries in insertion order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT entry FROM activity ORDER BY id"
+            ).fetchall()
+        for (entry,) in rows:
+            yield json.loads(entry)
+
+    def tail(self, count):
+        """Return the last count entries in insertion order"""
+        if count <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT entry FROM activity ORDER BY id DESC LIMIT ?", (count,)
+            ).fetchall()
+        return [json.loads(entry) for (entry,) in reversed(rows)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+STORE_BACKENDS = {
+    "jsonl": JsonlActivityStore,
+    "sqlite": SqliteActivityStore,
+}
+
+
+def create_activity_store(backend=ACTIVITY_STORE_BACKEND, path=ACTIVITY_LOG_PATH):
+    """Create the configured activity store backend"""
+    if backend not in STORE_BACKENDS:
+        raise ValueError(
+            f"Unknown activity store backend: {backend} "
+            f"(expected one of {sorted(STORE_BACKENDS)})"
+        )
+    return STORE_BACKENDS[backend](path or DEFAULT_PATHS[backend])
+
+
+def migrate_json_array(legacy_path, store):
+    """
+    One-time import of the old whole-file JSON array log into the store.
+
+    The legacy file is renamed to <name>.migrated afterwards so the import
+    never runs twice.
+    """
+    if not os.path.exists(legacy_path):
+        return 0
+
+    with open(legacy_path, "r", encoding="utf-8") as f:
+        try:
+            logs = json.load(f)
+        except json.JSONDecodeError:
+            logger.error(f"Legacy activity log {legacy_path} is not valid JSON")
+            logs = []
+
+    if not isinstance(logs, list):
+        logs = []
+    store.append_many(logs)
+    os.replace(legacy_path, legacy_path + ".migrated")
+    logger.info(f"Migrated {len(logs)} activity entries from {legacy_path}")
+    return len(logs)
+
+
+class BackgroundActivityWriter:
+    """
+    Queue activity entries and write them from a background thread.
+
+    Entries are batched for up to flush_interval seconds or batch_size
+    entries, then written with one append (and one fsync) per batch, so
+    request threads never wait on disk I/O.
+    """
+
+    def __init__(self, store, flush_interval=ACTIVITY_FLUSH_INTERVAL,
+                 batch_size=ACTIVITY_BATCH_SIZE, name="activity-writer"):
+        self.store = store
+        self.name = name
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._write_loop, name=self.name,
+                    daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def log(self, entry):
+        """Queue an entry without blocking on disk"""
+        self.start()
+        self._queue.put(entry)
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        with self._start_lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.store.close()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch, markers, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self.store.append_many(batch)
+                except Exception as e:
+                    logger.error(f"Failed to write {len(batch)} activity entries: {e}")
+            for marker in markers:
+                marker.set()
+            if stop:
+                return
+
+
+class RecentActivityFeed:
+    """
+    In-memory ring buffer of the newest activity entries.
+
+    Filled once from the store's tail at startup and updated in place on
+    every logged activity, so the recent-activity table never reads disk
+    and costs the same regardless of how large the log grows.
+    """
+
+    def __init__(self, size=ACTIVITY_FEED_SIZE):
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def load(self, store):
+        """Seed the buffer with the newest entries already in the store"""
+        entries = store.tail(self._entries.maxlen)
+        entries.sort(key=lambda x: x.get('timestamp', ''))
+        with self._lock:
+            self._entries.clear()
+            self._entries.extend(_feed_row(entry) for entry in entries)
+        logger.info(f"Recent activity feed loaded with {len(entries)} entries")
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(_feed_row(entry))
+
+    def recent(self, max_entries):
+        """Newest-first [username, formatted time] rows"""
+        with self._lock:
+            rows = list(self._entries)[-max_entries:] if max_entries > 0 else []
+        rows.reverse()
+        return rows
+
+
+def _feed_row(entry):
+    """Pre-format an entry as a [username, time] table row"""
+    username = entry.get('username', 'Unknown')
+    timestamp_str = entry.get('timestamp', '')
+    try:
+        timestamp = datetime.fromisoformat(timestamp_str)
+        formatted_time = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError):
+        formatted_time = timestamp_str
+    return [username, formatted_time]
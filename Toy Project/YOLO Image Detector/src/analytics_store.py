@@ -0,0 +1,471 @@
+"""
+Detection analytics: columnar event log and incremental rollups
+
+Every UI detection request becomes one event row per detected object
+(username, timestamp, class, confidence, box area, request latency); a
+request without detections is kept as a single row without a class.
+Events are written in batches by a BackgroundActivityWriter to a
+columnar store chosen by ANALYTICS_EVENTS_FORMAT:
+- parquet: one file per batch and day under <ANALYTICS_DIR>/events/date=YYYY-MM-DD/
+  (needs pyarrow); the files of a day are compacted into one by the
+  writer thread once events of a later day arrive, and at startup
+- duckdb: an events table in <ANALYTICS_DIR>/events.duckdb (needs duckdb)
+- none: events are not kept, only the rollups
+The runtime image installs pyarrow for the default format. When the
+package of the selected format is missing, startup fails instead of
+silently dropping events; "none" is the explicit rollups-only choice.
+Either format can be queried ad hoc, e.g. with DuckDB:
+    SELECT class_name, count(*) FROM 'analytics/events/*/*.parquet' GROUP BY 1
+
+The same batches update hourly rollups in <ANALYTICS_DIR>/rollups.db
+(SQLite, stdlib) with one upsert per key: per user and hour, per class and
+hour, and per user and class. Dashboards read only the rollups, so their
+cost depends on the number of hours, users and classes in range, not on
+the number of events.
+"""
+import os
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("gradio_app")
+
+# Analytics configuration (overridable from the container environment)
+# parquet, duckdb or none (rollups only)
+ANALYTICS_EVENTS_FORMAT = os.environ.get("ANALYTICS_EVENTS_FORMAT", "parquet")
+ANALYTICS_DIR = os.environ.get("ANALYTICS_DIR", "analytics")
+# Larger batches mean fewer, bigger Parquet files; rollups lag by up to this
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL", "10"))
+ANALYTICS_BATCH_SIZE = int(os.environ.get("ANALYTICS_BATCH_SIZE", "4096"))
+
+# Rollup time buckets are ISO hours ("2024-05-01T13")
+HOUR_KEY_LENGTH = 13
+# Dashboard ranges (label, hours back; None = all time)
+ANALYTICS_RANGES = [
+    ("Last 24 hours", 24), ("Last 7 days", 24 * 7),
+    ("Last 30 days", 24 * 30), ("All time", None),
+]
+
+ROLLUP_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS user_hour ("
+    "hour TEXT NOT NULL, username TEXT NOT NULL, "
+    "requests INTEGER NOT NULL, detections INTEGER NOT NULL, "
+    "latency_ms_sum REAL NOT NULL, latency_ms_max REAL NOT NULL, "
+    "PRIMARY KEY (hour, username))",
+    "CREATE TABLE IF NOT EXISTS class_hour ("
+    "hour TEXT NOT NULL, class_name TEXT NOT NULL, "
+    "detections INTEGER NOT NULL, confidence_sum REAL NOT NULL, "
+    "confidence_min REAL NOT NULL, confidence_max REAL NOT NULL, "
+    "box_area_sum REAL NOT NULL, "
+    "PRIMARY KEY (hour, class_name))",
+    "CREATE TABLE IF NOT EXISTS user_class ("
+    "username TEXT NOT NULL, class_name TEXT NOT NULL, "
+    "detections INTEGER NOT NULL, confidence_sum REAL NOT NULL, "
+    "box_area_sum REAL NOT NULL, first_hour TEXT NOT NULL, last_hour TEXT NOT NULL, "
+    "PRIMARY KEY (username, class_name))",
+)
+UPSERT_USER_HOUR = (
+    "INSERT INTO user_hour VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (hour, username) DO UPDATE SET "
+    "requests = requests + excluded.requests, "
+    "detections = detections + excluded.detections, "
+    "latency_ms_sum = latency_ms_sum + excluded.latency_ms_sum, "
+    "latency_ms_max = MAX(latency_ms_max, excluded.latency_ms_max)"
+)
+UPSERT_CLASS_HOUR = (
+    "INSERT INTO class_hour VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (hour, class_name) DO UPDATE SET "
+    "detections = detections + excluded.detections, "
+    "confidence_sum = confidence_sum + excluded.confidence_sum, "
+    "confidence_min = MIN(confidence_min, excluded.confidence_min), "
+    "confidence_max = MAX(confidence_max, excluded.confidence_max), "
+    "box_area_sum = box_area_sum + excluded.box_area_sum"
+)
+UPSERT_USER_CLASS = (
+    "INSERT INTO user_class VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (username, class_name) DO UPDATE SET "
+    "detections = detections + excluded.detections, "
+    "confidence_sum = confidence_sum + excluded.confidence_sum, "
+    "box_area_sum = box_area_sum + excluded.box_area_sum, "
+    "first_hour = MIN(first_hour, excluded.first_hour), "
+    "last_hour = MAX(last_hour, excluded.last_hour)"
+)
+
+
+def detection_request(username, timestamp, detections, latency_ms):
+    """
+    Analytics record of one request
+    detections are detector dicts with boxes in original image pixels
+    """
+    return {
+        "username": username,
+        "timestamp": timestamp,
+        "latency_ms": round(latency_ms, 2),
+        "detections": [
+            (
+                detection["class_name"],
+                float(detection["confidence"]),
+                detection["box"][2] * detection["box"][3],
+            )
+            for detection in detections
+        ],
+    }
+
+
+def event_rows(requests):
+    """Flatten request records into column lists (one row per detection)"""
+    columns = {
+        "username": [], "timestamp": [], "class_name": [],
+        "confidence": [], "box_area": [], "latency_ms": [],
+    }
+    for request in requests:
+        timestamp = datetime.fromisoformat(request["timestamp"])
+        # A request without detections still records its latency
+        for class_name, confidence, box_area in request["detections"] or [(None, None, None)]:
+            columns["username"].append(request["username"])
+            columns["timestamp"].append(timestamp)
+            columns["class_name"].append(class_name)
+            columns["confidence"].append(confidence)
+            columns["box_area"].append(box_area)
+            columns["latency_ms"].append(request["latency_ms"])
+    return columns
+
+
+def hour_key(timestamp):
+    return timestamp[:HOUR_KEY_LENGTH]
+
+
+def range_start(hours, now=None):
+    """Hour key hours back from now (None for all time)"""
+    if hours is None:
+        return None
+    now = now or datetime.now()
+    return hour_key((now - timedelta(hours=hours)).isoformat())
+
+
+class ParquetEventSink:
+    """Event batches as Parquet files partitioned by day"""
+
+    def __init__(self, directory):
+        # Optional dependency, only needed when this format is selected
+        import pyarrow
+        import pyarrow.parquet
+
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.directory = directory
+        self.schema = pyarrow.schema([
+            ("username", pyarrow.string()),
+            ("timestamp", pyarrow.timestamp("ms")),
+            ("class_name", pyarrow.string()),
+            ("confidence", pyarrow.float32()),
+            ("box_area", pyarrow.int64()),
+            ("latency_ms", pyarrow.float32()),
+        ])
+        self._sequence = 0
+        # Latest day written; a later one means the earlier days are finished
+        self._current_day = None
+
+    def write(self, columns):
+        table = self._pa.Table.from_pydict(columns, schema=self.schema)
+        days = [timestamp.date().isoformat() for timestamp in columns["timestamp"]]
+        for day in sorted(set(days)):
+            rows = [i for i, value in enumerate(days) if value == day]
+            partition = os.path.join(self.directory, f"date={day}")
+            os.makedirs(partition, exist_ok=True)
+            self._sequence += 1
+            name = f"part-{datetime.now():%H%M%S%f}-{os.getpid()}-{self._sequence}.parquet"
+            self._pq.write_table(table.take(rows), os.path.join(partition, name))
+
+        latest = max(days)
+        if self._current_day is not None and latest > self._current_day:
+            # Day rollover: merge the finished days' batch files now rather
+            # than letting them pile up until the next restart
+            try:
+                compacted = self.compact(before_day=latest)
+                if compacted:
+                    logger.info(
+                        f"Analytics: compacted event files of {compacted} day(s)"
+                    )
+            except Exception as e:
+                # The batch itself is written; compaction is retried later
+                logger.error(f"Analytics: event compaction failed: {e}")
+        if self._current_day is None or latest > self._current_day:
+            self._current_day = latest
+
+    def compact(self, before_day=None):
+        """Merge the files of each finished day into one; returns days compacted"""
+        before_day = before_day or datetime.now().date().isoformat()
+        if not os.path.isdir(self.directory):
+            return 0
+        compacted = 0
+        for partition in sorted(os.listdir(self.directory)):
+            day = partition.partition("=")[2]
+            folder = os.path.join(self.directory, partition)
+            files = sorted(
+                name for name in os.listdir(folder) if name.endswith(".parquet")
+            )
+            if day >= before_day or len(files) < 2:
+                continue
+            table = self._pa.concat_tables(
+                self._pq.read_table(os.path.join(folder, name), schema=self.schema)
+                for name in files
+            )
+            # Written under a name the *.parquet glob skips, then renamed;
+            # a crash before the old files are removed leaves duplicates,
+            # never a gap
+            merged = os.path.join(folder, "compacted.parquet.tmp")
+            self._pq.write_table(table, merged)
+            os.replace(merged, os.path.join(
+                folder, f"part-compacted-{datetime.now():%Y%m%d%H%M%S}.parquet"
+            ))
+            for name in files:
+                os.remove(os.path.join(folder, name))
+            compacted += 1
+        return compacted
+
+    def close(self):
+        pass
+
+
+class DuckdbEventSink:
+    """Events appended to a DuckDB table"""
+
+    def __init__(self, path):
+        # Optional dependency, only needed when this format is selected
+        import duckdb
+
+        self._conn = duckdb.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "username VARCHAR, timestamp TIMESTAMP, class_name VARCHAR, "
+            "confidence REAL, box_area BIGINT, latency_ms REAL)"
+        )
+
+    def write(self, columns):
+        # One bulk insert from a DataFrame; executemany goes row by row
+        import pandas as pd
+
+        self._conn.register("batch", pd.DataFrame(columns))
+        try:
+            self._conn.execute(
+                "INSERT INTO events SELECT username, timestamp, class_name, "
+                "confidence, box_area, latency_ms FROM batch"
+            )
+        finally:
+            self._conn.unregister("batch")
+
+    def compact(self, before_day=None):
+        return 0
+
+    def close(self):
+        self._conn.close()
+
+
+class RollupStore:
+    """Hourly rollups in SQLite, updated incrementally per ingested batch"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in ROLLUP_SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+
+    def ingest(self, requests):
+        """Fold a batch of request records into the rollups in one transaction"""
+        user_hour = defaultdict(lambda: [0, 0, 0.0, 0.0])
+        class_hour = defaultdict(lambda: [0, 0.0, 1.0, 0.0, 0.0])
+        user_class = defaultdict(lambda: [0, 0.0, 0.0, None, None])
+        for request in requests:
+            hour = hour_key(request["timestamp"])
+            username = request["username"]
+            latency_ms = request["latency_ms"]
+
+            row = user_hour[(hour, username)]
+            row[0] += 1
+            row[1] += len(request["detections"])
+            row[2] += latency_ms
+            row[3] = max(row[3], latency_ms)
+            for class_name, confidence, box_area in request["detections"]:
+                row = class_hour[(hour, class_name)]
+                row[0] += 1
+                row[1] += confidence
+                row[2] = min(row[2], confidence)
+                row[3] = max(row[3], confidence)
+                row[4] += box_area
+
+                row = user_class[(username, class_name)]
+                row[0] += 1
+                row[1] += confidence
+                row[2] += box_area
+                row[3] = min(row[3] or hour, hour)
+                row[4] = max(row[4] or hour, hour)
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    UPSERT_USER_HOUR, [key + tuple(v) for key, v in user_hour.items()]
+                )
+                self._conn.executemany(
+                    UPSERT_CLASS_HOUR, [key + tuple(v) for key, v in class_hour.items()]
+                )
+                self._conn.executemany(
+                    UPSERT_USER_CLASS, [key + tuple(v) for key, v in user_class.items()]
+                )
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def hourly(self, start=None, end=None, username=None):
+        """Requests, detections and latency per hour"""
+        where, params = _range_filter(start, end)
+        if username:
+            where.append("username = ?")
+            params.append(username)
+        return self._query(
+            "SELECT hour, SUM(requests) AS requests, SUM(detections) AS detections, "
+            "ROUND(SUM(latency_ms_sum) / SUM(requests), 2) AS avg_latency_ms, "
+            "MAX(latency_ms_max) AS max_latency_ms "
+            f"FROM user_hour {_where(where)} GROUP BY hour ORDER BY hour",
+            params
+        )
+
+    def users(self, start=None, end=None):
+        """Requests, detections and latency per user"""
+        where, params = _range_filter(start, end)
+        return self._query(
+            "SELECT username, SUM(requests) AS requests, SUM(detections) AS detections, "
+            "ROUND(SUM(latency_ms_sum) / SUM(requests), 2) AS avg_latency_ms, "
+            "MAX(hour) AS last_hour "
+            f"FROM user_hour {_where(where)} GROUP BY username "
+            "ORDER BY detections DESC, username",
+            params
+        )
+
+    def classes(self, start=None, end=None, username=None):
+        """
+        Detections, confidence and box area per class
+        Per-user breakdowns come from the all-time user/class rollup
+        """
+        if username:
+            return self._query(
+                "SELECT class_name, detections, "
+                "ROUND(confidence_sum / detections, 3) AS avg_confidence, "
+                "ROUND(box_area_sum / detections) AS avg_box_area, "
+                "first_hour, last_hour "
+                "FROM user_class WHERE username = ? ORDER BY detections DESC",
+                (username,)
+            )
+        where, params = _range_filter(start, end)
+        return self._query(
+            "SELECT class_name, SUM(detections) AS detections, "
+            "ROUND(SUM(confidence_sum) / SUM(detections), 3) AS avg_confidence, "
+            "ROUND(MIN(confidence_min), 3) AS min_confidence, "
+            "ROUND(MAX(confidence_max), 3) AS max_confidence, "
+            "ROUND(SUM(box_area_sum) / SUM(detections)) AS avg_box_area "
+            f"FROM class_hour {_where(where)} GROUP BY class_name "
+            "ORDER BY detections DESC, class_name",
+            params
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _range_filter(start, end):
+    where, params = [], []
+    if start:
+        where.append("hour >= ?")
+        params.append(start)
+    if end:
+        where.append("hour <= ?")
+        params.append(end)
+    return where, params
+
+
+def _where(conditions):
+    return ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+
+class AnalyticsStore:
+    """
+    Event sink plus rollups, written through a BackgroundActivityWriter
+
+    append_many() takes detection_request() records; the query methods
+    only read the rollups.
+    """
+
+    def __init__(self, rollups, events=None):
+        self.rollups = rollups
+        self.events = events
+
+    def append_many(self, requests):
+        if not requests:
+            return
+        # Rollups first: dashboards stay current even if the event sink fails
+        self.rollups.ingest(requests)
+        if self.events is not None:
+            self.events.write(event_rows(requests))
+
+    def summary(self, hours=None, username=None):
+        """Hourly series, per-user and per-class tables for the last hours"""
+        start = range_start(hours)
+        return {
+            "start_hour": start,
+            "hourly": self.rollups.hourly(start, username=username),
+            "users": self.rollups.users(start),
+            "classes": self.rollups.classes(start, username=username),
+        }
+
+    def compact(self):
+        if self.events is None:
+            return 0
+        compacted = self.events.compact()
+        if compacted:
+            logger.info(f"Analytics: compacted event files of {compacted} day(s)")
+        return compacted
+
+    def close(self):
+        self.rollups.close()
+        if self.events is not None:
+            self.events.close()
+
+
+EVENT_SINKS = {
+    "parquet": lambda directory: ParquetEventSink(os.path.join(directory, "events")),
+    "duckdb": lambda directory: DuckdbEventSink(os.path.join(directory, "events.duckdb")),
+    "none": lambda directory: None,
+}
+
+
+def create_analytics_store(events_format=ANALYTICS_EVENTS_FORMAT,
+                           directory=ANALYTICS_DIR):
+    """
+    Create the analytics store; raises RuntimeError when the optional
+    dependency of the selected format is not installed
+    """
+    if events_format not in EVENT_SINKS:
+        raise ValueError(
+            f"Unknown analytics events format: {events_format} "
+            f"(expected one of {sorted(EVENT_SINKS)})"
+        )
+    os.makedirs(directory, exist_ok=True)
+    try:
+        events = EVENT_SINKS[events_format](directory)
+    except ImportError as e:
+        raise RuntimeError(
+            f"Analytics events format {events_format} is unavailable ({e}); "
+            f"install its package or set ANALYTICS_EVENTS_FORMAT=none to keep "
+            f"only the rollups"
+        ) from e
+    return AnalyticsStore(RollupStore(os.path.join(directory, "rollups.db")), events)
@@ -0,0 +1,200 @@
+import os
+import json
+import base64
+import asyncio
+import logging
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from detector import (
+    count_detections, decode_upload, model_registry, render_preview,
+    rescale_detections, run_detection, summarize_detections
+)
+from rendering import RENDER_MAX_SIDE, check_format, encode_image, media_type
+from tiling import TILING_MODE
+from memory_profile import LOW_MEMORY_MODE, release_memory
+from batching import DeadlineExceededError, QueueFullError, request_deadline
+from metrics import (
+    create_metrics_app, record_detections, stage_timer, track_request
+)
+
+logger = logging.getLogger("gradio_app")
+
+# Default quality of annotated images returned when annotate=true
+# (JPEG or WebP; PNG is lossless and ignores it)
+API_IMAGE_QUALITY = int(os.environ.get("API_IMAGE_QUALITY", "90"))
+
+
+def detect_image_bytes(data, confidence_threshold=0.45, nms_threshold=0.45,
+                       annotate=False, tiling=TILING_MODE, model=None,
+                       max_side=RENDER_MAX_SIDE, image_format="jpeg",
+                       quality=API_IMAGE_QUALITY):
+    """
+    Run detection on encoded image bytes
+    model is a model_registry entry (the routed default if None)
+    Returns (result dict, annotated image bytes or None); the annotated
+    image is a preview no larger than max_side in image_format
+    """
+    model = model or model_registry.route()
+    # Decoded in memory; large JPEGs at reduced resolution (see image_decode.py)
+    with stage_timer("preprocess"):
+        img, (width, height) = decode_upload(data, tiling)
+    detections = run_detection(
+        img, confidence_threshold, nms_threshold, tiling, model
+    )
+    detected_objects_count, detected_objects_confidences = count_detections(
+        detections
+    )
+    record_detections(detected_objects_count)
+    detection_json = summarize_detections(
+        detected_objects_count, detected_objects_confidences
+    )
+    result = {
+        "model": model.key,
+        "width": width,
+        "height": height,
+        "detections": rescale_detections(detections, img.shape, (width, height)),
+        "summary": detection_json
+    }
+    annotated = None
+    if annotate:
+        with stage_timer("render"):
+            preview = render_preview(img, detections, max_side)
+        del img
+        with stage_timer("encode"):
+            annotated = encode_image(preview, image_format, quality, in_place=True)
+        del preview
+    else:
+        del img
+    if LOW_MEMORY_MODE:
+        release_memory()
+    return result, annotated
+
+
+async def _read_uploads(request):
+    """
+    Collect (filename, bytes) pairs from a raw or multipart request body
+    Returns (uploads, is_multipart)
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        uploads = []
+        for _, value in form.multi_items():
+            if hasattr(value, "read"):
+                uploads.append((value.filename, await value.read()))
+        return uploads, True
+    body = await request.body()
+    return ([(None, body)] if body else []), False
+
+
+def create_api_app(analytics_store=None):
+    """
+    Headless detection API served next to the Gradio UI
+
+    POST /v1/detect accepts raw JPEG/PNG bytes or a multipart request with
+    one or more image files and returns detections plus the same summary
+    the UI shows, without rendering. tiling=auto|always|never controls
+    tiled inference for large images. latency_budget_ms, quality
+    (fast|balanced|best) or model (e.g. yolov5s@480) pick the registry model
+    (see model_registry.py). With annotate=true a single raw image
+    is answered with an annotated image (summary in the X-Detection-Summary
+    header); multipart results carry it base64-encoded per image instead.
+    The annotated image is a preview no larger than preview_max_side
+    (0 = decoded size) encoded as image_format (jpeg|webp|png) at
+    image_quality. Without annotate the response is boxes only, in
+    original image pixels, for clients that draw their own.
+
+    GET /v1/analytics returns the hourly, per-user and per-class rollups of
+    analytics_store for the last `hours` (all time if 0), optionally for
+    one username.
+    """
+    api = FastAPI(title="YOLOv5 Object Detection API")
+    # Prometheus scrape target for the whole process (UI and API)
+    api.mount("/metrics", create_metrics_app())
+
+    @api.post("/v1/detect")
+    async def detect(request: Request, confidence_threshold: float = 0.45,
+                     nms_threshold: float = 0.45, annotate: bool = False,
+                     tiling: str = TILING_MODE, latency_budget_ms: float = 0,
+                     quality: str = "", model: str = "",
+                     preview_max_side: int = RENDER_MAX_SIDE,
+                     image_format: str = "jpeg",
+                     image_quality: int = API_IMAGE_QUALITY):
+        # The deadline reaches detect_image_bytes through the copied context
+        with track_request("api") as trace_id, request_deadline():
+            try:
+                route = model_registry.route(latency_budget_ms, quality, model)
+                check_format(image_format)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            render = (preview_max_side, image_format, image_quality)
+            return await _detect(
+                request, confidence_threshold, nms_threshold, annotate,
+                tiling, trace_id, route, render
+            )
+
+    if analytics_store is not None:
+        @api.get("/v1/analytics")
+        async def analytics(hours: int = 24 * 7, username: str = ""):
+            # Rollup reads are small indexed SQLite queries
+            return await run_in_threadpool(
+                analytics_store.summary, hours or None, username or None
+            )
+
+    return api
+
+
+async def _detect(request, confidence_threshold, nms_threshold, annotate,
+                  tiling, trace_id, model, render):
+    max_side, image_format, image_quality = render
+    uploads, is_multipart = await _read_uploads(request)
+    if not uploads:
+        raise HTTPException(status_code=400, detail="An image is required.")
+
+    # Run images concurrently so the batch scheduler can group them
+    tasks = [
+        run_in_threadpool(
+            detect_image_bytes, data, confidence_threshold,
+            nms_threshold, annotate, tiling, model, max_side, image_format,
+            image_quality
+        )
+        for _, data in uploads
+    ]
+    try:
+        outcomes = await asyncio.gather(*tasks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (QueueFullError, DeadlineExceededError) as e:
+        # Overloaded: fail fast so the client (or load balancer) can retry
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
+    except Exception as e:
+        logger.error(f"Error in detection API: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Error processing image: {str(e)}"
+        )
+
+    headers = {"X-Trace-Id": trace_id, "X-Model": model.key}
+    if annotate and not is_multipart:
+        result, annotated = outcomes[0]
+        headers["X-Detection-Summary"] = json.dumps(result["summary"])
+        return Response(
+            content=annotated, media_type=media_type(image_format),
+            headers=headers
+        )
+
+    results = []
+    for (filename, _), (result, annotated) in zip(uploads, outcomes):
+        if is_multipart:
+            result["filename"] = filename
+        if annotated is not None:
+            result[f"annotated_{image_format}"] = base64.b64encode(annotated).decode()
+        results.append(result)
+
+    if not is_multipart:
+        return JSONResponse(results[0], headers=headers)
+    return JSONResponse({"results": results}, headers=headers)
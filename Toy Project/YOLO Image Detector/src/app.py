@@ -1,348 +1,72 @@
 import os
-import cv2
-import numpy as np
+import time
 import gradio as gr
-import onnxruntime
-import subprocess
-import sys
 from datetime import datetime
-import json
-import pandas as pd
-import uuid
-import shutil
 import logging
+import uvicorn
 
-# Logging setup
+from batching import (
+    BATCH_MAX_SIZE, DeadlineExceededError, QueueFullError, request_deadline
+)
+from detector import (
+    batch_scheduler, count_detections, detect_and_render, detect_boxes,
+    ensure_model_exists, model_registry, session_manager, summarize_detections,
+    worker_pool
+)
+from rendering import (
+    RENDER_FORMAT, RENDER_MAX_SIDE, RENDER_QUALITY, PreviewFiles, encode_image
+)
+from video_detect import detect_stream
+from api import create_api_app
+from metrics import (
+    install_trace_id_logging, record_detections, record_error, stage_timer,
+    startup_timer, track_request, watch_batch_queue, watch_model_registry
+)
+from activity_store import (
+    BackgroundActivityWriter, RecentActivityFeed, create_activity_store,
+    migrate_json_array
+)
+from analytics_store import (
+    ANALYTICS_BATCH_SIZE, ANALYTICS_FLUSH_INTERVAL, ANALYTICS_RANGES,
+    create_analytics_store, detection_request
+)
+
+# Logging setup (trace_id ties log lines to one request)
+install_trace_id_logging()
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s',
     handlers=[logging.StreamHandler()]
 )
 logger = logging.getLogger("gradio_app")
 
 # Constants
-MODEL_PATH = "yolov5m.onnx"
-INPUT_WIDTH = 640
-INPUT_HEIGHT = 640
+# Legacy whole-file JSON log, migrated into the activity store at startup
 USER_LOG_FILE = "user_activity_log.json"
+# UI requests allowed to wait in Gradio's queue; more are turned away (0 = unbounded)
+UI_MAX_QUEUE_SIZE = int(os.environ.get("UI_MAX_QUEUE_SIZE", "32"))
+BUSY_MESSAGE = "The server is busy right now. Please try again in a moment."
+# Result views of the image tab: (label, value)
+OUTPUT_MODES = [("Preview image", "preview"), ("Boxes only (JSON)", "boxes")]
 
+# Encoded previews handed to Gradio as files (served without re-encoding)
+preview_files = PreviewFiles()
 
-def ensure_model_exists():
-    """Convert PyTorch model to ONNX if needed"""
-    if not os.path.exists(MODEL_PATH):
-        logger.info("ONNX model file does not exist. Converting from PyTorch...")
-        
-        # Install required packages
-        subprocess.check_call([
-            sys.executable, "-m", "pip", "install", 
-            "torch", "torchvision", "onnx", "gitpython"
-        ])
-        
-        # Clone yolov5 repository if needed
-        if not os.path.exists("yolov5"):
-            subprocess.check_call([
-                "git", "clone", "https://github.com/ultralytics/yolov5.git"
-            ])
-        
-        # Run conversion script
-        script = """
-import torch
-import onnx
-from pathlib import Path
-
-# Load YOLOv5 model
-model = torch.hub.load('ultralytics/yolov5', 'yolov5m', pretrained=True)
-model.eval()
-
-# Export to ONNX
-dummy_input = torch.zeros(1, 3, 640, 640)
-torch.onnx.export(
-    model.model, 
-    dummy_input, 
-    'yolov5m.onnx',
-    opset_version=12, 
-    input_names=['images'], 
-    output_names=['output'], 
-    dynamic_axes={'images': {0: 'batch'}, 'output': {0: 'batch'}}
-)
-print("ONNX model conversion complete!")
-"""
-        subprocess.check_call([sys.executable, "-c", script])
-        logger.info("ONNX model preparation complete!")
-
-
-# Load COCO class names
-CLASSES = [
-    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", 
-    "truck", "boat", "traffic light", "fire hydrant", "stop sign", 
-    "parking meter", "bench", "bird", "cat", "dog", "horse", "sheep", 
-    "cow", "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella", 
-    "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", 
-    "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", 
-    "surfboard", "tennis racket", "bottle", "wine glass", "cup", "fork", 
-    "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange", 
-    "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", 
-    "couch", "potted plant", "bed", "dining table", "toilet", "tv", 
-    "laptop", "mouse", "remote", "keyboard", "cell phone", "microwave", 
-    "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", 
-    "scissors", "teddy bear", "hair drier", "toothbrush"
-]
-
-# Colors for visualization
-COLORS = np.random.uniform(0, 255, size=(len(CLASSES), 3))
-
-
-def normalize_filename(image_path):
-    """Create a copy of the image with a normalized filename"""
-    if not os.path.exists(image_path):
-        logger.error(f"Error: File not found at {image_path}")
-        return image_path
-
-    # Get the directory and filename
-    directory = os.path.dirname(image_path)
-    extension = os.path.splitext(image_path)[1]
-
-    # Create a new filename with a UUID
-    new_filename = f"{str(uuid.uuid4())}{extension}"
-    new_path = os.path.join(directory, new_filename)
-
-    # Copy the file with the new name
-    try:
-        shutil.copy2(image_path, new_path)
-        logger.info(f"File normalized: {image_path} -> {new_path}")
-        
-        # Set file permissions
-        os.chmod(new_path, 0o644)
-        return new_path
-    except Exception as e:
-        logger.error(f"Error normalizing filename: {e}")
-        return image_path
-
-
-def preprocess_image(image):
-    """Preprocess image for YOLO model"""
-    logger.info(f"Image input type: {type(image)}")
+# Append-only activity log written off the request path
+activity_store = create_activity_store()
+activity_writer = BackgroundActivityWriter(activity_store)
 
-    # For file path inputs, normalize the filename
-    if isinstance(image, str):
-        logger.info(f"Processing image path: {image}")
-        # Check if file exists
-        if not os.path.exists(image):
-            logger.error(f"Error: Image file not found at {image}")
-            raise FileNotFoundError(f"Image file not found: {image}")
-
-        try:
-            # Load image directly with OpenCV
-            img = cv2.imread(image)
-            if img is None:
-                logger.error(
-                    f"Error: Unable to read image with OpenCV from {image}"
-                )
-                # Check file contents
-                with open(image, 'rb') as f:
-                    header = f.read(20)  # Read first 20 bytes of the file
-                    logger.info(f"File header (hex): {header.hex()}")
-                raise ValueError(f"Unable to read image with OpenCV: {image}")
-
-            # Convert BGR to RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            logger.info(f"Image loaded successfully: {image}, shape: {img.shape}")
-        except Exception as e:
-            logger.error(f"Error loading image from path: {e}")
-            raise
-    elif isinstance(image, np.ndarray):
-        # For OpenCV image (BGR format)
-        logger.info(f"NumPy array input shape: {image.shape}")
-        if image.shape[2] == 3:
-            # Convert BGR to RGB
-            img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        elif image.shape[2] == 4:  # RGBA
-            # Convert RGBA to RGB
-            img = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
-    else:
-        # For PIL image (already in RGB format)
-        logger.info(f"PIL Image or other type: {type(image)}")
-        try:
-            img = np.array(image)
-            logger.info(f"Converted to NumPy array, shape: {img.shape}")
-            if img.shape[2] == 4:  # RGBA
-                img = img[:, :, :3]  # Remove alpha channel
-        except Exception as e:
-            logger.error(f"Error converting image to NumPy array: {e}")
-            raise
-    
-    # Resize and normalize
-    try:
-        blob = cv2.dnn.blobFromImage(
-            img, 1/255.0, (INPUT_WIDTH, INPUT_HEIGHT), 
-            swapRB=False, crop=False
-        )
-        return blob, img
-    except Exception as e:
-        logger.error(f"Error in blobFromImage: {e}")
-        raise
+# Newest activity entries kept in memory for the recent-activity table
+recent_activity_feed = RecentActivityFeed()
 
-
-def detect_objects(image, confidence_threshold=0.45, nms_threshold=0.45):
-    """Detect objects in the image using ONNX model"""
-    if image is None:
-        return None, {}, {}
-
-    # Preprocess the image
-    blob, original_image = preprocess_image(image)
-    
-    # Run inference
-    session = onnxruntime.InferenceSession(
-        MODEL_PATH, providers=['CPUExecutionProvider']
-    )
-    input_name = session.get_inputs()[0].name
-    output_names = [output.name for output in session.get_outputs()]
-    outputs = session.run(output_names, {input_name: blob})
-    
-    # Process the output
-    boxes = []
-    confidences = []
-    class_ids = []
-    
-    # YOLOv5m ONNX output shape is (1, 25200, 85) where:
-    # 25200 is the number of predictions
-    # 85 = 4 (bbox coords) + 1 (objectness) + 80 (class scores for COCO)
-    predictions = outputs[0]
-    
-    # Get image dimensions
-    img_height, img_width = original_image.shape[:2]
-    
-    # Scale factors
-    x_factor = img_width / INPUT_WIDTH
-    y_factor = img_height / INPUT_HEIGHT
-    
-    for prediction in predictions[0]:
-        confidence = prediction[4]
-        
-        if confidence >= confidence_threshold:
-            # Get class scores
-            class_scores = prediction[5:]
-            # Get the class ID with the highest score
-            class_id = np.argmax(class_scores)
-            # Check if the class confidence is above threshold
-            if class_scores[class_id] > confidence_threshold:
-                # YOLO format is center_x, center_y, width, height
-                cx, cy, w, h = prediction[0:4]
-                
-                # Convert to top-left corner for cv2.rectangle
-                left = int((cx - w/2) * x_factor)
-                top = int((cy - h/2) * y_factor)
-                width = int(w * x_factor)
-                height = int(h * y_factor)
-                
-                # Add to lists
-                boxes.append([left, top, width, height])
-                confidences.append(float(confidence))
-                class_ids.append(class_id)
-    
-    # Apply non-maximum suppression
-    indices = cv2.dnn.NMSBoxes(
-        boxes, confidences, confidence_threshold, nms_threshold
-    )
-    
-    # Draw the bounding boxes and labels
-    result_image = original_image.copy()
-    
-    # Dictionary to track detected objects and confidences
-    detected_objects_count = {}
-    detected_objects_confidences = {}
-    
-    # If no results, return original image and empty dictionaries
-    if len(indices) == 0:
-        return result_image, detected_objects_count, detected_objects_confidences
-        
-    for i in indices:
-        # For newer versions of OpenCV, indices is a flat array
-        if isinstance(i, (list, tuple)):
-            i = i[0]  # For older OpenCV versions
-            
-        box = boxes[i]
-        left = box[0]
-        top = box[1]
-        width = box[2]
-        height = box[3]
-        
-        # Get the confidence value
-        confidence_value = confidences[i]
-        
-        # Get the class name
-        class_name = CLASSES[class_ids[i]]
-        
-        # Update the count for this class
-        if class_name in detected_objects_count:
-            detected_objects_count[class_name] += 1
-            detected_objects_confidences[class_name].append(confidence_value)
-        else:
-            detected_objects_count[class_name] = 1
-            detected_objects_confidences[class_name] = [confidence_value]
-        
-        # Draw bounding box
-        color = COLORS[class_ids[i]].tolist()
-        cv2.rectangle(
-            result_image, (left, top), 
-            (left + width, top + height), color, 2
-        )
-        
-        label = f"{class_name} {confidences[i]:.2f}"
-        
-        # Text position and size calculation
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.4
-        font_thickness = 1
-        
-        # Calculate text size
-        (text_width, text_height), baseline = cv2.getTextSize(
-            label, font, font_scale, font_thickness
-        )
-        
-        # Adjust text position if close to image top
-        MARGIN = 5  # Margin setting
-        
-        # If top is less than text height + baseline + margin, place text below box
-        if top < (text_height + baseline + MARGIN):
-            text_pos_x = left
-            text_pos_y = top + height + text_height + MARGIN
-        else:
-            text_pos_x = left
-            text_pos_y = top - MARGIN
-        
-        # Draw text background
-        text_bg_left = text_pos_x
-        text_bg_top = text_pos_y - text_height - baseline
-        text_bg_right = text_pos_x + text_width
-        text_bg_bottom = text_pos_y + baseline
-        
-        # Draw text background rectangle (same color as bounding box)
-        cv2.rectangle(
-            result_image, 
-            (text_bg_left, text_bg_top), 
-            (text_bg_right, text_bg_bottom), 
-            color, 
-            -1
-        )
-        
-        # Draw text in white
-        cv2.putText(
-            result_image, 
-            label, 
-            (text_pos_x, text_pos_y), 
-            font, 
-            font_scale, 
-            (255, 255, 255),
-            font_thickness, 
-            cv2.LINE_AA
-        )
-    
-    return result_image, detected_objects_count, detected_objects_confidences
+# Detection events (columnar) and their rollups, also written off the
+# request path; created at startup so importing the app touches no files
+analytics_store = None
+analytics_writer = None
 
 
 def log_user_activity(username, detected_objects=None):
-    """Log user activity to a JSON file"""
+    """Log user activity to the append-only activity store"""
     timestamp = datetime.now().isoformat()
     log_entry = {
         "username": username,
@@ -357,22 +81,9 @@ def log_user_activity(username, detected_objects=None):
         log_entry["total_detected_objects"] = total_count
         log_entry["detected_objects"] = detected_objects
     
-    # Check if log file exists
-    if os.path.exists(USER_LOG_FILE):
-        with open(USER_LOG_FILE, 'r') as f:
-            try:
-                logs = json.load(f)
-            except json.JSONDecodeError:
-                logs = []
-    else:
-        logs = []
-    
-    # Append new log entry
-    logs.append(log_entry)
-    
-    # Write back to file
-    with open(USER_LOG_FILE, 'w') as f:
-        json.dump(logs, f, indent=2)
+    # Queue the entry; the background writer appends it to the store
+    activity_writer.log(log_entry)
+    recent_activity_feed.add(log_entry)
     
     logger.info(f"User activity logged: {username} at {timestamp}")
     if detected_objects:
@@ -382,6 +93,15 @@ def log_user_activity(username, detected_objects=None):
         )
 
 
+def log_detection_analytics(username, detections, latency_ms):
+    """Queue per-detection events for the analytics store and its rollups"""
+    if analytics_writer is None:
+        return
+    analytics_writer.log(detection_request(
+        username, datetime.now().isoformat(), detections, latency_ms
+    ))
+
+
 def validate_username(username):
     """Validate that username is not empty or just whitespace"""
     if not username or not username.strip():
@@ -391,51 +111,16 @@ def validate_username(username):
 
 def get_recent_activities(max_entries=10):
     """
-    Get the most recent user activities from the log file
+    Get the most recent user activities from the in-memory feed
     Returns a pandas DataFrame for Gradio Dataframe component
     """
-    if not os.path.exists(USER_LOG_FILE):
-        # Return empty DataFrame instead of None for consistency
-        return pd.DataFrame(columns=["Username", "Time"])
-    
+    # Only needed for the table, so keep it off the import path
+    import pandas as pd
+
     try:
-        with open(USER_LOG_FILE, 'r') as f:
-            try:
-                logs = json.load(f)
-            except json.JSONDecodeError:
-                logger.error("Error decoding JSON file. Returning empty DataFrame.")
-                return pd.DataFrame(columns=["Username", "Time"])
-            
-        if not logs:
-            # Return empty DataFrame with headers only if no logs
-            return pd.DataFrame(columns=["Username", "Time"])
-            
-        # Sort by most recent activity (newest first)
-        sorted_logs = sorted(
-            logs, key=lambda x: x.get('timestamp', ''), reverse=True
-        )
-        
-        # Display only up to max_entries
-        recent_logs = sorted_logs[:max_entries]
-        
-        # Prepare data for DataFrame
-        data = []
-        for log in recent_logs:
-            username = log.get('username', 'Unknown')
-            timestamp_str = log.get('timestamp', '')
-            
-            # Format timestamp
-            try:
-                timestamp = datetime.fromisoformat(timestamp_str)
-                formatted_time = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            except (ValueError, TypeError):
-                formatted_time = timestamp_str
-                
-            data.append([username, formatted_time])
-            
-        # Create DataFrame
-        df = pd.DataFrame(data, columns=["Username", "Time"])
-        return df
+        # Newest-first rows straight from the ring buffer (no disk access)
+        data = recent_activity_feed.recent(max_entries)
+        return pd.DataFrame(data, columns=["Username", "Time"])
         
     except Exception as e:
         logger.error(f"Error getting recent activities: {e}")
@@ -443,9 +128,90 @@ def get_recent_activities(max_entries=10):
         return pd.DataFrame(columns=["Username", "Time"])
 
 
+def get_analytics(range_label="Last 7 days", username=""):
+    """
+    Dashboard data read from the analytics rollups
+    Returns (hourly DataFrame, per-user DataFrame, per-class DataFrame, status)
+    """
+    import pandas as pd
+
+    started = time.perf_counter()
+    summary = analytics_store.summary(
+        dict(ANALYTICS_RANGES).get(range_label), (username or "").strip() or None
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    hourly = pd.DataFrame(
+        summary["hourly"],
+        columns=["hour", "requests", "detections", "avg_latency_ms", "max_latency_ms"]
+    )
+    hourly["hour"] = pd.to_datetime(hourly["hour"], format="%Y-%m-%dT%H")
+    users = pd.DataFrame(
+        summary["users"],
+        columns=["username", "requests", "detections", "avg_latency_ms", "last_hour"]
+    )
+    classes = pd.DataFrame(summary["classes"])
+    status = (
+        f"{int(hourly['requests'].sum())} requests, "
+        f"{int(hourly['detections'].sum())} detections; "
+        f"read from rollups in {elapsed_ms:.1f} ms"
+    )
+    return hourly, users, classes, status
+
+
 def process_image(username, input_image, confidence_threshold=0.45, 
-                  nms_threshold=0.45):
+                  nms_threshold=0.45, output_mode="preview"):
     """Gradio interface function"""
+    # Queued inference is dropped once the user has likely given up
+    with track_request("image"), request_deadline():
+        return _process_image(
+            username, input_image, confidence_threshold, nms_threshold,
+            output_mode
+        )
+
+
+def render_result(input_image, confidence_threshold, nms_threshold):
+    """
+    Annotated preview as an encoded file
+    Returns (preview path, detections in original image pixels)
+    """
+    result_image, detections = detect_and_render(
+        input_image, confidence_threshold, nms_threshold, RENDER_MAX_SIDE
+    )
+    with stage_timer("encode"):
+        data = encode_image(
+            result_image, RENDER_FORMAT, RENDER_QUALITY, in_place=True
+        )
+        del result_image
+        path = preview_files.write(data, RENDER_FORMAT)
+    return path, detections
+
+
+def detect_result_boxes(input_image, confidence_threshold, nms_threshold):
+    """
+    Boxes for the client to draw, without rendering or encoding an image
+    Returns (box JSON, detections)
+    """
+    detections, (width, height) = detect_boxes(
+        input_image, confidence_threshold, nms_threshold
+    )
+    boxes_json = {
+        "Image Size": {"Width": width, "Height": height},
+        "Boxes": [
+            {
+                "Class": detection["class_name"],
+                "Confidence": round(detection["confidence"], 3),
+                # left, top, width, height in original image pixels
+                "Box": detection["box"],
+            }
+            for detection in detections
+        ],
+    }
+    return boxes_json, detections
+
+
+def _process_image(username, input_image, confidence_threshold, nms_threshold,
+                   output_mode):
     # Validate username
     is_valid, error_msg = validate_username(username)
     if not is_valid:
@@ -466,6 +232,7 @@ def process_image(username, input_image, confidence_threshold=0.45,
         # Check if file exists
         if not os.path.exists(input_image):
             logger.error(f"File not found: {input_image}")
+            record_error("image")
             return (None, None, 
                     f"Error: File not found at {input_image}", 
                     get_recent_activities())
@@ -480,119 +247,260 @@ def process_image(username, input_image, confidence_threshold=0.45,
 
     try:
         # Process the image
-        result = detect_objects(
-            input_image, 
-            confidence_threshold, 
-            nms_threshold
+        started = time.perf_counter()
+        if output_mode == "boxes":
+            boxes_json, detections = detect_result_boxes(
+                input_image, confidence_threshold, nms_threshold
+            )
+            result_image = None
+        else:
+            result_image, detections = render_result(
+                input_image, confidence_threshold, nms_threshold
+            )
+        latency_ms = (time.perf_counter() - started) * 1000
+        detected_objects_count, detected_objects_confidences = count_detections(
+            detections
         )
-        result_image, detected_objects_count, detected_objects_confidences = result
 
         # Format detected objects for JSON component
-        detection_json = {}
-        
-        if detected_objects_count:
-            # Add total count
-            total_count = sum(detected_objects_count.values())
-            detection_json["Total Objects Detected"] = total_count
-            
-            # Add count by object class with confidence statistics
-            objects_dict = {}
-            for obj_class, count in sorted(
-                detected_objects_count.items(), 
-                key=lambda x: x[1], reverse=True
-            ):
-                # Calculate confidence statistics
-                confidences = detected_objects_confidences[obj_class]
-                
-                # Calculate statistics (average, min, max)
-                avg_conf = sum(confidences) / len(confidences)
-                min_conf = min(confidences)
-                max_conf = max(confidences)
-                
-                # Round to 2 decimal places for better display
-                avg_conf = round(avg_conf, 2)
-                min_conf = round(min_conf, 2)
-                max_conf = round(max_conf, 2)
-                
-                # Store object count and confidence statistics
-                objects_dict[f"{obj_class}"] = {
-                    "Count": count,
-                    "Confidence Stats": {
-                        "Average": avg_conf,
-                        "Min": min_conf,
-                        "Max": max_conf
-                    }
-                }
-                
-            detection_json["Detected Objects List"] = objects_dict
-        else:
-            detection_json = {"Notice": "No objects detected"}
+        detection_json = summarize_detections(
+            detected_objects_count, detected_objects_confidences
+        )
+        if output_mode == "boxes":
+            detection_json.update(boxes_json)
 
         # Extract detected objects for logging
-        log_user_activity(username, detected_objects_count)
+        record_detections(detected_objects_count)
+        with stage_timer("logging"):
+            log_user_activity(username, detected_objects_count)
+            log_detection_analytics(username, detections, latency_ms)
 
         # Get recent activities (after log update)
         recent_activities = get_recent_activities()
 
         return result_image, detection_json, None, recent_activities
+    except (QueueFullError, DeadlineExceededError) as e:
+        # Shed by admission control (counted in detector_requests_shed_total)
+        logger.warning(f"Image request shed: {e}")
+        record_error("image")
+        return None, None, BUSY_MESSAGE, get_recent_activities()
     except Exception as e:
         import traceback
         error_traceback = traceback.format_exc()
         logger.error(f"Error processing image: {e}\n{error_traceback}")
+        record_error("image")
         return (None, None, 
                 f"Error processing image: {str(e)}", 
                 get_recent_activities())
 
 
+def process_video(username, input_video, frame_step=3, 
+                  confidence_threshold=0.45, nms_threshold=0.45):
+    """Gradio video interface function (streams annotated frames)"""
+    with track_request("video"):
+        yield from _process_video(
+            username, input_video, frame_step, confidence_threshold,
+            nms_threshold
+        )
+
+
+def _process_video(username, input_video, frame_step, confidence_threshold,
+                   nms_threshold):
+    # Validate username
+    is_valid, error_msg = validate_username(username)
+    if not is_valid:
+        yield None, None, error_msg, get_recent_activities()
+        return
+
+    if input_video is None:
+        yield None, None, "A video is required.", get_recent_activities()
+        return
+
+    logger.info(
+        f"Video detection: {input_video}, every {frame_step} frame(s), "
+        f"confidence threshold: {confidence_threshold}, "
+        f"NMS threshold: {nms_threshold}"
+    )
+    
+    # Distinct tracked objects per class over the whole video
+    tracked_objects = {}
+    try:
+        for result in detect_stream(
+            input_video, frame_step, confidence_threshold, nms_threshold,
+            annotate=True
+        ):
+            for detection in result["detections"]:
+                tracked_objects.setdefault(
+                    detection["class_name"], set()
+                ).add(detection["track_id"])
+            
+            frame_json = {"Frame": result["frame_index"]}
+            frame_json.update(
+                summarize_detections(*count_detections(result["detections"]))
+            )
+            yield result["image"], frame_json, None, gr.update()
+
+        detected_objects_count = {
+            class_name: len(track_ids)
+            for class_name, track_ids in tracked_objects.items()
+        }
+        record_detections(detected_objects_count)
+        with stage_timer("logging"):
+            log_user_activity(username, detected_objects_count)
+        yield gr.update(), gr.update(), None, get_recent_activities()
+    except Exception as e:
+        import traceback
+        error_traceback = traceback.format_exc()
+        logger.error(f"Error processing video: {e}\n{error_traceback}")
+        record_error("video")
+        yield (None, None, 
+               f"Error processing video: {str(e)}", 
+               get_recent_activities())
+
+
 def create_interface():
     """Create and configure the Gradio interface"""
     with gr.Blocks(title="Object Detection with User Tracking") as iface:
         gr.Markdown("# Object Detection with ONNX Runtime")
-        gr.Markdown("Upload an image to detect objects using YOLOv5m.")
+        gr.Markdown("Upload an image or video to detect objects using YOLOv5m.")
         
-        with gr.Row():
-            with gr.Column():
-                image_input = gr.Image(type="pil", label="Input Image")
-                
+        with gr.Tabs():
+            with gr.Tab("Image"):
                 with gr.Row():
-                    confidence_slider = gr.Slider(
-                        minimum=0.1, 
-                        maximum=1.0, 
-                        value=0.45, 
-                        step=0.05,
-                        label="Confidence Threshold",
-                        info="Set detection confidence threshold"
-                    )
-                    
-                    nms_slider = gr.Slider(
-                        minimum=0.1, 
-                        maximum=1.0, 
-                        value=0.45, 
-                        step=0.05,
-                        label="NMS Threshold",
-                        info="Set Non-Maximum Suppression threshold"
-                    )
-                
-                username_input = gr.Textbox(
-                    label="Username",
-                    placeholder="Enter your name",
-                    info="Required for user tracking"
-                )
+                    with gr.Column():
+                        # Uploaded file path; decoded once in memory by load_image
+                        image_input = gr.Image(type="filepath", label="Input Image")
+                        
+                        with gr.Row():
+                            confidence_slider = gr.Slider(
+                                minimum=0.1, 
+                                maximum=1.0, 
+                                value=0.45, 
+                                step=0.05,
+                                label="Confidence Threshold",
+                                info="Set detection confidence threshold"
+                            )
+                            
+                            nms_slider = gr.Slider(
+                                minimum=0.1, 
+                                maximum=1.0, 
+                                value=0.45, 
+                                step=0.05,
+                                label="NMS Threshold",
+                                info="Set Non-Maximum Suppression threshold"
+                            )
+                        
+                        output_mode_radio = gr.Radio(
+                            choices=OUTPUT_MODES,
+                            value="preview",
+                            label="Result",
+                            info="Boxes only skips drawing and encoding the image"
+                        )
+                        
+                        username_input = gr.Textbox(
+                            label="Username",
+                            placeholder="Enter your name",
+                            info="Required for user tracking"
+                        )
+                            
+                        submit_btn = gr.Button("Run Detection", variant="primary")
                     
-                submit_btn = gr.Button("Run Detection", variant="primary")
+                    with gr.Column():
+                        image_output = gr.Image(label="Detection Results")
+                        
+                        detection_json_output = gr.JSON(
+                            label="Detected Objects Summary",
+                            visible=True
+                        )
+                        
+                        error_output = gr.Textbox(
+                            label="Error Message", 
+                            visible=True
+                        )
             
-            with gr.Column():
-                image_output = gr.Image(label="Detection Results")
-                
-                detection_json_output = gr.JSON(
-                    label="Detected Objects Summary",
-                    visible=True
-                )
+            with gr.Tab("Video"):
+                with gr.Row():
+                    with gr.Column():
+                        video_input = gr.Video(label="Input Video")
+                        
+                        frame_step_slider = gr.Slider(
+                            minimum=1, 
+                            maximum=30, 
+                            value=3, 
+                            step=1,
+                            label="Detect Every k-th Frame",
+                            info="Boxes on skipped frames are carried by an IoU tracker"
+                        )
+                        
+                        with gr.Row():
+                            video_confidence_slider = gr.Slider(
+                                minimum=0.1, 
+                                maximum=1.0, 
+                                value=0.45, 
+                                step=0.05,
+                                label="Confidence Threshold",
+                                info="Set detection confidence threshold"
+                            )
+                            
+                            video_nms_slider = gr.Slider(
+                                minimum=0.1, 
+                                maximum=1.0, 
+                                value=0.45, 
+                                step=0.05,
+                                label="NMS Threshold",
+                                info="Set Non-Maximum Suppression threshold"
+                            )
+                        
+                        video_username_input = gr.Textbox(
+                            label="Username",
+                            placeholder="Enter your name",
+                            info="Required for user tracking"
+                        )
+                        
+                        video_submit_btn = gr.Button(
+                            "Run Video Detection", variant="primary"
+                        )
+                    
+                    with gr.Column():
+                        video_output = gr.Image(label="Annotated Frames")
+                        
+                        video_json_output = gr.JSON(
+                            label="Frame Summary",
+                            visible=True
+                        )
+                        
+                        video_error_output = gr.Textbox(
+                            label="Error Message", 
+                            visible=True
+                        )
+        
+            with gr.Tab("Analytics"):
+                with gr.Row():
+                    analytics_range = gr.Dropdown(
+                        choices=[label for label, _ in ANALYTICS_RANGES],
+                        value="Last 7 days",
+                        label="Range"
+                    )
+                    analytics_username = gr.Textbox(
+                        label="Username",
+                        placeholder="All users",
+                        info="Per-class totals for one user cover all time"
+                    )
+                    analytics_refresh_btn = gr.Button("Refresh")
                 
-                error_output = gr.Textbox(
-                    label="Error Message", 
-                    visible=True
+                analytics_status = gr.Markdown()
+                analytics_hourly_plot = gr.LinePlot(
+                    x="hour",
+                    y="detections",
+                    label="Detections per Hour"
                 )
+                with gr.Row():
+                    analytics_users_df = gr.Dataframe(
+                        label="Users", interactive=False
+                    )
+                    analytics_classes_df = gr.Dataframe(
+                        label="Classes", interactive=False
+                    )
         
         # Recent activities display area
         gr.Markdown("## Recent User Activities")
@@ -614,7 +522,8 @@ def create_interface():
                 username_input, 
                 image_input, 
                 confidence_slider, 
-                nms_slider
+                nms_slider,
+                output_mode_radio
             ],
             outputs=[
                 image_output, 
@@ -624,6 +533,42 @@ def create_interface():
             ]
         )
         
+        # Stream annotated frames for the video tab
+        video_submit_btn.click(
+            fn=process_video,
+            inputs=[
+                video_username_input, 
+                video_input, 
+                frame_step_slider, 
+                video_confidence_slider, 
+                video_nms_slider
+            ],
+            outputs=[
+                video_output, 
+                video_json_output, 
+                video_error_output, 
+                recent_activities_df
+            ]
+        )
+        
+        # Dashboards only read the rollups
+        analytics_outputs = [
+            analytics_hourly_plot,
+            analytics_users_df,
+            analytics_classes_df,
+            analytics_status
+        ]
+        analytics_refresh_btn.click(
+            fn=get_analytics,
+            inputs=[analytics_range, analytics_username],
+            outputs=analytics_outputs
+        )
+        analytics_range.change(
+            fn=get_analytics,
+            inputs=[analytics_range, analytics_username],
+            outputs=analytics_outputs
+        )
+        
         # Load recent activities when the page loads
         iface.load(
             fn=get_recent_activities,
@@ -635,18 +580,61 @@ def create_interface():
 
 
 if __name__ == "__main__":
+    startup_timer.mark("imports")
+
     # Ensure model is available
     ensure_model_exists()
-    
+    startup_timer.mark("model_check")
+
+    # Load and warm up the model before serving traffic (in the worker
+    # processes when INFERENCE_WORKERS is set; each watches the model file)
+    if worker_pool is not None:
+        worker_pool.start()
+    else:
+        session_manager.load()
+        session_manager.start_watcher()
+    batch_scheduler.start()
+    watch_batch_queue(batch_scheduler)
+    watch_model_registry(model_registry)
+    startup_timer.mark("model_load")
+
+    # One-time import of the legacy JSON array log
+    migrate_json_array(USER_LOG_FILE, activity_store)
+    recent_activity_feed.load(activity_store)
+    activity_writer.start()
+    # Fails here when the configured events format cannot be loaded
+    analytics_store = create_analytics_store()
+    analytics_writer = BackgroundActivityWriter(
+        analytics_store, ANALYTICS_FLUSH_INTERVAL, ANALYTICS_BATCH_SIZE,
+        name="analytics-writer"
+    )
+    # Merge the small per-batch event files of past days
+    analytics_store.compact()
+    analytics_writer.start()
+    startup_timer.mark("activity_store")
+
+    server_port = int(os.environ.get("PORT", 7860))
     logger.info(f"Starting Gradio server on port {server_port}")
     logger.info(f"Current working directory: {os.getcwd()}")
     
     # Create and launch the interface
     iface = create_interface()
-    iface.launch(
-        server_name="0.0.0.0",
-        server_port=7860,
-        share=False,
+    # Let enough requests run concurrently to fill a micro-batch per worker;
+    # beyond UI_MAX_QUEUE_SIZE waiting users Gradio reports a full queue
+    iface.queue(
+        default_concurrency_limit=BATCH_MAX_SIZE * batch_scheduler.concurrency,
+        max_size=UI_MAX_QUEUE_SIZE or None
+    )
+    startup_timer.mark("interface")
+
+    # Serve the headless detection API and the Gradio UI on one port
+    app = gr.mount_gradio_app(
+        create_api_app(analytics_store),
+        iface,
+        path="/",
         show_error=True,
         favicon_path=None
-    ) 
+    )
+    app.router.on_startup.append(lambda: startup_timer.mark("server_start"))
+    uvicorn.run(app, host="0.0.0.0", port=server_port)
+
@@ -0,0 +1,291 @@
+"""
+Offline bulk detection over a directory or manifest of images
+
+Images are decoded and letterboxed in a pool of worker processes, run
+through the model in batches and written as one JSON Lines record per
+image as soon as each batch finishes. Re-running with --resume skips
+every path already present in the output file.
+
+Workers return the letterboxed uint8 image (1.2 MB at 640x640) rather
+than the float32 blob, and at most --max-in-flight images are submitted
+ahead of inference, so decoding cannot run ahead of a slower model and
+fill memory with finished results.
+
+Example:
+    python batch_detect.py /data/images --output detections.jsonl \\
+        --workers 4 --batch-size 8 --resume
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import multiprocessing
+from collections import deque
+
+import numpy as np
+
+from detector import (
+    INPUT_HEIGHT, INPUT_WIDTH, apply_batched_nms, count_detections,
+    decode_upload, ensure_model_exists, image_geometry, rescale_detections,
+    session_manager, summarize_detections
+)
+from letterbox import letterbox_image, letterbox_into
+from postprocess import decode_predictions
+
+logger = logging.getLogger("gradio_app")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def iter_image_paths(source):
+    """Yield image paths from a directory tree or a manifest (one path per line)"""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield os.path.join(root, name)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            for line in f:
+                path = line.strip()
+                if path and not path.startswith("#"):
+                    yield path
+
+
+def truncate_partial_line(path, block_size=64 * 1024):
+    """Drop a partially written last line so appended records stay valid"""
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                f.truncate(start + newline + 1)
+                return
+            end = start
+        f.truncate(0)
+
+
+def load_checkpoint(output_path):
+    """Return the set of paths already written to the output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    truncate_partial_line(output_path)
+
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["path"])
+            except (json.JSONDecodeError, KeyError):
+                # A partially written last line from an interrupted run
+                continue
+    return done
+
+
+def decode_worker(path):
+    """Read and preprocess one image in a worker process"""
+    started = time.perf_counter()
+    try:
+        # Large JPEGs are decoded at reduced resolution; boxes are mapped
+        # back to the original size when the batch is written
+        img, original_size = decode_upload(path, tiling="never")
+        canvas = letterbox_image(img, INPUT_WIDTH, INPUT_HEIGHT)
+        return (
+            path, canvas, img.shape[:2], original_size, None,
+            time.perf_counter() - started
+        )
+    except Exception as e:
+        return path, None, None, None, str(e), time.perf_counter() - started
+
+
+def percentile_ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 2) if values else None
+
+
+class BulkDetector:
+    """Batch inference plus streaming JSONL output for decoded images"""
+
+    def __init__(self, output_file, batch_size, confidence_threshold,
+                 nms_threshold):
+        self.output_file = output_file
+        self.batch_size = batch_size
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+
+        self.pending = []
+        # Batches are assembled in one preallocated input buffer
+        self.blob_buffer = np.empty(
+            (batch_size, 3, INPUT_HEIGHT, INPUT_WIDTH), dtype=np.float32
+        )
+        # Reused outputs per batch size for the iobinding backend; each
+        # batch is decoded before the next one runs
+        self.output_buffers = {}
+        self.processed = 0
+        self.failed = 0
+        self.decode_times = []
+        self.batch_times = []
+        self.latencies = []
+
+    def add(self, item):
+        path, canvas, shape, original_size, error, decode_time = item
+        self.decode_times.append(decode_time)
+        if error is not None:
+            self.failed += 1
+            self._write({"path": path, "error": error})
+            return
+        self.pending.append(
+            (path, canvas, shape, original_size, time.perf_counter(), decode_time)
+        )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def _outputs_for(self, model, size):
+        if model.backend != "iobinding":
+            return None
+        version, buffers = self.output_buffers.get(size, (None, None))
+        if version != model.version:
+            # A hot-reloaded model may have different output shapes
+            buffers = model.output_buffers(size)
+            self.output_buffers[size] = (model.version, buffers)
+        return buffers
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        started = time.perf_counter()
+        model = session_manager.current()
+        blob = self.blob_buffer[:len(batch)]
+        for slot, item in zip(blob, batch):
+            # Canvases are already model-sized; this only normalizes to CHW
+            letterbox_into(item[1], slot, INPUT_WIDTH, INPUT_HEIGHT)
+        outputs = model.run(blob, self._outputs_for(model, len(batch)))
+
+        # Decode the whole batch at once with per-image letterbox geometry
+        geometry = image_geometry(
+            np.array([item[2][1] for item in batch]),
+            np.array([item[2][0] for item in batch])
+        )
+        decoded = decode_predictions(
+            outputs[0], self.confidence_threshold, geometry.x_factor,
+            geometry.y_factor, geometry.pad_x, geometry.pad_y
+        )
+
+        finished = time.perf_counter()
+        self.batch_times.append(finished - started)
+        batch_detections = apply_batched_nms(
+            decoded, self.confidence_threshold, self.nms_threshold
+        )
+        for (path, _, shape, original_size, queued_at, decode_time), detections in zip(
+            batch, batch_detections
+        ):
+            self._write({
+                "path": path,
+                "width": original_size[0],
+                "height": original_size[1],
+                "detections": rescale_detections(detections, shape, original_size),
+                "summary": summarize_detections(*count_detections(detections))
+            })
+            self.processed += 1
+            self.latencies.append(decode_time + finished - queued_at)
+
+    def _write(self, record):
+        self.output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output_file.flush()
+
+    def summary(self, elapsed):
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 2),
+            "images_per_second": round(self.processed / elapsed, 2) if elapsed else None,
+            "decode_ms": {
+                "p50": percentile_ms(self.decode_times, 50),
+                "p95": percentile_ms(self.decode_times, 95),
+            },
+            "batch_inference_ms": {
+                "p50": percentile_ms(self.batch_times, 50),
+                "p95": percentile_ms(self.batch_times, 95),
+            },
+            "image_latency_ms": {
+                "p50": percentile_ms(self.latencies, 50),
+                "p95": percentile_ms(self.latencies, 95),
+                "p99": percentile_ms(self.latencies, 99),
+            },
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk YOLOv5 object detection")
+    parser.add_argument("source", help="Image directory or manifest file (one path per line)")
+    parser.add_argument("--output", default="detections.jsonl", help="JSON Lines output file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of decode worker processes")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images per inference batch")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Images submitted for decoding ahead of inference "
+                             "(default: twice the number of workers)")
+    parser.add_argument("--confidence-threshold", type=float, default=0.45)
+    parser.add_argument("--nms-threshold", type=float, default=0.45)
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip images already present in the output file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    args = parse_args(argv)
+
+    ensure_model_exists()
+
+    done = load_checkpoint(args.output) if args.resume else set()
+    if done:
+        logger.info(f"Resuming: {len(done)} images already processed")
+    paths = (path for path in iter_image_paths(args.source) if path not in done)
+
+    mode = "a" if args.resume else "w"
+    started = time.perf_counter()
+    workers = max(1, args.workers)
+    max_in_flight = max(1, args.max_in_flight or 2 * workers)
+    with open(args.output, mode, encoding="utf-8") as output_file, \
+            multiprocessing.Pool(workers) as pool:
+        # Load the model after forking so workers never inherit ORT threads
+        session_manager.load()
+        bulk = BulkDetector(
+            output_file, max(1, args.batch_size),
+            args.confidence_threshold, args.nms_threshold
+        )
+        # A bounded window of submitted decodes; the oldest is collected
+        # before another path is submitted
+        in_flight = deque()
+        for path in paths:
+            in_flight.append(pool.apply_async(decode_worker, (path,)))
+            if len(in_flight) >= max_in_flight:
+                bulk.add(in_flight.popleft().get())
+        while in_flight:
+            bulk.add(in_flight.popleft().get())
+        bulk.flush()
+
+    summary = bulk.summary(time.perf_counter() - started)
+    logger.info(f"Bulk detection summary: {json.dumps(summary)}")
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import os
+import time
+import queue
+import threading
+import logging
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger("gradio_app")
+
+# Micro-batching configuration (overridable from the container environment)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "4"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "10"))
+BATCH_STATS_LOG_EVERY = int(os.environ.get("BATCH_STATS_LOG_EVERY", "100"))
+# Requests allowed to wait for a batch; beyond that submit() fails fast (0 = unbounded)
+BATCH_MAX_QUEUE_DEPTH = int(os.environ.get("BATCH_MAX_QUEUE_DEPTH", "64"))
+# Seconds an interactive request may take before queued work is dropped (0 = no deadline)
+BATCH_REQUEST_DEADLINE_S = float(os.environ.get("BATCH_REQUEST_DEADLINE_S", "30"))
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the batch queue is at its admission limit"""
+
+
+class DeadlineExceededError(RuntimeError):
+    """Raised when a request's deadline passed before its batch started or finished"""
+
+
+# Absolute time.perf_counter() deadline of the request handled by the
+# current thread/task (None = wait as long as it takes). Batch threads set
+# it to the batch deadline while running the batch.
+_deadline = contextvars.ContextVar("batch_deadline", default=None)
+
+
+def current_deadline():
+    """Deadline of the request or batch running in this thread, or None"""
+    return _deadline.get()
+
+
+@contextmanager
+def request_deadline(seconds=BATCH_REQUEST_DEADLINE_S):
+    """
+    Give every blob submitted inside the block a deadline `seconds` from now
+
+    Blobs still queued when it passes are cancelled with
+    DeadlineExceededError instead of being run for a client that has
+    already given up. Batches that have started finish unless the backend
+    enforces the deadline itself (inference worker processes do).
+    """
+    previous = _deadline.get()
+    deadline = time.perf_counter() + seconds if seconds > 0 else None
+    if previous is not None and deadline is not None:
+        deadline = min(previous, deadline)
+    # set() instead of reset(): Gradio may resume generators in another context
+    _deadline.set(deadline if deadline is not None else previous)
+    try:
+        yield
+    finally:
+        _deadline.set(previous)
+
+
+class _PendingRequest:
+    def __init__(self, blob, deadline=None):
+        self.blob = blob
+        self.size = blob.shape[0]
+        self.enqueued_at = time.perf_counter()
+        self.deadline = deadline
+        self.future = Future()
+
+    def expired(self, now):
+        return self.deadline is not None and now >= self.deadline
+
+
+class BatchScheduler:
+    """
+    Collect preprocessed blobs from concurrent requests into one inference.
+
+    A dispatcher thread takes the first waiting request, then keeps
+    collecting until either max_batch_size images are queued or max_wait_ms
+    has passed since that first request arrived. The combined blob is run
+    with a single session.run and each caller receives its own slice of
+    every model output.
+
+    With concurrency > 1 (one per inference worker process) up to that many
+    batches run at once. The dispatcher only collects the next batch once
+    a slot is free, so requests keep accumulating into it meanwhile.
+
+    Admission is bounded: submit() fails fast with QueueFullError once
+    max_queue_depth requests are waiting, and requests whose deadline has
+    passed are dropped when the dispatcher reaches them. Both are counted
+    as shed requests and reported to on_shed(reason, count) if set.
+    """
+
+    def __init__(self, session_manager, max_batch_size=BATCH_MAX_SIZE,
+                 max_wait_ms=BATCH_MAX_WAIT_MS,
+                 stats_log_every=BATCH_STATS_LOG_EVERY, concurrency=1,
+                 max_queue_depth=BATCH_MAX_QUEUE_DEPTH):
+        self.session_manager = session_manager
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.stats_log_every = stats_log_every
+        self.concurrency = max(1, concurrency)
+        self.max_queue_depth = max(0, max_queue_depth)
+        # Called with ("queue_full" | "expired", count) for every shed request
+        self.on_shed = None
+
+        self._queue = queue.Queue()
+        # One permit per request allowed to wait; taken atomically in
+        # submit() and given back when the dispatcher dequeues the request
+        self._admission = (
+            threading.BoundedSemaphore(self.max_queue_depth)
+            if self.max_queue_depth else None
+        )
+        self._slots = threading.Semaphore(self.concurrency)
+        self._executor = None
+        # Combined batches are assembled in a reused buffer per running thread
+        self._local = threading.local()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._counters = {
+            "requests": 0,
+            "batches": 0,
+            "images": 0,
+            "queue_delay_total_s": 0.0,
+            "queue_delay_max_s": 0.0,
+            "inference_total_s": 0.0,
+            "shed_queue_full": 0,
+            "shed_expired": 0,
+        }
+
+    def start(self):
+        """Start the dispatcher thread (also started lazily on first submit)"""
+        with self._start_lock:
+            if self._thread is None:
+                if self.concurrency > 1:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.concurrency,
+                        thread_name_prefix="batch-runner"
+                    )
+                self._thread = threading.Thread(
+                    target=self._dispatch_loop, name="batch-scheduler",
+                    daemon=True
+                )
+                self._thread.start()
+                logger.info(
+                    f"Batch scheduler started: max_batch_size="
+                    f"{self.max_batch_size}, max_wait_ms={self.max_wait * 1000}, "
+                    f"concurrency={self.concurrency}, "
+                    f"max_queue_depth={self.max_queue_depth}"
+                )
+
+    def stop(self):
+        with self._start_lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                    self._executor = None
+
+    def submit(self, blob, deadline=None):
+        """
+        Queue a (n, 3, H, W) blob and return a Future of its outputs
+
+        deadline is an absolute time.perf_counter() value and defaults to
+        the one set by request_deadline(). Raises QueueFullError when
+        max_queue_depth requests are already waiting.
+        """
+        self.start()
+        if self._admission is not None and not self._admission.acquire(blocking=False):
+            self._shed("queue_full")
+            raise QueueFullError(
+                f"Detection queue is full ({self.max_queue_depth} waiting); "
+                f"try again shortly"
+            )
+        request = _PendingRequest(
+            blob, deadline if deadline is not None else _deadline.get()
+        )
+        self._queue.put(request)
+        return request.future
+
+    def infer(self, blob):
+        """Blocking helper: run the blob through the next batch"""
+        return self.submit(blob).result()
+
+    def queue_depth(self):
+        """Number of requests waiting for the dispatcher"""
+        return self._queue.qsize()
+
+    def _get(self, timeout=None):
+        """Next queued request (None = stop), freeing its admission permit"""
+        request = self._queue.get(timeout=timeout)
+        if request is not None and self._admission is not None:
+            self._admission.release()
+        return request
+
+    def _shed(self, reason, count=1):
+        with self._stats_lock:
+            self._counters[f"shed_{reason}"] += count
+        if self.on_shed is not None:
+            self.on_shed(reason, count)
+
+    def _admit(self, request):
+        """False (and the request cancelled) if its deadline has passed"""
+        if not request.expired(time.perf_counter()):
+            return True
+        waited_ms = (time.perf_counter() - request.enqueued_at) * 1000
+        request.future.set_exception(DeadlineExceededError(
+            f"Request deadline passed after {waited_ms:.0f} ms in the "
+            f"detection queue; try again shortly"
+        ))
+        self._shed("expired")
+        return False
+
+    def _collect_batch(self, first):
+        batch = [first]
+        batch_images = first.size
+        deadline = first.enqueued_at + self.max_wait
+        stop = False
+        while batch_images < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                stop = True
+                break
+            if not self._admit(request):
+                continue
+            batch.append(request)
+            batch_images += request.size
+        return batch, stop
+
+    def _dispatch_loop(self):
+        while True:
+            self._slots.acquire()
+            first = self._get()
+            if first is None:
+                return
+            if not self._admit(first):
+                self._slots.release()
+                continue
+            batch, stop = self._collect_batch(first)
+            if self._executor is None:
+                self._run_in_slot(batch)
+            else:
+                self._executor.submit(self._run_in_slot, batch)
+            if stop:
+                return
+
+    def _run_in_slot(self, batch):
+        try:
+            self._run_batch(batch)
+        finally:
+            self._slots.release()
+
+    def _assemble(self, batch):
+        """Concatenate the batch's blobs into the reused input buffer"""
+        size = sum(request.size for request in batch)
+        first = batch[0].blob
+        buffer = getattr(self._local, "buffer", None)
+        if (buffer is None or buffer.shape[0] < size
+                or buffer.shape[1:] != first.shape[1:]
+                or buffer.dtype != first.dtype):
+            buffer = np.empty(
+                (max(size, self.max_batch_size),) + first.shape[1:],
+                dtype=first.dtype
+            )
+            self._local.buffer = buffer
+        return np.concatenate(
+            [request.blob for request in batch], out=buffer[:size]
+        )
+
+    def _run_batch(self, batch):
+        dispatched_at = time.perf_counter()
+        # The batch is useless once every caller has given up
+        deadlines = [request.deadline for request in batch]
+        token = _deadline.set(None if None in deadlines else max(deadlines))
+        try:
+            if len(batch) == 1:
+                blob = batch[0].blob
+            else:
+                blob = self._assemble(batch)
+            outputs = self.session_manager.current().run(blob)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        finally:
+            _deadline.reset(token)
+        finished_at = time.perf_counter()
+
+        # Hand each caller its own slice of every output
+        offset = 0
+        for request in batch:
+            end = offset + request.size
+            request.future.set_result(
+                [output[offset:end] for output in outputs]
+            )
+            offset = end
+
+        self._record(batch, dispatched_at, finished_at)
+
+    def _record(self, batch, dispatched_at, finished_at):
+        delays = [dispatched_at - request.enqueued_at for request in batch]
+        with self._stats_lock:
+            counters = self._counters
+            counters["requests"] += len(batch)
+            counters["batches"] += 1
+            counters["images"] += sum(request.size for request in batch)
+            counters["queue_delay_total_s"] += sum(delays)
+            counters["queue_delay_max_s"] = max(
+                counters["queue_delay_max_s"], max(delays)
+            )
+            counters["inference_total_s"] += finished_at - dispatched_at
+            log_now = (
+                self.stats_log_every > 0
+                and counters["batches"] % self.stats_log_every == 0
+            )
+        if log_now:
+            logger.info(f"Batch scheduler stats: {self.stats()}")
+
+    def stats(self):
+        """Snapshot of throughput and queueing-delay counters"""
+        with self._stats_lock:
+            counters = dict(self._counters)
+        elapsed = time.perf_counter() - self._started_at
+        batches = counters["batches"] or 1
+        requests = counters["requests"] or 1
+        counters["avg_batch_size"] = round(counters["images"] / batches, 2)
+        counters["avg_queue_delay_ms"] = round(
+            counters["queue_delay_total_s"] / requests * 1000, 2
+        )
+        counters["max_queue_delay_ms"] = round(
+            counters["queue_delay_max_s"] * 1000, 2
+        )
+        counters["images_per_second"] = round(counters["images"] / elapsed, 2)
+        return counters
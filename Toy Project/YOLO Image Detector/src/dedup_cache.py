@@ -0,0 +1,286 @@
+"""
+Near-duplicate upload cache keyed by a perceptual hash
+
+Re-uploads of the same photo (re-encoded, resized or screenshotted) hash
+differently byte for byte, so the prediction cache misses them. Here
+every decoded image gets a 64-bit difference hash (dHash: brightness
+gradients of a 9x8 grayscale thumbnail), which changes by only a few bits
+under re-encoding and resizing. Hashes within DEDUP_MAX_DISTANCE bits
+reuse the stored predictions.
+
+The index is multi-index hashing: the hash is split into
+DEDUP_MAX_DISTANCE + 1 chunks, and any hash within that distance shares
+at least one chunk exactly, so a lookup only compares the entries found
+in the chunk tables instead of every entry. Unlike a BK-tree it supports
+removal, so the cache stays an LRU bounded by bytes. Each entry is
+charged a fixed overhead on top of its rows, so pictures without any
+candidate rows still count towards the limit.
+
+Entries hold the candidate rows of the raw prediction in model input
+space, as the prediction cache does. For an image with the same aspect
+ratio the letterbox layout is the same, so decoding the rows with the new
+image's geometry rescales the boxes to its size. Images whose aspect
+ratio differs by more than DEDUP_MAX_ASPECT_DELTA (crops, screenshots
+with borders) never match.
+
+A DEDUP_VERIFY_RATE share of near-hits also runs inference and compares
+the results. Disagreements are counted as false matches and replace the
+entry, so the false-match rate can be tracked in Prometheus.
+"""
+import os
+import random
+import itertools
+import threading
+import logging
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from metrics import record_dedup_lookup, record_dedup_verification
+from memory_profile import LOW_MEMORY_MODE
+from prediction_cache import (
+    PREDICTION_CACHE_MIN_CONFIDENCE, candidate_rows, entry_bytes
+)
+
+logger = logging.getLogger("gradio_app")
+
+# Dedup configuration (overridable from the container environment)
+# Largest Hamming distance (of 64 bits) treated as the same picture; -1 disables
+DEDUP_MAX_DISTANCE = int(os.environ.get("DEDUP_MAX_DISTANCE", "6"))
+DEDUP_CACHE_MAX_MB = float(
+    os.environ.get("DEDUP_CACHE_MAX_MB", "4" if LOW_MEMORY_MODE else "32")
+)
+# Relative width/height ratio difference still treated as the same framing
+DEDUP_MAX_ASPECT_DELTA = float(os.environ.get("DEDUP_MAX_ASPECT_DELTA", "0.02"))
+# Share of near-hits that also run inference to measure false matches
+DEDUP_VERIFY_RATE = float(os.environ.get("DEDUP_VERIFY_RATE", "0.05"))
+# Boxes of the same class overlapping at least this much agree
+DEDUP_VERIFY_IOU = float(os.environ.get("DEDUP_VERIFY_IOU", "0.5"))
+
+HASH_BITS = 64
+# Thumbnail the difference hash is taken from (9 columns give 8 gradients)
+HASH_SIZE = (9, 8)
+# Shortest side the image is halved down to before the thumbnail
+HASH_PREPARE_SIDE = 64
+# Larger distances split the hash into chunks too short to narrow the search
+MAX_SUPPORTED_DISTANCE = 15
+
+
+def perceptual_hash(rgb_image):
+    """64-bit difference hash of an RGB array"""
+    gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+    # Fast 2x2 halvings down to a small image, then one anti-aliased
+    # INTER_AREA step (a linear step would alias and make bits unstable)
+    while min(gray.shape[:2]) >= 2 * HASH_PREPARE_SIDE:
+        gray = cv2.resize(
+            gray, (gray.shape[1] // 2, gray.shape[0] // 2),
+            interpolation=cv2.INTER_AREA
+        )
+    thumbnail = cv2.resize(gray, HASH_SIZE, interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+def _box_iou(a, b):
+    left, top = max(a[0], b[0]), max(a[1], b[1])
+    right = min(a[0] + a[2], b[0] + b[2])
+    bottom = min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def detections_agree(cached, fresh, min_iou=DEDUP_VERIFY_IOU):
+    """Whether every detection has a same-class partner overlapping by min_iou"""
+    if len(cached) != len(fresh):
+        return False
+    unmatched = list(fresh)
+    for detection in cached:
+        partner = next(
+            (
+                candidate for candidate in unmatched
+                if candidate["class_id"] == detection["class_id"]
+                and _box_iou(candidate["box"], detection["box"]) >= min_iou
+            ),
+            None
+        )
+        if partner is None:
+            return False
+        unmatched.remove(partner)
+    return True
+
+
+class DedupEntry:
+    """Stored predictions of one picture"""
+
+    def __init__(self, image_hash, aspect, tag, predictions):
+        self.image_hash = image_hash
+        self.aspect = aspect
+        # Model key and version; predictions of other models never match
+        self.tag = tag
+        self.predictions = predictions
+
+
+class DedupCache:
+    """
+    LRU of predictions found by perceptual-hash distance
+
+    lookup() returns (entry, distance) for the nearest stored picture within
+    max_distance, put() stores the candidate rows of a new prediction.
+    """
+
+    def __init__(self, max_distance=DEDUP_MAX_DISTANCE,
+                 max_bytes=int(DEDUP_CACHE_MAX_MB * 1024 * 1024),
+                 min_confidence=PREDICTION_CACHE_MIN_CONFIDENCE,
+                 max_aspect_delta=DEDUP_MAX_ASPECT_DELTA,
+                 verify_rate=DEDUP_VERIFY_RATE):
+        if max_distance > MAX_SUPPORTED_DISTANCE:
+            raise ValueError(
+                f"DEDUP_MAX_DISTANCE must be at most {MAX_SUPPORTED_DISTANCE}"
+            )
+        self.max_distance = max_distance
+        self.max_bytes = max_bytes
+        self.min_confidence = min_confidence
+        self.max_aspect_delta = max_aspect_delta
+        self.verify_rate = verify_rate
+
+        # Bit ranges of the chunks: max_distance + 1 nearly equal parts
+        chunks = max(1, max_distance + 1)
+        edges = [round(i * HASH_BITS / chunks) for i in range(chunks + 1)]
+        self._chunks = [
+            (HASH_BITS - end, (1 << (end - start)) - 1)
+            for start, end in zip(edges, edges[1:])
+        ]
+        self._tables = [{} for _ in self._chunks]
+        self._entries = OrderedDict()
+        self._ids = itertools.count()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.verified = 0
+        self.false_matches = 0
+
+    def can_serve(self, confidence_threshold):
+        """Whether lookups are enabled and a stored entry covers this threshold"""
+        return (
+            self.max_distance >= 0 and self.max_bytes > 0
+            and confidence_threshold >= self.min_confidence
+        )
+
+    def _chunk_keys(self, image_hash):
+        return [(image_hash >> shift) & mask for shift, mask in self._chunks]
+
+    def lookup(self, image_hash, image_shape, tag):
+        """(entry, distance) of the nearest match, or None"""
+        height, width = image_shape[:2]
+        aspect = width / height
+        best, best_distance = None, None
+        with self._lock:
+            candidates = set()
+            for table, key in zip(self._tables, self._chunk_keys(image_hash)):
+                candidates.update(table.get(key, ()))
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry.tag != tag:
+                    continue
+                if abs(entry.aspect / aspect - 1) > self.max_aspect_delta:
+                    continue
+                distance = hamming_distance(entry.image_hash, image_hash)
+                if distance <= self.max_distance and (
+                    best is None or distance < best_distance
+                ):
+                    best, best_distance = entry_id, distance
+            if best is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(best)
+                self.hits += 1
+                best = self._entries[best]
+        record_dedup_lookup(best is not None, best_distance)
+        return None if best is None else (best, best_distance)
+
+    def put(self, image_hash, image_shape, tag, predictions):
+        """Store the candidate rows of a single-image (1, rows, 85) prediction"""
+        if self.max_distance < 0 or self.max_bytes <= 0:
+            return
+        compact = candidate_rows(predictions, self.min_confidence)
+        if entry_bytes(compact) > self.max_bytes:
+            return
+        height, width = image_shape[:2]
+        entry = DedupEntry(image_hash, width / height, tag, compact)
+        with self._lock:
+            # An exact re-upload replaces its previous entry
+            for entry_id in self._candidates(image_hash):
+                previous = self._entries[entry_id]
+                if previous.image_hash == image_hash and previous.tag == tag:
+                    self._remove(entry_id)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = entry
+            for table, key in zip(self._tables, self._chunk_keys(image_hash)):
+                table.setdefault(key, set()).add(entry_id)
+            self._size += entry_bytes(compact)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, entry):
+        """Drop an entry found to be a false match"""
+        with self._lock:
+            for entry_id in self._candidates(entry.image_hash):
+                if self._entries[entry_id] is entry:
+                    self._remove(entry_id)
+                    return
+
+    def _candidates(self, image_hash):
+        first_table = self._tables[0]
+        return list(first_table.get(self._chunk_keys(image_hash)[0], ()))
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        self._size -= entry_bytes(entry.predictions)
+        for table, key in zip(self._tables, self._chunk_keys(entry.image_hash)):
+            ids = table[key]
+            ids.discard(entry_id)
+            if not ids:
+                del table[key]
+
+    def should_verify(self):
+        """Sample a near-hit for verification against real inference"""
+        return self.verify_rate > 0 and random.random() < self.verify_rate
+
+    def record_verification(self, entry, distance, agreed):
+        """Count a verified near-hit; false matches are dropped"""
+        with self._lock:
+            self.verified += 1
+            if not agreed:
+                self.false_matches += 1
+        record_dedup_verification(agreed)
+        if not agreed:
+            logger.warning(
+                f"Dedup false match at distance {distance}; entry dropped "
+                f"({self.false_matches}/{self.verified} verified near-hits)"
+            )
+            self.discard(entry)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "verified": self.verified,
+                "false_matches": self.false_matches,
+                "false_match_rate": (
+                    round(self.false_matches / self.verified, 4)
+                    if self.verified else 0.0
+                ),
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
@@ -0,0 +1,665 @@
+import os
+import time
+import cv2
+import numpy as np
+import logging
+
+from session_manager import SessionManager
+from postprocess import decode_predictions
+from letterbox import BlobBuffers, letterbox_blob, letterbox_geometry, letterbox_into
+from image_decode import decode_image, read_header
+from nms import batched_nms, non_max_suppression
+from tiling import (
+    TILE_INCLUDE_FULL_IMAGE, TILE_MAX_BATCH, TILE_OVERLAP, TILE_SIZE,
+    TILING_MODE, merge_tile_detections, seam_mask, should_tile, tile_windows
+)
+from batching import BatchScheduler
+from model_registry import MODEL_REGISTRY_THREADS, ModelRegistry, RegisteredModel
+from worker_pool import WorkerPool, resolve_worker_count, thread_budget
+from prediction_cache import PredictionCache, image_content_hash
+from dedup_cache import DedupCache, detections_agree, perceptual_hash
+from metrics import record_model_route, stage_timer
+from memory_profile import LOW_MEMORY_MODE, release_memory
+from rendering import RENDER_MAX_SIDE, downscale, preview_size
+from prepare_model import verify_artifact
+from quantize import variant_path
+
+logger = logging.getLogger("gradio_app")
+
+# Constants
+BASE_MODEL_PATH = "yolov5m.onnx"
+# fp32, int8-dynamic or int8-static (see quantize.py)
+MODEL_VARIANT = os.environ.get("MODEL_VARIANT", "fp32")
+MODEL_PATH = variant_path(BASE_MODEL_PATH, MODEL_VARIANT)
+INPUT_WIDTH = 640
+INPUT_HEIGHT = 640
+# Check model files against their build-time manifest before loading
+MODEL_VERIFY_CHECKSUM = os.environ.get("MODEL_VERIFY_CHECKSUM", "1") == "1"
+
+# Process-wide ONNX session (loaded once, hot-reloaded on file change)
+session_manager = SessionManager(MODEL_PATH, INPUT_WIDTH, INPUT_HEIGHT)
+
+# With INFERENCE_WORKERS > 0 inference runs in worker processes with a
+# fixed ORT thread budget each; otherwise in this process
+INFERENCE_WORKER_COUNT = resolve_worker_count()
+worker_pool = (
+    WorkerPool(session_manager, INFERENCE_WORKER_COUNT)
+    if INFERENCE_WORKER_COUNT else None
+)
+inference_backend = worker_pool or session_manager
+
+# Micro-batches concurrent requests into one session.run (one batch in
+# flight per worker process)
+batch_scheduler = BatchScheduler(
+    inference_backend, concurrency=max(1, INFERENCE_WORKER_COUNT)
+)
+
+# Raw predictions per image + model version for threshold re-tuning
+prediction_cache = PredictionCache()
+
+# Predictions of recent pictures found by perceptual hash, for re-encoded
+# or resized re-uploads that miss the exact cache
+dedup_cache = DedupCache()
+
+# Reused per-thread input blobs for request paths that wait on inference
+blob_buffers = BlobBuffers(INPUT_WIDTH, INPUT_HEIGHT)
+
+# The served model plus any smaller exports listed in MODEL_REGISTRY;
+# requests are routed between them by latency budget or quality tier
+default_model = RegisteredModel(
+    os.path.splitext(BASE_MODEL_PATH)[0], INPUT_WIDTH, session_manager,
+    backend=inference_backend, scheduler=batch_scheduler,
+    blob_buffers=blob_buffers
+)
+# Extra models run in-process; with a worker pool each gets one worker's
+# thread budget so they cannot oversubscribe the cores the workers use
+model_registry = ModelRegistry.from_env(
+    default_model,
+    threads=MODEL_REGISTRY_THREADS or (
+        thread_budget(INFERENCE_WORKER_COUNT) if INFERENCE_WORKER_COUNT else 0
+    )
+)
+
+
+def ensure_model_exists():
+    """Verify the prebuilt ONNX model and select the prebuilt variant if present"""
+    # The model is produced at image build time (prepare_model.py); startup
+    # never installs packages or exports from PyTorch
+    if not os.path.exists(BASE_MODEL_PATH):
+        raise FileNotFoundError(
+            f"ONNX model {BASE_MODEL_PATH} not found. Build it with "
+            f"'python prepare_model.py --output {BASE_MODEL_PATH}'"
+        )
+    if MODEL_VERIFY_CHECKSUM:
+        verify_artifact(BASE_MODEL_PATH)
+
+    # Quantized variants are built and gated offline (prepare_model.py
+    # --variant); startup only selects one that passed
+    if MODEL_PATH != BASE_MODEL_PATH:
+        if not os.path.exists(MODEL_PATH):
+            logger.error(
+                f"{MODEL_VARIANT} model {MODEL_PATH} not found (build it with "
+                f"'python prepare_model.py --variant {MODEL_VARIANT} --test-dir ...'); "
+                f"falling back to FP32 model {BASE_MODEL_PATH}"
+            )
+            session_manager.model_path = BASE_MODEL_PATH
+        elif MODEL_VERIFY_CHECKSUM:
+            verify_artifact(MODEL_PATH)
+
+
+# Load COCO class names
+CLASSES = [
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", 
+    "truck", "boat", "traffic light", "fire hydrant", "stop sign", 
+    "parking meter", "bench", "bird", "cat", "dog", "horse", "sheep", 
+    "cow", "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella", 
+    "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", 
+    "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", 
+    "surfboard", "tennis racket", "bottle", "wine glass", "cup", "fork", 
+    "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange", 
+    "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", 
+    "couch", "potted plant", "bed", "dining table", "toilet", "tv", 
+    "laptop", "mouse", "remote", "keyboard", "cell phone", "microwave", 
+    "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", 
+    "scissors", "teddy bear", "hair drier", "toothbrush"
+]
+
+# Colors for visualization
+COLORS = np.random.uniform(0, 255, size=(len(CLASSES), 3))
+
+
+def decode_upload(data, tiling=TILING_MODE):
+    """
+    Decode uploaded image bytes (or a file path) in memory
+    Large JPEGs are decoded at reduced resolution unless they will be tiled.
+    Returns (RGB array, (original width, original height))
+    """
+    if isinstance(data, str):
+        data = np.fromfile(data, dtype=np.uint8)
+    header = read_header(np.frombuffer(data, dtype=np.uint8))
+    tiled = header.width is not None and should_tile(
+        (header.height, header.width), tiling
+    )
+    target_side = None if tiled else max(INPUT_WIDTH, INPUT_HEIGHT)
+    return decode_image(data, target_side)
+
+
+def rescale_detections(detections, image_shape, original_size):
+    """Map boxes found on a reduced-resolution decode to original pixels"""
+    height, width = image_shape[:2]
+    original_width, original_height = original_size
+    if (width, height) == (original_width, original_height):
+        return detections
+    x_scale = original_width / width
+    y_scale = original_height / height
+    return [
+        dict(detection, box=[
+            int(detection["box"][0] * x_scale), int(detection["box"][1] * y_scale),
+            int(detection["box"][2] * x_scale), int(detection["box"][3] * y_scale)
+        ])
+        for detection in detections
+    ]
+
+
+def load_image(image, with_size=False):
+    """
+    Load the input (encoded bytes, path, NumPy array or PIL image) as an RGB array
+    with_size also returns the original (width, height), which differs from
+    the array's when a large JPEG was decoded at reduced resolution
+    """
+    logger.info(f"Image input type: {type(image)}")
+    original_size = None
+
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        img, original_size = decode_upload(image)
+    elif isinstance(image, str):
+        logger.info(f"Processing image path: {image}")
+        # Check if file exists
+        if not os.path.exists(image):
+            logger.error(f"Error: Image file not found at {image}")
+            raise FileNotFoundError(f"Image file not found: {image}")
+
+        try:
+            # Read the file once and decode in memory (header checked first)
+            img, original_size = decode_upload(image)
+            logger.info(
+                f"Image loaded successfully: {image}, shape: {img.shape}, "
+                f"original size: {original_size}"
+            )
+        except Exception as e:
+            logger.error(f"Error loading image from path: {e}")
+            raise
+    elif isinstance(image, np.ndarray):
+        # For OpenCV image (BGR format)
+        logger.info(f"NumPy array input shape: {image.shape}")
+        if image.shape[2] == 3:
+            # Convert BGR to RGB
+            img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        elif image.shape[2] == 4:  # RGBA
+            # Convert RGBA to RGB
+            img = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+    else:
+        # For PIL image (already in RGB format)
+        logger.info(f"PIL Image or other type: {type(image)}")
+        try:
+            img = np.array(image)
+            logger.info(f"Converted to NumPy array, shape: {img.shape}")
+            if img.shape[2] == 4:  # RGBA
+                # Remove alpha channel (contiguous so it can be drawn on)
+                img = np.ascontiguousarray(img[:, :, :3])
+        except Exception as e:
+            logger.error(f"Error converting image to NumPy array: {e}")
+            raise
+    
+    if with_size:
+        return img, original_size or (img.shape[1], img.shape[0])
+    return img
+
+
+def create_blob(img, out=None, input_width=INPUT_WIDTH, input_height=INPUT_HEIGHT):
+    """
+    Letterbox and normalize an RGB array into the model input blob
+    Written into out (a (1, 3, H, W) float32 buffer) when given
+    """
+    try:
+        return letterbox_blob(img, input_width, input_height, out)
+    except Exception as e:
+        logger.error(f"Error in letterbox preprocessing: {e}")
+        raise
+
+
+def image_geometry(width, height, input_width=INPUT_WIDTH, input_height=INPUT_HEIGHT):
+    """Letterbox scale and padding for (arrays of) image sizes"""
+    return letterbox_geometry(width, height, input_width, input_height)
+
+
+def preprocess_image(image):
+    """Preprocess image for YOLO model"""
+    img = load_image(image)
+    return create_blob(img), img
+
+
+def run_detection(original_image, confidence_threshold=0.45, nms_threshold=0.45,
+                  tiling=TILING_MODE, model=None):
+    """
+    Run inference and NMS on an RGB array without any rendering
+    model is a model_registry entry (routed by MODEL_LATENCY_BUDGET_MS if None)
+    Returns a list of detections with class, confidence and [left, top, width, height] box
+    """
+    model = model_registry.acquire(model or model_registry.route())
+    try:
+        return _run_detection(
+            original_image, confidence_threshold, nms_threshold, tiling, model
+        )
+    finally:
+        model_registry.release(model)
+
+
+def _run_detection(original_image, confidence_threshold, nms_threshold, tiling,
+                   model):
+    """run_detection on an acquired (pinned) registry entry"""
+    record_model_route(model.key)
+
+    # Large images are split into overlapping tiles instead of squashed
+    if should_tile(original_image.shape, tiling):
+        return run_tiled_detection(
+            original_image, confidence_threshold, nms_threshold, model=model
+        )
+
+    # Reuse raw predictions when only the thresholds changed
+    predictions = None
+    cache_key = None
+    if prediction_cache.can_serve(confidence_threshold):
+        model_version = model.backend.current().version
+        cache_key = (
+            f"{image_content_hash(original_image)}:{model.key}:{model_version}"
+        )
+        predictions = prediction_cache.get(cache_key)
+    
+    # Then the nearest stored picture by perceptual hash; a sample of
+    # near-hits still runs inference to measure false matches
+    image_hash = None
+    near_match = None
+    if predictions is None and dedup_cache.can_serve(confidence_threshold):
+        with stage_timer("dedup"):
+            dedup_tag = f"{model.key}:{model.backend.current().version}"
+            image_hash = perceptual_hash(original_image)
+            near_match = dedup_cache.lookup(
+                image_hash, original_image.shape, dedup_tag
+            )
+        if near_match is not None and not dedup_cache.should_verify():
+            predictions = near_match[0].predictions
+            near_match = None
+    
+    if predictions is None:
+        with stage_timer("preprocess"):
+            blob = create_blob(
+                original_image, model.blob_buffers.get(1),
+                model.input_width, model.input_height
+            )
+        
+        # Run inference (batched with other concurrent requests); the time
+        # including queueing drives latency-budget routing
+        with stage_timer("inference"):
+            started = time.perf_counter()
+            outputs = model.scheduler.infer(blob)
+            model_registry.observe(model, time.perf_counter() - started)
+        
+        # YOLOv5m ONNX output shape is (1, 25200, 85) where:
+        # 25200 is the number of predictions
+        # 85 = 4 (bbox coords) + 1 (objectness) + 80 (class scores for COCO)
+        predictions = outputs[0]
+        if cache_key is not None:
+            prediction_cache.put(cache_key, predictions)
+        if image_hash is not None and near_match is None:
+            dedup_cache.put(
+                image_hash, original_image.shape, dedup_tag, predictions
+            )
+    
+    with stage_timer("postprocess"):
+        detections = predictions_to_detections(
+            predictions, original_image.shape, confidence_threshold,
+            nms_threshold, model.input_width, model.input_height
+        )
+    
+    if near_match is not None:
+        # Verified near-hit: compare what the stored entry would have returned
+        entry, distance = near_match
+        with stage_timer("dedup"):
+            agreed = detections_agree(
+                predictions_to_detections(
+                    entry.predictions, original_image.shape,
+                    confidence_threshold, nms_threshold,
+                    model.input_width, model.input_height
+                ),
+                detections
+            )
+            dedup_cache.record_verification(entry, distance, agreed)
+            if not agreed:
+                dedup_cache.put(
+                    image_hash, original_image.shape, dedup_tag, predictions
+                )
+    return detections
+
+
+def run_tiled_detection(original_image, confidence_threshold=0.45,
+                        nms_threshold=0.45, tile_size=TILE_SIZE,
+                        overlap=TILE_OVERLAP,
+                        include_full_image=TILE_INCLUDE_FULL_IMAGE,
+                        model=None):
+    """Detect on overlapping tiles and merge the boxes in image coordinates"""
+    model = model or default_model
+    img_height, img_width = original_image.shape[:2]
+    windows = tile_windows(img_width, img_height, tile_size, overlap)
+    if include_full_image and len(windows) > 1:
+        # Catches objects larger than a tile
+        windows.append((0, 0, img_width, img_height))
+    
+    boxes, confidences, class_ids, on_seam = [], [], [], []
+    for start in range(0, len(windows), max(1, TILE_MAX_BATCH)):
+        chunk = windows[start:start + max(1, TILE_MAX_BATCH)]
+        with stage_timer("preprocess"):
+            blob = model.blob_buffers.get(len(chunk))
+            for slot, (x, y, w, h) in zip(blob, chunk):
+                letterbox_into(
+                    original_image[y:y + h, x:x + w], slot,
+                    model.input_width, model.input_height
+                )
+            geometry = image_geometry(
+                np.array([w for _, _, w, _ in chunk]),
+                np.array([h for _, _, _, h in chunk]),
+                model.input_width, model.input_height
+            )
+        
+        # All tiles of the chunk go through one session.run
+        with stage_timer("inference"):
+            outputs = model.scheduler.infer(blob)
+        
+        with stage_timer("postprocess"):
+            decoded = decode_predictions(
+                outputs[0], confidence_threshold, geometry.x_factor,
+                geometry.y_factor, geometry.pad_x, geometry.pad_y
+            )
+            for (x, y, w, h), (tile_boxes, tile_confidences, tile_class_ids) in zip(
+                chunk, decoded
+            ):
+                tile_boxes = tile_boxes + np.array([x, y, 0, 0], dtype=np.int32)
+                boxes.append(tile_boxes)
+                confidences.append(tile_confidences)
+                class_ids.append(tile_class_ids)
+                on_seam.append(
+                    seam_mask(tile_boxes, (x, y, w, h), img_width, img_height)
+                )
+    
+    with stage_timer("postprocess"):
+        boxes, scores, class_ids = merge_tile_detections(
+            np.concatenate(boxes), np.concatenate(confidences),
+            np.concatenate(class_ids), np.concatenate(on_seam),
+            confidence_threshold, nms_threshold
+        )
+        return build_detections(boxes, class_ids, np.arange(len(boxes)), scores)
+
+
+def predictions_to_detections(predictions, image_shape,
+                              confidence_threshold=0.45, nms_threshold=0.45,
+                              input_width=INPUT_WIDTH, input_height=INPUT_HEIGHT):
+    """Decode one image's raw predictions and apply NMS"""
+    # Get image dimensions
+    img_height, img_width = image_shape[:2]
+    
+    # Scale and padding used when the image was letterboxed
+    geometry = image_geometry(img_width, img_height, input_width, input_height)
+    
+    # Vectorized decode of all predictions at once
+    boxes, confidences, class_ids = decode_predictions(
+        predictions, confidence_threshold, geometry.x_factor,
+        geometry.y_factor, geometry.pad_x, geometry.pad_y
+    )[0]
+    
+    return apply_nms(
+        boxes, confidences, class_ids, confidence_threshold, nms_threshold
+    )
+
+
+def apply_nms(boxes, confidences, class_ids, confidence_threshold=0.45,
+              nms_threshold=0.45):
+    """Apply class-aware non-maximum suppression and build detections"""
+    keep, scores = non_max_suppression(
+        boxes, confidences, class_ids, nms_threshold, confidence_threshold
+    )
+    return build_detections(boxes, class_ids, keep, scores)
+
+
+def apply_batched_nms(decoded, confidence_threshold=0.45, nms_threshold=0.45):
+    """NMS for a whole batch of decoded images in one pass"""
+    return [
+        build_detections(boxes, class_ids, keep, scores)
+        for (boxes, _, class_ids), (keep, scores) in zip(
+            decoded,
+            batched_nms(decoded, nms_threshold, confidence_threshold)
+        )
+    ]
+
+
+def build_detections(boxes, class_ids, keep, scores):
+    """Detection dicts for the kept rows, highest score first"""
+    detections = []
+    for i, score in zip(keep.tolist(), scores.tolist()):
+        class_id = int(class_ids[i])
+        detections.append({
+            "class_id": class_id,
+            "class_name": CLASSES[class_id],
+            "confidence": score,
+            "box": [int(v) for v in boxes[i]]
+        })
+    
+    return detections
+
+
+def count_detections(detections):
+    """Group detections into per-class counts and confidence lists"""
+    detected_objects_count = {}
+    detected_objects_confidences = {}
+    
+    for detection in detections:
+        class_name = detection["class_name"]
+        confidence_value = detection["confidence"]
+        
+        # Update the count for this class
+        if class_name in detected_objects_count:
+            detected_objects_count[class_name] += 1
+            detected_objects_confidences[class_name].append(confidence_value)
+        else:
+            detected_objects_count[class_name] = 1
+            detected_objects_confidences[class_name] = [confidence_value]
+    
+    return detected_objects_count, detected_objects_confidences
+
+
+def draw_detections(original_image, detections, copy=True):
+    """Draw bounding boxes and labels on a copy of the image (or in place)"""
+    result_image = original_image.copy() if copy else original_image
+    
+    for detection in detections:
+        left, top, width, height = detection["box"]
+        class_name = detection["class_name"]
+        
+        # Draw bounding box
+        color = COLORS[detection["class_id"]].tolist()
+        cv2.rectangle(
+            result_image, (left, top), 
+            (left + width, top + height), color, 2
+        )
+        
+        label = f"{class_name} {detection['confidence']:.2f}"
+        
+        # Text position and size calculation
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_scale = 0.4
+        font_thickness = 1
+        
+        # Calculate text size
+        (text_width, text_height), baseline = cv2.getTextSize(
+            label, font, font_scale, font_thickness
+        )
+        
+        # Adjust text position if close to image top
+        MARGIN = 5  # Margin setting
+        
+        # If top is less than text height + baseline + margin, place text below box
+        if top < (text_height + baseline + MARGIN):
+            text_pos_x = left
+            text_pos_y = top + height + text_height + MARGIN
+        else:
+            text_pos_x = left
+            text_pos_y = top - MARGIN
+        
+        # Draw text background
+        text_bg_left = text_pos_x
+        text_bg_top = text_pos_y - text_height - baseline
+        text_bg_right = text_pos_x + text_width
+        text_bg_bottom = text_pos_y + baseline
+        
+        # Draw text background rectangle (same color as bounding box)
+        cv2.rectangle(
+            result_image, 
+            (text_bg_left, text_bg_top), 
+            (text_bg_right, text_bg_bottom), 
+            color, 
+            -1
+        )
+        
+        # Draw text in white
+        cv2.putText(
+            result_image, 
+            label, 
+            (text_pos_x, text_pos_y), 
+            font, 
+            font_scale, 
+            (255, 255, 255),
+            font_thickness, 
+            cv2.LINE_AA
+        )
+    
+    return result_image
+
+
+def render_preview(img, detections, max_side=RENDER_MAX_SIDE):
+    """
+    Draw detections on a preview no larger than max_side
+    The image is downscaled before drawing, so the cost follows the preview
+    size. Drawn in place when the image already fits (it is not reused).
+    """
+    height, width = img.shape[:2]
+    size = preview_size(width, height, max_side)
+    if size != (width, height):
+        img = downscale(img, size)
+        detections = rescale_detections(detections, (height, width), size)
+    return draw_detections(img, detections, copy=False)
+
+
+def detect_boxes(image, confidence_threshold=0.45, nms_threshold=0.45):
+    """
+    Detect objects without rendering
+    Returns (detections in original image pixels, (width, height))
+    """
+    with stage_timer("preprocess"):
+        img, original_size = load_image(image, with_size=True)
+    detections = run_detection(img, confidence_threshold, nms_threshold)
+    detections = rescale_detections(detections, img.shape, original_size)
+    del img
+    if LOW_MEMORY_MODE:
+        release_memory()
+    return detections, original_size
+
+
+def detect_and_render(image, confidence_threshold=0.45, nms_threshold=0.45,
+                      max_side=RENDER_MAX_SIDE):
+    """
+    Detect objects and draw them on a preview no larger than max_side
+    Returns (preview, detections in original image pixels)
+    """
+    # Load the image; the blob is only built when inference has to run
+    with stage_timer("preprocess"):
+        original_image, original_size = load_image(image, with_size=True)
+    
+    detections = run_detection(
+        original_image, confidence_threshold, nms_threshold
+    )
+    
+    # Draw the bounding boxes and labels on the preview
+    with stage_timer("render"):
+        result_image = render_preview(original_image, detections, max_side)
+        detections = rescale_detections(
+            detections, original_image.shape, original_size
+        )
+        del original_image
+    
+    if LOW_MEMORY_MODE:
+        # Blobs, raw outputs and tile buffers are gone; give the pages back
+        release_memory()
+    return result_image, detections
+
+
+def detect_objects(image, confidence_threshold=0.45, nms_threshold=0.45,
+                   max_side=RENDER_MAX_SIDE):
+    """
+    Detect objects in the image using ONNX model
+    The annotated result is a preview no larger than max_side (0 = as loaded)
+    """
+    if image is None:
+        return None, {}, {}
+
+    result_image, detections = detect_and_render(
+        image, confidence_threshold, nms_threshold, max_side
+    )
+    detected_objects_count, detected_objects_confidences = count_detections(
+        detections
+    )
+    return result_image, detected_objects_count, detected_objects_confidences
+
+
+def summarize_detections(detected_objects_count, detected_objects_confidences):
+    """Format per-class counts and confidences as the detection JSON summary"""
+    # Format detected objects for JSON component
+    detection_json = {}
+    
+    if detected_objects_count:
+        # Add total count
+        total_count = sum(detected_objects_count.values())
+        detection_json["Total Objects Detected"] = total_count
+        
+        # Add count by object class with confidence statistics
+        objects_dict = {}
+        for obj_class, count in sorted(
+            detected_objects_count.items(), 
+            key=lambda x: x[1], reverse=True
+        ):
+            # Calculate confidence statistics
+            confidences = detected_objects_confidences[obj_class]
+            
+            # Calculate statistics (average, min, max)
+            avg_conf = sum(confidences) / len(confidences)
+            min_conf = min(confidences)
+            max_conf = max(confidences)
+            
+            # Round to 2 decimal places for better display
+            avg_conf = round(avg_conf, 2)
+            min_conf = round(min_conf, 2)
+            max_conf = round(max_conf, 2)
+            
+            # Store object count and confidence statistics
+            objects_dict[f"{obj_class}"] = {
+                "Count": count,
+                "Confidence Stats": {
+                    "Average": avg_conf,
+                    "Min": min_conf,
+                    "Max": max_conf
+                }
+            }
+            
+        detection_json["Detected Objects List"] = objects_dict
+    else:
+        detection_json = {"Notice": "No objects detected"}
+
+    return detection_json
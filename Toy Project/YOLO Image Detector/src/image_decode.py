@@ -0,0 +1,157 @@
+"""
+In-memory image decoding
+
+Uploads are decoded straight from their bytes with cv2.imdecode, without
+copying them to a temporary file first. The header is checked before
+decoding: the format magic and, for JPEG, PNG and BMP, the pixel
+dimensions. Unsupported, truncated or oversized uploads are therefore
+rejected cheaply. JPEGs much larger than the model input are decoded at
+1/2, 1/4 or 1/8 resolution with OpenCV's IMREAD_REDUCED_* flags, which
+skips most of the IDCT work. DECODE_MAX_SIDE caps the decoded size of
+every image; callers get the original size back so boxes can be mapped to
+full-resolution coordinates.
+"""
+import os
+import struct
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from memory_profile import LOW_MEMORY_MODE
+
+# Decode configuration (overridable from the container environment)
+# Decode large JPEGs at reduced resolution when the model would shrink them anyway
+DECODE_REDUCED = os.environ.get("DECODE_REDUCED", "1") == "1"
+# Largest accepted image, in pixels (guards against decompression bombs)
+DECODE_MAX_PIXELS = int(os.environ.get("DECODE_MAX_PIXELS", "60000000"))
+# Longest side kept after decoding; larger images are shrunk (0 = full resolution)
+DECODE_MAX_SIDE = int(
+    os.environ.get("DECODE_MAX_SIDE", "1920" if LOW_MEMORY_MODE else "0")
+)
+
+REDUCED_COLOR_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# width/height are None when the format's header is not parsed (e.g. WebP)
+ImageHeader = namedtuple("ImageHeader", ["format", "width", "height"])
+
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_size(data):
+    """(width, height) from the first start-of-frame segment"""
+    offset = 2
+    length = len(data)
+    while offset + 4 <= length:
+        if data[offset] != 0xFF:
+            raise ValueError("Corrupt JPEG header")
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            # Markers without a length field
+            offset += 2
+            continue
+        (segment_length,) = struct.unpack(">H", bytes(data[offset + 2:offset + 4]))
+        if marker in _JPEG_SOF_MARKERS:
+            if offset + 9 > length:
+                break
+            height, width = struct.unpack(">HH", bytes(data[offset + 5:offset + 9]))
+            return width, height
+        if marker == 0xDA:
+            # Start of scan before any frame header
+            break
+        offset += 2 + segment_length
+    raise ValueError("Truncated JPEG header (no frame size found)")
+
+
+def read_header(data):
+    """
+    Identify the image format and size from its first bytes
+
+    Raises ValueError for unsupported or malformed headers and for images
+    above DECODE_MAX_PIXELS.
+    """
+    head = bytes(data[:32])
+    if head.startswith(b"\xff\xd8\xff"):
+        header = ImageHeader("jpeg", *_jpeg_size(data))
+    elif head.startswith(b"\x89PNG\r\n\x1a\n"):
+        if len(head) < 24 or head[12:16] != b"IHDR":
+            raise ValueError("Corrupt PNG header")
+        header = ImageHeader("png", *struct.unpack(">II", head[16:24]))
+    elif head.startswith(b"BM") and len(head) >= 26:
+        width, height = struct.unpack("<ii", head[18:26])
+        header = ImageHeader("bmp", width, abs(height))
+    elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        header = ImageHeader("webp", None, None)
+    else:
+        raise ValueError("Unsupported image format (expected JPEG, PNG, BMP or WebP)")
+
+    if header.width is not None:
+        if header.width <= 0 or header.height <= 0:
+            raise ValueError(f"Invalid image size {header.width}x{header.height}")
+        if header.width * header.height > DECODE_MAX_PIXELS:
+            raise ValueError(
+                f"Image too large: {header.width}x{header.height} "
+                f"(limit {DECODE_MAX_PIXELS} pixels)"
+            )
+    return header
+
+
+def reduction_factor(header, target_side):
+    """Largest 2/4/8 reduction that keeps the long side >= target_side"""
+    if header.format != "jpeg" or not target_side:
+        return 1
+    long_side = max(header.width, header.height)
+    for factor in (8, 4, 2):
+        if long_side // factor >= target_side:
+            return factor
+    return 1
+
+
+def decode_image(data, target_side=None, reduced=DECODE_REDUCED,
+                 max_side=DECODE_MAX_SIDE):
+    """
+    Decode encoded image bytes (bytes, bytearray, memoryview or uint8 array)
+
+    With target_side set (and reduced enabled), large JPEGs are decoded at
+    reduced resolution but never below target_side on the long side.
+    With max_side set, the decoded image is shrunk to fit it.
+    Returns (RGB array, (original width, original height)).
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    header = read_header(buffer)
+    if max_side and target_side:
+        target_side = min(target_side, max_side)
+    factor = reduction_factor(header, target_side or max_side) if reduced else 1
+    img = cv2.imdecode(buffer, REDUCED_COLOR_FLAGS.get(factor, cv2.IMREAD_COLOR))
+    if img is None:
+        raise ValueError(f"Unable to decode {header.format.upper()} image data")
+
+    height, width = img.shape[:2]
+    original_width, original_height = width, height
+    if factor != 1:
+        original_width, original_height = header.width, header.height
+        if (width > height) != (original_width > original_height):
+            # EXIF orientation rotated the decoded image
+            original_width, original_height = original_height, original_width
+
+    if max_side and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        resized = cv2.resize(
+            img, (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA
+        )
+        # Drop the full-size decode before the colour conversion
+        del img
+        img = resized
+    # The decoded array is ours, so convert to RGB in place
+    cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+    return img, (original_width, original_height)
+
@@ -0,0 +1,154 @@
+"""
+Letterbox preprocessing into reusable NCHW buffers
+
+Images are resized to fit the model input while keeping their aspect
+ratio and centred on a grey (114) canvas, as YOLOv5 was trained. Pixels
+are normalized and transposed straight into a float32 (batch, 3, H, W)
+buffer: one uint8 resize, then a single multiply writes the HWC image
+into its CHW slot, with no intermediate float image or extra copy.
+
+The same geometry (scale and padding per axis) is recomputed from the
+image size when decoding, so boxes map back to the original pixels
+exactly. letterbox_geometry accepts scalars or arrays of sizes.
+"""
+import os
+import threading
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# YOLOv5 letterbox fill colour
+PAD_VALUE = 114
+# Largest batch a per-thread buffer keeps between requests (0 = unlimited;
+# overridable from the container environment). A retained 8-tile chunk
+# would pin ~39 MB in every request thread.
+BLOB_BUFFER_MAX_RETAINED = int(os.environ.get("BLOB_BUFFER_MAX_RETAINED", "1"))
+
+_INV_255 = np.float32(1 / 255.0)
+
+# x_factor/y_factor scale model pixels back to image pixels after the
+# pad_x/pad_y border is subtracted
+Letterbox = namedtuple(
+    "Letterbox",
+    ["x_factor", "y_factor", "pad_x", "pad_y", "resized_width", "resized_height"]
+)
+
+
+def letterbox_geometry(width, height, input_width, input_height):
+    """Resize and padding for (an array of) width x height images"""
+    width = np.asarray(width, dtype=np.float64)
+    height = np.asarray(height, dtype=np.float64)
+    scale = np.minimum(input_width / width, input_height / height)
+    resized_width = np.clip(np.round(width * scale), 1, input_width).astype(np.int64)
+    resized_height = np.clip(np.round(height * scale), 1, input_height).astype(np.int64)
+    return Letterbox(
+        # Per-axis factors undo the rounding of the resized size as well
+        x_factor=width / resized_width,
+        y_factor=height / resized_height,
+        pad_x=(input_width - resized_width) // 2,
+        pad_y=(input_height - resized_height) // 2,
+        resized_width=resized_width,
+        resized_height=resized_height,
+    )
+
+
+def letterbox_into(img, out, input_width, input_height, pad_value=PAD_VALUE):
+    """
+    Write one HWC uint8 image into a (3, input_height, input_width) float32 slot
+
+    img may be a view (e.g. a tile of a larger image). Returns the
+    Letterbox geometry used.
+    """
+    height, width = img.shape[:2]
+    geometry = letterbox_geometry(width, height, input_width, input_height)
+    resized_width = int(geometry.resized_width)
+    resized_height = int(geometry.resized_height)
+    left, top = int(geometry.pad_x), int(geometry.pad_y)
+    right, bottom = left + resized_width, top + resized_height
+
+    if (resized_width, resized_height) != (width, height):
+        img = cv2.resize(
+            img, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR
+        )
+
+    # Only the border is filled; the image area is overwritten below
+    fill = pad_value * _INV_255
+    out[:, :top] = fill
+    out[:, bottom:] = fill
+    out[:, top:bottom, :left] = fill
+    out[:, top:bottom, right:] = fill
+
+    # HWC uint8 -> CHW float32 in [0, 1], written in place
+    np.multiply(
+        img.transpose(2, 0, 1), _INV_255, out=out[:, top:bottom, left:right],
+        casting="unsafe"
+    )
+    return geometry
+
+
+def letterbox_image(img, input_width, input_height, pad_value=PAD_VALUE):
+    """
+    Letterbox one HWC uint8 image onto an (input_height, input_width, 3) uint8 canvas
+
+    A quarter of the size of the float32 blob, for handing images between
+    processes; letterbox_into turns the canvas into a blob slot without
+    resizing it again.
+    """
+    height, width = img.shape[:2]
+    geometry = letterbox_geometry(width, height, input_width, input_height)
+    resized_width = int(geometry.resized_width)
+    resized_height = int(geometry.resized_height)
+    left, top = int(geometry.pad_x), int(geometry.pad_y)
+
+    canvas = np.full((input_height, input_width, 3), pad_value, dtype=np.uint8)
+    if (resized_width, resized_height) != (width, height):
+        img = cv2.resize(
+            img, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR
+        )
+    canvas[top:top + resized_height, left:left + resized_width] = img
+    return canvas
+
+
+def letterbox_blob(img, input_width, input_height, out=None):
+    """(1, 3, H, W) model input for one image, written into out if given"""
+    if out is None:
+        out = np.empty((1, 3, input_height, input_width), dtype=np.float32)
+    letterbox_into(img, out[0], input_width, input_height)
+    return out
+
+
+class BlobBuffers:
+    """
+    Per-thread preallocated (batch, 3, H, W) float32 input buffers
+
+    A request thread fills its buffer and blocks until inference has
+    consumed it, so each thread can reuse the same memory for every
+    request. Buffers grow to the largest batch a thread has asked for, up
+    to max_retained; larger batches (e.g. tile chunks) get a temporary
+    buffer that is freed with the request. Callers that hand a blob to
+    another thread and keep going (e.g. the video decode stage) must
+    allocate their own instead.
+    """
+
+    def __init__(self, input_width, input_height,
+                 max_retained=BLOB_BUFFER_MAX_RETAINED):
+        self.input_width = input_width
+        self.input_height = input_height
+        self.max_retained = max_retained
+        self._local = threading.local()
+
+    def get(self, batch_size=1):
+        if self.max_retained and batch_size > self.max_retained:
+            return np.empty(
+                (batch_size, 3, self.input_height, self.input_width),
+                dtype=np.float32
+            )
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[0] < batch_size:
+            buffer = np.empty(
+                (batch_size, 3, self.input_height, self.input_width),
+                dtype=np.float32
+            )
+            self._local.buffer = buffer
+        return buffer[:batch_size]
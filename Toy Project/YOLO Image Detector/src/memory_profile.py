@@ -0,0 +1,118 @@
+"""
+Low-memory serving mode and resident-memory measurement
+
+LOW_MEMORY_MODE=1 is meant for 1 GB hosts (t2.micro). It changes the
+defaults of several other modules:
+- ONNX Runtime runs without the CPU arena, memory patterns or weight
+  prepacking, with graph optimization "extended". The "all" level adds
+  layout transforms that copy every weight.
+- Models exported with external data are memory-mapped by ONNX Runtime, so
+  worker processes share the weight pages through the page cache.
+- Decoded images are capped at DECODE_MAX_SIDE.
+- The prediction cache is smaller.
+- Freed heap memory is handed back to the OS after each request.
+
+Peak resident memory per stage is read from VmHWM, which is reset before
+every stage through /proc/self/clear_refs. The numbers are process-wide,
+so they are per request only when requests run one at a time, as in
+benchmarks/bench_memory.py.
+"""
+import os
+import ctypes
+import ctypes.util
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger("gradio_app")
+
+LOW_MEMORY_MODE = os.environ.get("LOW_MEMORY_MODE", "0") == "1"
+
+_libc = None
+
+
+def _status_kb(field):
+    """A VmRSS/VmHWM-style field of /proc/self/status in kB (0 if unavailable)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def rss_bytes():
+    """Current resident set size"""
+    return _status_kb("VmRSS") * 1024
+
+
+def anon_rss_bytes():
+    """Private (anonymous) part of the RSS; file-backed pages can be shared"""
+    return _status_kb("RssAnon") * 1024
+
+
+def peak_rss_bytes():
+    """Highest resident set size since start or the last reset_peak_rss()"""
+    return _status_kb("VmHWM") * 1024
+
+
+def reset_peak_rss():
+    """Restart peak tracking at the current RSS (False where unsupported)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def release_memory():
+    """Return free heap pages to the OS (glibc malloc_trim; no-op elsewhere)"""
+    global _libc
+    if _libc is None:
+        path = ctypes.util.find_library("c")
+        _libc = ctypes.CDLL(path) if path else False
+    if _libc and hasattr(_libc, "malloc_trim"):
+        _libc.malloc_trim(0)
+
+
+class MemoryProfile:
+    """Peak and retained RSS per pipeline stage, over repeated requests"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        reset_peak_rss()
+        before = rss_bytes()
+        anon_before = anon_rss_bytes()
+        try:
+            yield
+        finally:
+            peak = peak_rss_bytes()
+            after = rss_bytes()
+            samples = self.stages.setdefault(
+                name, {"peak": [], "growth": [], "retained": [], "private": []}
+            )
+            samples["peak"].append(max(peak, before, after))
+            samples["growth"].append(max(peak, after) - before)
+            samples["retained"].append(after - before)
+            samples["private"].append(anon_rss_bytes() - anon_before)
+
+    def report(self):
+        """
+        Per stage, in MB: worst peak RSS and growth above the stage's start,
+        and what the last run still held afterwards (in total and private)
+        """
+        to_mb = 1 / 1024 / 1024
+        return {
+            name: {
+                "peak_rss_mb": round(max(samples["peak"]) * to_mb, 1),
+                "peak_growth_mb": round(max(samples["growth"]) * to_mb, 1),
+                "retained_mb": round(samples["retained"][-1] * to_mb, 1),
+                "retained_private_mb": round(samples["private"][-1] * to_mb, 1),
+            }
+            for name, samples in self.stages.items()
+        }
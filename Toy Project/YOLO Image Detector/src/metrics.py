@@ -0,0 +1,292 @@
+"""
+Prometheus metrics and per-request trace ids
+
+Stage histograms, request/error/detection/cache/dedup counters and in-flight
+gauges are exported in Prometheus text format from /metrics (mounted on
+the same port as the Gradio UI). Every request gets a short trace id that
+is attached to all log lines written while it is being handled.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, make_asgi_app
+
+logger = logging.getLogger("gradio_app")
+
+# Buckets from 1 ms to 10 s, sized for CPU inference on a small instance
+STAGE_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+STAGE_SECONDS = Histogram(
+    "detector_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+REQUESTS_TOTAL = Counter(
+    "detector_requests_total", "Detection requests received", ["endpoint"]
+)
+ERRORS_TOTAL = Counter(
+    "detector_errors_total", "Detection requests that failed", ["endpoint"]
+)
+DETECTIONS_TOTAL = Counter(
+    "detector_detections_total", "Objects detected per class", ["class_name"]
+)
+CACHE_LOOKUPS_TOTAL = Counter(
+    "detector_prediction_cache_lookups_total",
+    "Prediction cache lookups by result",
+    ["result"]
+)
+DEDUP_LOOKUPS_TOTAL = Counter(
+    "detector_dedup_lookups_total",
+    "Perceptual-hash dedup lookups by result",
+    ["result"]
+)
+DEDUP_MATCH_DISTANCE = Histogram(
+    "detector_dedup_match_distance_bits",
+    "Hamming distance of dedup hits",
+    buckets=(0, 1, 2, 3, 4, 6, 8, 10, 12, 15)
+)
+DEDUP_VERIFICATIONS_TOTAL = Counter(
+    "detector_dedup_verifications_total",
+    "Sampled dedup hits checked against inference (match or false_match)",
+    ["result"]
+)
+IN_FLIGHT = Gauge(
+    "detector_requests_in_flight", "Requests currently being handled", ["endpoint"]
+)
+BATCH_QUEUE_DEPTH = Gauge(
+    "detector_batch_queue_depth", "Blobs waiting for the batch dispatcher"
+)
+BATCH_QUEUE_LIMIT = Gauge(
+    "detector_batch_queue_limit", "Admission limit of the batch queue (0 = unbounded)"
+)
+REQUESTS_SHED_TOTAL = Counter(
+    "detector_requests_shed_total",
+    "Blobs rejected (queue_full) or cancelled past their deadline (expired)",
+    ["reason"]
+)
+MODEL_ROUTES_TOTAL = Counter(
+    "detector_model_routes_total", "Requests routed to each registry model", ["model"]
+)
+MODEL_EXPECTED_LATENCY = Gauge(
+    "detector_model_expected_latency_seconds",
+    "Routing latency estimate per registry model", ["model"]
+)
+MODEL_QUEUE_DEPTH = Gauge(
+    "detector_model_batch_queue_depth",
+    "Blobs waiting for each registry model's batch dispatcher", ["model"]
+)
+MODEL_QUEUE_LIMIT = Gauge(
+    "detector_model_batch_queue_limit",
+    "Admission limit of each registry model's batch queue (0 = unbounded)", ["model"]
+)
+MODEL_REQUESTS_SHED_TOTAL = Counter(
+    "detector_model_requests_shed_total",
+    "Blobs shed per registry model (queue_full or expired)", ["model", "reason"]
+)
+MODEL_CACHE_BYTES = Gauge(
+    "detector_model_cache_weight_bytes",
+    "Weight-file size of the loaded registry sessions (not resident memory)"
+)
+STARTUP_SECONDS = Gauge(
+    "detector_startup_phase_seconds", "Time spent in each startup phase", ["phase"]
+)
+
+# Optional JSON file for the startup timing report
+STARTUP_REPORT_PATH = os.environ.get("STARTUP_REPORT_PATH", "")
+
+# Trace id of the request handled by the current thread/task
+_trace_id = contextvars.ContextVar("trace_id", default="-")
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+def install_trace_id_logging():
+    """Give every log record a trace_id attribute for the log format"""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "adds_trace_id", False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.trace_id = _trace_id.get()
+        return record
+
+    record_factory.adds_trace_id = True
+    logging.setLogRecordFactory(record_factory)
+
+
+@contextmanager
+def track_request(endpoint):
+    """
+    Count a request, keep it in the in-flight gauge and give it a trace id
+
+    Exceptions escaping the block are counted as errors; handlers that turn
+    failures into a response call record_error() themselves.
+    """
+    trace_id = uuid.uuid4().hex[:12]
+    previous = _trace_id.get()
+    # set() instead of reset(): Gradio may resume generators in another context
+    _trace_id.set(trace_id)
+    startup_timer.first_request()
+    REQUESTS_TOTAL.labels(endpoint).inc()
+    IN_FLIGHT.labels(endpoint).inc()
+    try:
+        yield trace_id
+    except Exception:
+        ERRORS_TOTAL.labels(endpoint).inc()
+        raise
+    finally:
+        IN_FLIGHT.labels(endpoint).dec()
+        _trace_id.set(previous)
+
+
+def record_error(endpoint):
+    ERRORS_TOTAL.labels(endpoint).inc()
+
+
+def stage_timer(stage):
+    """Context manager observing the block's duration in the stage histogram"""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def record_detections(detected_objects_count):
+    for class_name, count in detected_objects_count.items():
+        DETECTIONS_TOTAL.labels(class_name).inc(count)
+
+
+def record_cache_lookup(hit):
+    CACHE_LOOKUPS_TOTAL.labels("hit" if hit else "miss").inc()
+
+
+def record_dedup_lookup(hit, distance=None):
+    DEDUP_LOOKUPS_TOTAL.labels("hit" if hit else "miss").inc()
+    if hit:
+        DEDUP_MATCH_DISTANCE.observe(distance)
+
+
+def record_dedup_verification(agreed):
+    DEDUP_VERIFICATIONS_TOTAL.labels("match" if agreed else "false_match").inc()
+
+
+def record_shed(reason, count=1):
+    REQUESTS_SHED_TOTAL.labels(reason).inc(count)
+
+
+def watch_batch_queue(batch_scheduler):
+    """Report the scheduler's queue depth at scrape time and count shed blobs"""
+    BATCH_QUEUE_DEPTH.set_function(batch_scheduler.queue_depth)
+    BATCH_QUEUE_LIMIT.set(batch_scheduler.max_queue_depth)
+    # Export both series from the start so alerts see 0 rather than no data
+    for reason in ("queue_full", "expired"):
+        REQUESTS_SHED_TOTAL.labels(reason)
+    batch_scheduler.on_shed = record_shed
+
+
+def record_model_route(model_key):
+    MODEL_ROUTES_TOTAL.labels(model_key).inc()
+
+
+def _model_shed_recorder(model_key):
+    def record(reason, count=1):
+        # Also counted in the unlabelled total the alerts are built on
+        record_shed(reason, count)
+        MODEL_REQUESTS_SHED_TOTAL.labels(model_key, reason).inc(count)
+    return record
+
+
+def watch_model_registry(model_registry):
+    """Report per-model latency estimates, batch queues and cache size at scrape time"""
+    MODEL_CACHE_BYTES.set_function(model_registry.cached_bytes)
+    for model in model_registry.models:
+        MODEL_EXPECTED_LATENCY.labels(model.key).set_function(
+            lambda model=model: model_registry.expected_latency(model)
+        )
+        MODEL_QUEUE_DEPTH.labels(model.key).set_function(model.scheduler.queue_depth)
+        MODEL_QUEUE_LIMIT.labels(model.key).set(model.scheduler.max_queue_depth)
+        for reason in ("queue_full", "expired"):
+            MODEL_REQUESTS_SHED_TOTAL.labels(model.key, reason)
+        model.scheduler.on_shed = _model_shed_recorder(model.key)
+
+
+def _process_age():
+    """Seconds since the process was created (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # starttime is field 22; fields after the ")" of comm start at 3
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupTimer:
+    """
+    Phase timings from process creation to the first handled request.
+
+    mark(phase) closes the phase that ran since the previous mark. The
+    report is logged (and written to STARTUP_REPORT_PATH if set) once the
+    first request arrives, so it includes the full time-to-first-request.
+    """
+
+    def __init__(self, report_path=STARTUP_REPORT_PATH):
+        self.report_path = report_path
+        # Measured from process creation so interpreter start-up and the
+        # imports that ran before this module are included
+        self.started = time.perf_counter() - _process_age()
+        self.phases = {}
+        self._last = self.started
+        self._first_request = None
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        with self._lock:
+            now = time.perf_counter()
+            self.phases[phase] = now - self._last
+            self._last = now
+        STARTUP_SECONDS.labels(phase).set(self.phases[phase])
+
+    def first_request(self):
+        with self._lock:
+            if self._first_request is not None:
+                return
+            self._first_request = time.perf_counter() - self.started
+        STARTUP_SECONDS.labels("time_to_first_request").set(self._first_request)
+        report = self.report()
+        logger.info(f"Startup timing: {json.dumps(report)}")
+        if self.report_path:
+            with open(self.report_path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    def report(self):
+        with self._lock:
+            phases = dict(self.phases)
+            first_request = self._first_request
+            ready = self._last - self.started
+        return {
+            "phases_ms": {name: round(value * 1000, 1) for name, value in phases.items()},
+            "ready_ms": round(ready * 1000, 1),
+            "time_to_first_request_ms": (
+                round(first_request * 1000, 1) if first_request is not None else None
+            ),
+        }
+
+
+startup_timer = StartupTimer()
+
+
+def create_metrics_app():
+    """ASGI app serving the Prometheus text exposition"""
+    return make_asgi_app()
@@ -0,0 +1,352 @@
+"""
+Registry of YOLOv5 exports with latency-budget routing
+
+MODEL_REGISTRY lists the exports the server may use, as name@input_size
+(e.g. "yolov5n@320,yolov5s@480,yolov5m@640"). Each one is loaded from
+<name>-<size>.onnx, or <name>.onnx for 640, in MODEL_REGISTRY_DIR. Every
+entry has its own session manager, batch scheduler and input buffers.
+The served default model (detector.py) is always part of the registry.
+
+Sessions are loaded on first use and kept in an LRU cache. The cache is
+bounded by the on-disk size of their weight files
+(MODEL_CACHE_MAX_WEIGHTS_MB), not by measured resident memory: a session
+also holds its arena and prepacked weights, so leave headroom below the
+container limit. The default model is never evicted, and neither is a
+model pinned by a request that is still using it.
+
+Requests are routed by quality tier (fast, balanced, best), by a latency
+budget in milliseconds, or both. The expected latency of an entry is a
+moving average of its measured inference time, including time spent
+queued. Under load the estimates grow and budgeted requests move to
+smaller models instead of timing out. Entries without a recent
+measurement are estimated from their GFLOPs and the best measured speed,
+so a model avoided under load is tried again once the load drops.
+"""
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+from batching import BatchScheduler
+from letterbox import BlobBuffers
+from prepare_model import external_data_path
+from session_manager import SessionManager, create_session_options
+
+logger = logging.getLogger("gradio_app")
+
+# Registry configuration (overridable from the container environment)
+# Comma-separated name@input_size entries; empty serves the default model only
+MODEL_REGISTRY = os.environ.get("MODEL_REGISTRY", "")
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", ".")
+# Weight-file size (not RSS) of all loaded sessions before least recently used ones are dropped
+MODEL_CACHE_MAX_WEIGHTS_MB = float(os.environ.get("MODEL_CACHE_MAX_WEIGHTS_MB", "1024"))
+# ORT intra-op threads of every non-default model's session (0 = the
+# caller's budget: one worker's share with INFERENCE_WORKERS, else the ORT default)
+MODEL_REGISTRY_THREADS = int(os.environ.get("MODEL_REGISTRY_THREADS", "0"))
+# Latency budget applied when a request sets none (0 = always use the default model)
+MODEL_LATENCY_BUDGET_MS = float(os.environ.get("MODEL_LATENCY_BUDGET_MS", "0"))
+# Weight of the newest measurement in the latency moving average
+MODEL_ROUTING_EWMA_ALPHA = float(os.environ.get("MODEL_ROUTING_EWMA_ALPHA", "0.2"))
+# Measurements older than this fall back to the GFLOPs estimate
+MODEL_ROUTING_STALE_S = float(os.environ.get("MODEL_ROUTING_STALE_S", "30"))
+# Assumed speed before anything has been measured
+MODEL_ROUTING_MS_PER_GFLOP = float(os.environ.get("MODEL_ROUTING_MS_PER_GFLOP", "4"))
+
+# Ultralytics' published GFLOPs at 640x640; cost scales with the input area
+YOLOV5_GFLOPS = {
+    "yolov5n": 4.5,
+    "yolov5s": 16.5,
+    "yolov5m": 49.0,
+    "yolov5l": 109.1,
+    "yolov5x": 205.7,
+}
+QUALITY_TIERS = ("fast", "balanced", "best")
+DEFAULT_INPUT_SIZE = 640
+
+
+def model_file(name, input_size, directory=MODEL_REGISTRY_DIR):
+    """Path of an export (prepare_model.py --weights NAME --input-size SIZE)"""
+    if input_size == DEFAULT_INPUT_SIZE:
+        return os.path.join(directory, f"{name}.onnx")
+    return os.path.join(directory, f"{name}-{input_size}.onnx")
+
+
+def parse_registry(spec):
+    """[(name, input_size)] from "name@size,..." (size defaults to 640)"""
+    entries = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, size = item.partition("@")
+        if name not in YOLOV5_GFLOPS:
+            raise ValueError(
+                f"Unknown model {name} in MODEL_REGISTRY "
+                f"(expected one of {tuple(YOLOV5_GFLOPS)})"
+            )
+        input_size = int(size) if size else DEFAULT_INPUT_SIZE
+        if input_size <= 0 or input_size % 32:
+            raise ValueError(f"Input size of {item} must be a multiple of 32")
+        entries.append((name, input_size))
+    return entries
+
+
+def weights_bytes(model_path):
+    """
+    Size of a model's weight files on disk, what the cache limit counts
+
+    Stable, unlike the RSS growth around a load, which includes whatever
+    other request threads allocate at the same time; a loaded session's
+    resident memory is larger (arena, prepacked weights).
+    """
+    size = os.path.getsize(model_path)
+    data_path = external_data_path(model_path)
+    if os.path.exists(data_path):
+        size += os.path.getsize(data_path)
+    return size
+
+
+class RegisteredModel:
+    """One export with its own session manager, scheduler and input buffers"""
+
+    def __init__(self, name, input_size, session_manager, backend=None,
+                 scheduler=None, blob_buffers=None):
+        self.name = name
+        self.input_width = input_size
+        self.input_height = input_size
+        self.key = f"{name}@{input_size}"
+        self.gflops = YOLOV5_GFLOPS[name] * (input_size / DEFAULT_INPUT_SIZE) ** 2
+        self.session_manager = session_manager
+        # The default model may run in the worker pool instead
+        self.backend = backend or session_manager
+        self.scheduler = scheduler or BatchScheduler(self.backend)
+        self.blob_buffers = blob_buffers or BlobBuffers(input_size, input_size)
+        self.weight_bytes = 0
+        self.load_lock = threading.Lock()
+        # Requests between acquire() and release(); pinned models are never evicted
+        self.pins = 0
+
+        # Latency moving average (seconds), best measurement and its age
+        self.latency = None
+        self.best_latency = None
+        self.measured_at = 0.0
+
+    @property
+    def model_path(self):
+        return self.session_manager.model_path
+
+
+class ModelRegistry:
+    """
+    Models ordered by cost, an LRU cache of their sessions and the router
+
+    acquire() must be called before a model's scheduler is used so its
+    session is accounted for and pinned, and release() once the request
+    is done with it; observe() feeds the latency estimates.
+    """
+
+    def __init__(self, models, default, max_bytes=int(MODEL_CACHE_MAX_WEIGHTS_MB * 1024 * 1024),
+                 latency_budget_ms=MODEL_LATENCY_BUDGET_MS,
+                 ewma_alpha=MODEL_ROUTING_EWMA_ALPHA,
+                 stale_after=MODEL_ROUTING_STALE_S,
+                 ms_per_gflop=MODEL_ROUTING_MS_PER_GFLOP):
+        by_key = {model.key: model for model in models}
+        by_key[default.key] = default
+        # Cheapest first; more compute is taken as higher quality
+        self.models = sorted(by_key.values(), key=lambda model: model.gflops)
+        self.default = default
+        self.max_bytes = max_bytes
+        self.latency_budget_ms = latency_budget_ms
+        self.ewma_alpha = ewma_alpha
+        self.stale_after = stale_after
+        self.ms_per_gflop = ms_per_gflop
+
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default, spec=MODEL_REGISTRY, directory=MODEL_REGISTRY_DIR,
+                 threads=MODEL_REGISTRY_THREADS):
+        """
+        Registry of the MODEL_REGISTRY exports that exist on disk
+
+        Non-default models run in this process with `threads` intra-op
+        threads and one inter-op thread each (0 keeps the ORT defaults).
+        """
+        session_options = (
+            create_session_options(intra_op_threads=threads, inter_op_threads=1)
+            if threads > 0 else None
+        )
+        models = []
+        for name, input_size in parse_registry(spec):
+            key = f"{name}@{input_size}"
+            if key == default.key:
+                continue
+            path = model_file(name, input_size, directory)
+            if not os.path.exists(path):
+                logger.warning(f"Model registry: {path} not found; skipping {key}")
+                continue
+            models.append(RegisteredModel(
+                name, input_size,
+                SessionManager(path, input_size, input_size, poll_interval=0,
+                               session_options=session_options)
+            ))
+        registry = cls(models, default)
+        if len(registry.models) > 1:
+            logger.info(
+                f"Model registry: {[model.key for model in registry.models]}, "
+                f"default {default.key}, cache limit "
+                f"{registry.max_bytes / 1024 / 1024:.0f} MB of weights, "
+                f"intra-op threads {threads or 'ORT default'}"
+            )
+        return registry
+
+    def get(self, key):
+        for model in self.models:
+            if model.key == key:
+                return model
+        raise ValueError(
+            f"Unknown model {key} (available: {[m.key for m in self.models]})"
+        )
+
+    def expected_latency(self, model, now=None):
+        """Expected seconds for one image on this model"""
+        now = time.perf_counter() if now is None else now
+        if model.latency is not None and now - model.measured_at <= self.stale_after:
+            return model.latency
+        # Unmeasured or stale: scale the fastest speed seen on any model
+        rates = [
+            m.best_latency / m.gflops for m in self.models
+            if m.best_latency is not None
+        ]
+        seconds_per_gflop = min(rates) if rates else self.ms_per_gflop / 1000
+        return model.gflops * seconds_per_gflop
+
+    def route(self, latency_budget_ms=None, quality=None, model=None):
+        """
+        Pick a model for one request
+
+        model selects an entry by key. quality caps the choice at the
+        fast/balanced/best tier (best alone selects the largest model).
+        With a latency budget (or MODEL_LATENCY_BUDGET_MS) the highest
+        quality entry expected to fit is chosen, and the cheapest when
+        none does. Without a tier, budgeted requests never go above the
+        default model.
+        """
+        if model:
+            return self.get(model)
+        budget_ms = latency_budget_ms or self.latency_budget_ms
+
+        if quality:
+            if quality not in QUALITY_TIERS:
+                raise ValueError(
+                    f"Unknown quality tier {quality} (expected one of {QUALITY_TIERS})"
+                )
+            top = {
+                "fast": 0,
+                "balanced": (len(self.models) - 1) // 2,
+                "best": len(self.models) - 1,
+            }[quality]
+            candidates = self.models[:top + 1]
+        elif budget_ms:
+            candidates = [m for m in self.models if m.gflops <= self.default.gflops]
+        else:
+            return self.default
+        if not budget_ms:
+            return candidates[-1]
+
+        now = time.perf_counter()
+        for candidate in reversed(candidates):
+            if self.expected_latency(candidate, now) * 1000 <= budget_ms:
+                return candidate
+        return candidates[0]
+
+    def observe(self, model, seconds):
+        """Record the measured latency of one request on a model"""
+        with self._lock:
+            if model.latency is None:
+                model.latency = seconds
+            else:
+                model.latency += self.ewma_alpha * (seconds - model.latency)
+            model.best_latency = (
+                seconds if model.best_latency is None
+                else min(model.best_latency, seconds)
+            )
+            model.measured_at = time.perf_counter()
+
+    def acquire(self, model):
+        """
+        Load the model's session if needed, mark it recently used and pin it
+        Every acquire() must be paired with a release()
+        """
+        with self._lock:
+            model.pins += 1
+            if model.key in self._loaded:
+                self._loaded.move_to_end(model.key)
+                return model
+
+        # Loading takes seconds; only requests for this model wait for it
+        try:
+            with model.load_lock:
+                with self._lock:
+                    if model.key in self._loaded:
+                        return model
+                model.backend.current()
+                model.weight_bytes = weights_bytes(model.model_path)
+                with self._lock:
+                    self._loaded[model.key] = model
+                    self._evict()
+        except Exception:
+            self.release(model)
+            raise
+        logger.info(
+            f"Model registry: {model.key} loaded "
+            f"({model.weight_bytes / 1024 / 1024:.0f} MB of weights, cache "
+            f"{self.cached_bytes() / 1024 / 1024:.0f} MB)"
+        )
+        return model
+
+    def release(self, model):
+        """Unpin a model acquired by a finished request"""
+        with self._lock:
+            model.pins -= 1
+            # Eviction may have been held back by this pin
+            if model.pins == 0:
+                self._evict()
+
+    def _evict(self):
+        total = sum(model.weight_bytes for model in self._loaded.values())
+        for key in list(self._loaded):
+            if total <= self.max_bytes:
+                break
+            model = self._loaded[key]
+            # Unloading a model in use would make its next current() reload it
+            # behind the cache's back
+            if model.pins > 0 or model is self.default:
+                continue
+            model.session_manager.unload()
+            del self._loaded[key]
+            total -= model.weight_bytes
+            logger.info(f"Model registry: evicted {key} to stay under the cache limit")
+
+    def cached_bytes(self):
+        """Weight-file bytes of the loaded sessions"""
+        with self._lock:
+            return sum(model.weight_bytes for model in self._loaded.values())
+
+    def stats(self):
+        """Per-model load state and latency estimates"""
+        now = time.perf_counter()
+        with self._lock:
+            loaded = set(self._loaded)
+        return {
+            model.key: {
+                "loaded": model.key in loaded,
+                "in_use": model.pins,
+                "weights_mb": round(model.weight_bytes / 1024 / 1024, 1),
+                "expected_latency_ms": round(self.expected_latency(model, now) * 1000, 2),
+                "queue_depth": model.scheduler.queue_depth(),
+            }
+            for model in self.models
+        }
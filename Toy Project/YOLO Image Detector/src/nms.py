@@ -0,0 +1,163 @@
+"""
+Class-aware non-maximum suppression
+
+Boxes of different classes are moved apart with a coordinate offset so
+that one greedy pass only ever compares boxes of the same class (a person
+box can no longer suppress an overlapping dog box). Candidates are
+pre-filtered to the top_k highest scores and at most max_det boxes are
+kept. Soft-NMS (Gaussian score decay) can be used instead of hard
+suppression.
+
+The greedy pass itself runs in OpenCV's C++ implementation
+(cv2.dnn.NMSBoxes / softNMSBoxes) on the offset boxes, which is faster
+than any per-box Python loop. Boxes are [left, top, width, height] like
+everywhere else in the pipeline; with class_agnostic=True the result is
+identical to the plain cv2.dnn.NMSBoxes call. batched_nms offsets boxes
+by image index as well, so a whole batch is suppressed in one call.
+"""
+import os
+
+import cv2
+import numpy as np
+
+# NMS configuration (overridable from the container environment)
+NMS_CLASS_AGNOSTIC = os.environ.get("NMS_CLASS_AGNOSTIC", "0") == "1"
+NMS_TOP_K = int(os.environ.get("NMS_TOP_K", "3000"))
+NMS_MAX_DET = int(os.environ.get("NMS_MAX_DET", "300"))
+NMS_SOFT = os.environ.get("NMS_SOFT", "0") == "1"
+NMS_SOFT_SIGMA = float(os.environ.get("NMS_SOFT_SIGMA", "0.5"))
+
+
+def offset_boxes(boxes, class_ids):
+    """Shift each class (or any group id) into its own region so groups can never overlap"""
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    if not len(boxes):
+        return boxes.astype(np.int32)
+    boxes = boxes.astype(np.int64)
+    # Larger than any box extent, so shifted classes stay disjoint
+    span = int(np.abs(boxes[:, :2]).max() + np.abs(boxes[:, 2:]).max()) * 2 + 1
+    shifted = boxes.copy()
+    shifted[:, :2] += np.asarray(class_ids, dtype=np.int64).reshape(-1, 1) * span
+    if shifted[:, :2].max() > np.iinfo(np.int32).max:
+        # Degenerate coordinates; fall back to float rectangles
+        return shifted.astype(np.float64)
+    return shifted.astype(np.int32)
+
+
+def _suppress(rects, scores, iou_threshold, score_threshold, top_k, soft,
+              sigma):
+    """One OpenCV pass over rects; (kept indices, kept scores), best first"""
+    # The OpenCV bindings convert plain lists faster than numpy arrays
+    rects, score_list = rects.tolist(), scores.tolist()
+
+    if soft:
+        kept_scores, keep = cv2.dnn.softNMSBoxes(
+            rects, score_list, score_threshold, iou_threshold,
+            top_k=top_k, sigma=sigma
+        )
+        keep = np.asarray(keep, dtype=np.int64).reshape(-1)
+        kept_scores = np.asarray(kept_scores, dtype=np.float32).reshape(-1)
+        # Decayed scores can drop below the threshold and change order
+        order = np.argsort(-kept_scores, kind="stable")
+        order = order[kept_scores[order] > score_threshold]
+        return keep[order], kept_scores[order]
+
+    keep = np.asarray(
+        cv2.dnn.NMSBoxes(rects, score_list, score_threshold, iou_threshold,
+                         top_k=top_k),
+        dtype=np.int64
+    ).reshape(-1)
+    return keep, scores[keep]
+
+
+def non_max_suppression(boxes, scores, class_ids, iou_threshold=0.45,
+                        score_threshold=0.0,
+                        class_agnostic=NMS_CLASS_AGNOSTIC, top_k=NMS_TOP_K,
+                        max_det=NMS_MAX_DET, soft=NMS_SOFT,
+                        sigma=NMS_SOFT_SIGMA):
+    """
+    Return (kept indices, kept scores), highest score first
+
+    Scores must exceed score_threshold (as in cv2.dnn.NMSBoxes). top_k
+    limits the candidates considered, max_det the boxes returned (0
+    disables either). Soft-NMS returns the decayed scores.
+    """
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    if not len(scores):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    if class_agnostic:
+        rects = np.asarray(boxes).reshape(-1, 4).astype(np.int32)
+    else:
+        rects = offset_boxes(boxes, class_ids)
+    keep, kept_scores = _suppress(
+        rects, scores, iou_threshold, score_threshold, max(0, top_k or 0),
+        soft, sigma
+    )
+
+    if max_det and max_det > 0:
+        keep, kept_scores = keep[:max_det], kept_scores[:max_det]
+    return keep, kept_scores
+
+
+def batched_nms(decoded, iou_threshold=0.45, score_threshold=0.0,
+                class_agnostic=NMS_CLASS_AGNOSTIC, top_k=NMS_TOP_K,
+                max_det=NMS_MAX_DET, soft=NMS_SOFT, sigma=NMS_SOFT_SIGMA):
+    """
+    NMS for several images in a single suppression pass
+
+    decoded: list of per-image (boxes, scores, class_ids) as returned by
+    postprocess.decode_predictions. Boxes are offset by image index (and
+    class) the same way classes are, so one OpenCV call never compares
+    boxes of different images. top_k is applied per image before the pass
+    and max_det per image after it. Returns a list of (kept indices, kept
+    scores) per image, matching non_max_suppression on each image.
+    """
+    decoded = list(decoded)
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+    top_k = max(0, top_k or 0)
+
+    all_boxes, all_scores, all_groups, image_ids, local_ids = [], [], [], [], []
+    num_classes = 1
+    for image, (boxes, scores, class_ids) in enumerate(decoded):
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        candidates = np.flatnonzero(scores > score_threshold)
+        if top_k and len(candidates) > top_k:
+            order = np.argsort(-scores[candidates], kind="stable")
+            candidates = np.sort(candidates[order[:top_k]])
+        if not len(candidates):
+            continue
+        class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)[candidates]
+        all_boxes.append(np.asarray(boxes).reshape(-1, 4)[candidates])
+        all_scores.append(scores[candidates])
+        all_groups.append(class_ids)
+        image_ids.append(np.full(len(candidates), image, dtype=np.int64))
+        local_ids.append(candidates)
+        num_classes = max(num_classes, int(class_ids.max()) + 1)
+    if not all_scores:
+        return [empty] * len(decoded)
+
+    image_ids = np.concatenate(image_ids)
+    local_ids = np.concatenate(local_ids)
+    if class_agnostic:
+        groups = image_ids
+    else:
+        groups = image_ids * num_classes + np.concatenate(all_groups)
+    keep, kept_scores = _suppress(
+        offset_boxes(np.concatenate(all_boxes), groups),
+        np.concatenate(all_scores), iou_threshold, score_threshold, 0, soft,
+        sigma
+    )
+
+    # keep is ordered by score, so a stable sort by image keeps each
+    # image's boxes best first
+    order = np.argsort(image_ids[keep], kind="stable")
+    keep, kept_scores = keep[order], kept_scores[order]
+    bounds = np.searchsorted(image_ids[keep], np.arange(len(decoded) + 1))
+    results = []
+    for image in range(len(decoded)):
+        start, stop = bounds[image], bounds[image + 1]
+        if max_det and max_det > 0:
+            stop = min(stop, start + max_det)
+        results.append((local_ids[keep[start:stop]], kept_scores[start:stop]))
+    return results
@@ -0,0 +1,115 @@
+import numpy as np
+
+from letterbox import letterbox_geometry
+from nms import non_max_suppression
+
+# YOLOv5 output row layout: 4 (bbox coords) + 1 (objectness) + 80 (class scores)
+BOX_SLICE = slice(0, 4)
+OBJECTNESS_INDEX = 4
+CLASS_SCORES_START = 5
+
+
+def decode_predictions(predictions, confidence_threshold, x_factor, y_factor,
+                       pad_x=0, pad_y=0):
+    """
+    Decode raw YOLOv5 output into per-image detections without a Python loop
+
+    predictions: (N, 25200, 85) or (25200, 85) model output
+    x_factor, y_factor: scalar or per-image (N,) scale back to image pixels
+    pad_x, pad_y: scalar or per-image (N,) letterbox border, in model
+    pixels, removed before scaling (see letterbox.letterbox_geometry)
+
+    Returns a list with one (boxes, scores, class_ids) tuple per image:
+    boxes are int32 [left, top, width, height], scores are the objectness
+    values and class_ids the argmax over class scores. Rows are kept in
+    model output order so NMS sees the same input as the per-row loop.
+    """
+    predictions = np.asarray(predictions)
+    if predictions.ndim == 2:
+        predictions = predictions[np.newaxis]
+    num_images = predictions.shape[0]
+
+    # Objectness filter over the whole batch at once
+    objectness = predictions[..., OBJECTNESS_INDEX]
+    image_idx, row_idx = np.nonzero(objectness >= confidence_threshold)
+    rows = predictions[image_idx, row_idx]
+
+    # Best class per candidate row, which must also clear the threshold
+    class_scores = rows[:, CLASS_SCORES_START:]
+    class_ids = np.argmax(class_scores, axis=1)
+    best_scores = class_scores[np.arange(len(rows)), class_ids]
+    keep = best_scores > confidence_threshold
+
+    rows = rows[keep]
+    image_idx = image_idx[keep]
+    class_ids = class_ids[keep]
+    scores = rows[:, OBJECTNESS_INDEX].astype(np.float32)
+
+    # center_x, center_y, width, height -> left, top, width, height
+    # (float64 math and truncation toward zero match int() in the old loop)
+    xywh = rows[:, BOX_SLICE].astype(np.float64)
+    x_scale = np.broadcast_to(
+        np.asarray(x_factor, dtype=np.float64), (num_images,)
+    )[image_idx]
+    y_scale = np.broadcast_to(
+        np.asarray(y_factor, dtype=np.float64), (num_images,)
+    )[image_idx]
+    x_pad = np.broadcast_to(
+        np.asarray(pad_x, dtype=np.float64), (num_images,)
+    )[image_idx]
+    y_pad = np.broadcast_to(
+        np.asarray(pad_y, dtype=np.float64), (num_images,)
+    )[image_idx]
+    boxes = np.empty((len(rows), 4), dtype=np.int32)
+    boxes[:, 0] = (xywh[:, 0] - xywh[:, 2] / 2 - x_pad) * x_scale
+    boxes[:, 1] = (xywh[:, 1] - xywh[:, 3] / 2 - y_pad) * y_scale
+    boxes[:, 2] = xywh[:, 2] * x_scale
+    boxes[:, 3] = xywh[:, 3] * y_scale
+
+    # Split back into per-image arrays (image_idx is sorted by np.nonzero)
+    splits = np.searchsorted(image_idx, np.arange(1, num_images))
+    return list(zip(
+        np.split(boxes, splits),
+        np.split(scores, splits),
+        np.split(class_ids, splits)
+    ))
+
+
+def suppress_predictions(predictions, image_shape, confidence_threshold,
+                         nms_threshold, input_width, input_height):
+    """
+    Decode one image's raw predictions and apply NMS
+
+    Only needs NumPy and OpenCV, so offline tools (the quantization gate
+    in the model-builder stage) can use it without the serving modules.
+    Returns kept (boxes, scores, class_ids) arrays, highest score first.
+    """
+    height, width = image_shape[:2]
+    geometry = letterbox_geometry(width, height, input_width, input_height)
+    boxes, scores, class_ids = decode_predictions(
+        predictions, confidence_threshold, geometry.x_factor,
+        geometry.y_factor, geometry.pad_x, geometry.pad_y
+    )[0]
+    keep, kept_scores = non_max_suppression(
+        boxes, scores, class_ids, nms_threshold, confidence_threshold
+    )
+    return boxes[keep], kept_scores, class_ids[keep]
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) / (M, 4) arrays of [left, top, width, height]"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    a_x2, a_y2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    b_x2, b_y2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    inter_w = np.clip(
+        np.minimum(a_x2[:, None], b_x2[None]) - np.maximum(a[:, None, 0], b[None, :, 0]),
+        0, None
+    )
+    inter_h = np.clip(
+        np.minimum(a_y2[:, None], b_y2[None]) - np.maximum(a[:, None, 1], b[None, :, 1]),
+        0, None
+    )
+    inter = inter_w * inter_h
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
@@ -0,0 +1,115 @@
+import os
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import record_cache_lookup
+from memory_profile import LOW_MEMORY_MODE
+
+logger = logging.getLogger("gradio_app")
+
+# Cache configuration (overridable from the container environment)
+PREDICTION_CACHE_MAX_MB = float(
+    os.environ.get("PREDICTION_CACHE_MAX_MB", "8" if LOW_MEMORY_MODE else "64")
+)
+# Lowest confidence threshold the UI allows; rows below it are never needed
+PREDICTION_CACHE_MIN_CONFIDENCE = float(
+    os.environ.get("PREDICTION_CACHE_MIN_CONFIDENCE", "0.1")
+)
+
+OBJECTNESS_INDEX = 4
+# Charged per entry on top of the array data (ndarray header, key and
+# OrderedDict node), so entries with no candidate rows still count
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def image_content_hash(img):
+    """Hash decoded pixel data so the same picture hits regardless of source"""
+    img = np.ascontiguousarray(img)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(img.shape).encode())
+    digest.update(str(img.dtype).encode())
+    digest.update(memoryview(img).cast("B"))
+    return digest.hexdigest()
+
+
+def candidate_rows(predictions, min_confidence):
+    """Rows of a single-image (1, rows, 85) prediction whose objectness clears min_confidence"""
+    mask = predictions[..., OBJECTNESS_INDEX] >= min_confidence
+    return predictions[mask][np.newaxis]
+
+
+def entry_bytes(compact):
+    """Bytes an entry is charged against the cache size"""
+    return compact.nbytes + ENTRY_OVERHEAD_BYTES
+
+
+class PredictionCache:
+    """
+    LRU cache of raw model predictions keyed by image hash + model version.
+
+    Only rows whose objectness clears min_confidence are stored, which is
+    enough to re-run decoding for any threshold at or above it and shrinks
+    an entry from ~8.5 MB to a few KB. Eviction is bounded by total bytes,
+    including a fixed overhead per entry.
+    """
+
+    def __init__(self, max_bytes=int(PREDICTION_CACHE_MAX_MB * 1024 * 1024),
+                 min_confidence=PREDICTION_CACHE_MIN_CONFIDENCE):
+        self.max_bytes = max_bytes
+        self.min_confidence = min_confidence
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def can_serve(self, confidence_threshold):
+        """Whether a stored entry holds every row needed for this threshold"""
+        return self.max_bytes > 0 and confidence_threshold >= self.min_confidence
+
+    def get(self, key):
+        with self._lock:
+            predictions = self._entries.get(key)
+            if predictions is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            hits, misses = self.hits, self.misses
+        record_cache_lookup(predictions is not None)
+        logger.info(
+            f"Prediction cache {'hit' if predictions is not None else 'miss'} "
+            f"(hits={hits}, misses={misses}, entries={len(self._entries)}, "
+            f"bytes={self._size})"
+        )
+        return predictions
+
+    def put(self, key, predictions):
+        """Store the candidate rows of a single-image (1, rows, 85) prediction"""
+        if self.max_bytes <= 0:
+            return
+        compact = candidate_rows(predictions, self.min_confidence)
+        if entry_bytes(compact) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= entry_bytes(previous)
+            self._entries[key] = compact
+            self._size += entry_bytes(compact)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= entry_bytes(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
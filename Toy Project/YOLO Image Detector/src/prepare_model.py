@@ -0,0 +1,270 @@
+"""
+Build-time model preparation
+
+Exports YOLOv5m to ONNX, checks the graph, runs a dummy inference to
+confirm the expected (batch, 25200, 85) output and writes a manifest with
+the artifact's SHA-256 next to it. Run this while building the image (it
+needs torch); the application only verifies the checksum at startup and
+never installs packages or exports models itself.
+
+With --external-data the weights go to <model>.data instead of the ONNX
+file. ONNX Runtime memory-maps that file, so with prepacking disabled
+(LOW_MEMORY_MODE) every worker process shares the same weight pages.
+
+Example:
+    python prepare_model.py --output yolov5m.onnx --yolov5-dir yolov5
+    python prepare_model.py --output yolov5m.onnx --verify-only
+    python prepare_model.py --weights yolov5n --input-size 320 --output yolov5n-320.onnx
+    python prepare_model.py --output yolov5m.onnx --external-data
+    python prepare_model.py --output yolov5m.onnx --variant int8-dynamic \\
+        --test-dir quant_test
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+
+import numpy as np
+import onnxruntime
+
+logger = logging.getLogger("gradio_app")
+
+INPUT_SIZE = 640
+NUM_OUTPUTS = 85
+MANIFEST_SUFFIX = ".manifest.json"
+EXTERNAL_DATA_SUFFIX = ".data"
+
+
+def manifest_path(model_path):
+    return model_path + MANIFEST_SUFFIX
+
+
+def external_data_path(model_path):
+    return model_path + EXTERNAL_DATA_SUFFIX
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_yolov5(output_path, weights="yolov5m", yolov5_dir="yolov5",
+                  opset=12, input_size=INPUT_SIZE):
+    """Export pretrained YOLOv5 weights to ONNX with a dynamic batch axis"""
+    import torch
+
+    if os.path.isdir(yolov5_dir):
+        model = torch.hub.load(yolov5_dir, weights, source="local", pretrained=True)
+    else:
+        model = torch.hub.load("ultralytics/yolov5", weights, pretrained=True)
+    model.eval()
+
+    dummy_input = torch.zeros(1, 3, input_size, input_size)
+    torch.onnx.export(
+        model.model,
+        dummy_input,
+        output_path,
+        opset_version=opset,
+        input_names=['images'],
+        output_names=['output'],
+        dynamic_axes={'images': {0: 'batch'}, 'output': {0: 'batch'}}
+    )
+    logger.info(
+        f"Exported {weights} at {input_size}x{input_size} to {output_path} "
+        f"(opset {opset})"
+    )
+
+
+def externalize_weights(model_path, data_path):
+    """Move the initializers of an ONNX file into one external data file"""
+    import onnx
+
+    model = onnx.load(model_path)
+    # Tensors are appended, so start from an empty file
+    if os.path.exists(data_path):
+        os.remove(data_path)
+    onnx.save_model(
+        model, model_path, save_as_external_data=True,
+        all_tensors_to_one_file=True, location=os.path.basename(data_path),
+        size_threshold=1024
+    )
+    logger.info(f"Moved the weights of {model_path} to {data_path}")
+
+
+def verify_model(model_path):
+    """Check the ONNX graph and the output shape of a dummy inference"""
+    import onnx
+
+    onnx.checker.check_model(model_path)
+    model = onnx.load(model_path, load_external_data=False)
+    opset = max(
+        (entry.version for entry in model.opset_import if entry.domain in ("", "ai.onnx")),
+        default=None
+    )
+
+    session = onnxruntime.InferenceSession(
+        model_path, providers=['CPUExecutionProvider']
+    )
+    model_input = session.get_inputs()[0]
+    input_name = model_input.name
+    # Square exports at any size (the registry serves 320/480/640)
+    input_size = model_input.shape[-1]
+    if not isinstance(input_size, int):
+        input_size = INPUT_SIZE
+    dummy = np.zeros((1, 3, input_size, input_size), dtype=np.float32)
+    output = session.run(None, {input_name: dummy})[0]
+    if output.ndim != 3 or output.shape[0] != 1 or output.shape[2] != NUM_OUTPUTS:
+        raise ValueError(
+            f"Unexpected model output shape {output.shape} "
+            f"(expected (1, predictions, {NUM_OUTPUTS}))"
+        )
+    return {
+        "opset": opset,
+        "input_name": input_name,
+        "input_size": input_size,
+        "output_shape": list(output.shape),
+    }
+
+
+def write_manifest(model_path, info, source):
+    manifest = {
+        "file": os.path.basename(model_path),
+        "sha256": file_sha256(model_path),
+        "size": os.path.getsize(model_path),
+        "source": source,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    data_path = external_data_path(model_path)
+    if os.path.exists(data_path):
+        manifest["external_data"] = {
+            "file": os.path.basename(data_path),
+            "sha256": file_sha256(data_path),
+            "size": os.path.getsize(data_path),
+        }
+    manifest.update(info)
+    with open(manifest_path(model_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def verify_artifact(model_path):
+    """
+    Compare a model file against its manifest
+
+    Raises ValueError when the size or checksum differ. Returns the
+    manifest, or None when the model has no manifest (e.g. mounted by hand).
+    """
+    path = manifest_path(model_path)
+    if not os.path.exists(path):
+        logger.warning(f"No manifest for {model_path}; skipping checksum verification")
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+
+    size = os.path.getsize(model_path)
+    if size != manifest["size"]:
+        raise ValueError(
+            f"Model {model_path} is {size} bytes, manifest says {manifest['size']}"
+        )
+    checksum = file_sha256(model_path)
+    if checksum != manifest["sha256"]:
+        raise ValueError(
+            f"Model {model_path} checksum {checksum} does not match manifest "
+            f"{manifest['sha256']}"
+        )
+    external = manifest.get("external_data")
+    if external:
+        data_path = os.path.join(os.path.dirname(model_path), external["file"])
+        if not os.path.exists(data_path) or file_sha256(data_path) != external["sha256"]:
+            raise ValueError(
+                f"External weights {data_path} are missing or do not match the manifest"
+            )
+    logger.info(f"Verified model artifact {model_path} (sha256 {checksum[:12]})")
+    return manifest
+
+
+def prepare(output_path, weights="yolov5m", yolov5_dir="yolov5", opset=12,
+            input_size=INPUT_SIZE, external_data=False):
+    """Export to a temporary file and only publish it once verified"""
+    temp_path = output_path + ".tmp"
+    export_yolov5(temp_path, weights, yolov5_dir, opset, input_size)
+    if external_data:
+        # The data file name is stored in the model, so use the final one
+        externalize_weights(temp_path, external_data_path(output_path))
+    try:
+        info = verify_model(temp_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, output_path)
+    return write_manifest(output_path, info, source=f"{weights} (torch.hub)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare a verified ONNX model artifact")
+    parser.add_argument("--output", default="yolov5m.onnx", help="ONNX file to write")
+    parser.add_argument("--weights", default="yolov5m", help="YOLOv5 model name")
+    parser.add_argument("--yolov5-dir", default="yolov5",
+                        help="Local yolov5 checkout (downloaded via torch.hub if missing)")
+    parser.add_argument("--opset", type=int, default=12)
+    parser.add_argument("--input-size", type=int, default=INPUT_SIZE,
+                        help="Square input size to export (multiple of 32)")
+    parser.add_argument("--external-data", action="store_true",
+                        help="Store the weights in <output>.data (memory-mapped at load)")
+    parser.add_argument("--variant", action="append", default=[],
+                        choices=["int8-dynamic", "int8-static"],
+                        help="Also build a quantized variant (repeatable)")
+    parser.add_argument("--calibration-dir", help="Image folder for int8-static")
+    parser.add_argument("--test-dir",
+                        help="Image folder for the variant accuracy gate (required with --variant)")
+    parser.add_argument("--verify-only", action="store_true",
+                        help="Only verify existing artifacts against their manifests")
+    args = parser.parse_args(argv)
+    if args.variant and not args.test_dir:
+        parser.error(
+            "--variant needs --test-dir: variants are only accepted through the accuracy gate"
+        )
+    return args
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    args = parse_args(argv)
+
+    if args.verify_only:
+        if verify_artifact(args.output) is None:
+            return 1
+        verify_model(args.output)
+        return 0
+
+    manifest = prepare(
+        args.output, args.weights, args.yolov5_dir, args.opset, args.input_size,
+        args.external_data
+    )
+    print(json.dumps(manifest, indent=2))
+
+    for variant in args.variant:
+        from quantize import build_variant, variant_path
+
+        accepted, _ = build_variant(
+            args.output, variant, args.calibration_dir, args.test_dir
+        )
+        if not accepted:
+            return 1
+        path = variant_path(args.output, variant)
+        write_manifest(path, verify_model(path), source=f"{variant} of {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
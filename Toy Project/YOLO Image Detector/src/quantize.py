@@ -0,0 +1,354 @@
+"""
+INT8 model variants and an accuracy-regression gate
+
+Builds dynamic- or static-INT8 versions of the FP32 ONNX model (static
+quantization is calibrated on a local image folder) and compares any
+variant against FP32 over a test set: latency, model size, box IoU and
+class agreement of matched detections. A variant is only written under
+its final name once it has passed the gate; without a test set it is
+never accepted. Variants are built offline or in the image's
+model-builder stage (prepare_model.py --variant), never at server startup.
+
+Example:
+    python quantize.py --mode int8-static --calibration-dir calib/ \\
+        --test-dir test_images/ --min-match-rate 0.9 --min-mean-iou 0.85
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+import cv2
+import numpy as np
+import onnxruntime
+
+from letterbox import letterbox_blob
+from postprocess import box_iou, suppress_predictions
+
+logger = logging.getLogger("gradio_app")
+
+# Selectable model variants and the file suffix each one is stored under
+MODEL_VARIANTS = {
+    "fp32": "",
+    "int8-dynamic": ".int8-dynamic",
+    "int8-static": ".int8-static",
+}
+
+# Accuracy gate defaults (overridable from the container environment)
+QUANT_MIN_MATCH_RATE = float(os.environ.get("QUANT_MIN_MATCH_RATE", "0.9"))
+QUANT_MIN_MEAN_IOU = float(os.environ.get("QUANT_MIN_MEAN_IOU", "0.85"))
+QUANT_MIN_CLASS_AGREEMENT = float(
+    os.environ.get("QUANT_MIN_CLASS_AGREEMENT", "0.95")
+)
+QUANT_CALIBRATION_LIMIT = int(os.environ.get("QUANT_CALIBRATION_LIMIT", "100"))
+QUANT_CALIBRATION_DIR = os.environ.get("QUANT_CALIBRATION_DIR", "")
+QUANT_TEST_DIR = os.environ.get("QUANT_TEST_DIR", "")
+MATCH_IOU_THRESHOLD = 0.5
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+# Used when the model input has dynamic spatial dimensions
+DEFAULT_INPUT_SIZE = 640
+
+
+def variant_path(base_path, variant):
+    """File path of a model variant, e.g. yolov5m.int8-dynamic.onnx"""
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(
+            f"Unknown model variant: {variant} "
+            f"(expected one of {sorted(MODEL_VARIANTS)})"
+        )
+    root, extension = os.path.splitext(base_path)
+    return f"{root}{MODEL_VARIANTS[variant]}{extension}"
+
+
+def list_images(image_dir, limit=None):
+    paths = sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+    return paths[:limit] if limit else paths
+
+
+def load_rgb(path):
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def input_spec(session):
+    """(input name, width, height) of a session's image input"""
+    model_input = session.get_inputs()[0]
+    height, width = model_input.shape[2:4]
+    return (
+        model_input.name,
+        width if isinstance(width, int) else DEFAULT_INPUT_SIZE,
+        height if isinstance(height, int) else DEFAULT_INPUT_SIZE,
+    )
+
+
+def create_calibration_reader(image_dir, input_name, input_width, input_height,
+                              limit=QUANT_CALIBRATION_LIMIT):
+    """Feed preprocessed blobs from an image folder to static quantization"""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class ImageCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self.paths = iter(list_images(image_dir, limit))
+
+        def get_next(self):
+            for path in self.paths:
+                img = load_rgb(path)
+                if img is None:
+                    logger.error(f"Skipping unreadable calibration image: {path}")
+                    continue
+                return {input_name: letterbox_blob(img, input_width, input_height)}
+            return None
+
+    return ImageCalibrationReader()
+
+
+def quantize_model(source_path, target_path, mode, calibration_dir=None,
+                   calibration_limit=QUANT_CALIBRATION_LIMIT):
+    """Write an INT8 copy of source_path to target_path"""
+    from onnxruntime import quantization
+
+    if mode == "int8-dynamic":
+        quantization.quantize_dynamic(
+            source_path, target_path, weight_type=quantization.QuantType.QUInt8
+        )
+    elif mode == "int8-static":
+        if not calibration_dir:
+            raise ValueError("Static quantization needs a calibration image folder")
+        input_name, input_width, input_height = input_spec(
+            onnxruntime.InferenceSession(
+                source_path, providers=['CPUExecutionProvider']
+            )
+        )
+        reader = create_calibration_reader(
+            calibration_dir, input_name, input_width, input_height,
+            calibration_limit
+        )
+        quantization.quantize_static(
+            source_path, target_path, reader,
+            quant_format=quantization.QuantFormat.QDQ,
+            activation_type=quantization.QuantType.QUInt8,
+            weight_type=quantization.QuantType.QInt8,
+            per_channel=True
+        )
+    else:
+        raise ValueError(f"Unsupported quantization mode: {mode}")
+    logger.info(f"Quantized model written: {target_path} ({mode})")
+
+
+def _match_detections(reference, candidate):
+    """
+    Greedy one-to-one matching of candidate boxes to reference boxes
+    Both are (boxes, class_ids) pairs of arrays
+    """
+    (reference_boxes, reference_classes), (candidate_boxes, candidate_classes) = (
+        reference, candidate
+    )
+    if not len(reference_boxes) or not len(candidate_boxes):
+        return []
+    iou = box_iou(reference_boxes, candidate_boxes)
+    matches = []
+    used_ref, used_cand = set(), set()
+    for flat in np.argsort(iou, axis=None)[::-1]:
+        r, c = np.unravel_index(flat, iou.shape)
+        if iou[r, c] < MATCH_IOU_THRESHOLD:
+            break
+        if r in used_ref or c in used_cand:
+            continue
+        used_ref.add(r)
+        used_cand.add(c)
+        matches.append((
+            float(iou[r, c]),
+            bool(reference_classes[r] == candidate_classes[c])
+        ))
+    return matches
+
+
+def _percentile_ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 2) if values else None
+
+
+def compare_models(reference_path, candidate_path, test_dir,
+                   confidence_threshold=0.45, nms_threshold=0.45):
+    """Run both models over a test set and report latency, size and agreement"""
+    sessions = {}
+    for name, path in (("reference", reference_path), ("candidate", candidate_path)):
+        session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        sessions[name] = (
+            session, session.get_inputs()[0].name,
+            [output.name for output in session.get_outputs()]
+        )
+    # Both variants come from the same export, so they share the input size
+    _, input_width, input_height = input_spec(sessions["reference"][0])
+
+    latencies = {"reference": [], "candidate": []}
+    reference_count = candidate_count = 0
+    ious, class_agreements = [], []
+    images = 0
+    for path in list_images(test_dir):
+        img = load_rgb(path)
+        if img is None:
+            continue
+        blob = letterbox_blob(img, input_width, input_height)
+        detections = {}
+        for name, (session, input_name, output_names) in sessions.items():
+            started = time.perf_counter()
+            outputs = session.run(output_names, {input_name: blob})
+            latencies[name].append(time.perf_counter() - started)
+            boxes, _, class_ids = suppress_predictions(
+                outputs[0], img.shape, confidence_threshold, nms_threshold,
+                input_width, input_height
+            )
+            detections[name] = (boxes, class_ids)
+        images += 1
+        reference_count += len(detections["reference"][0])
+        candidate_count += len(detections["candidate"][0])
+        for iou, same_class in _match_detections(
+            detections["reference"], detections["candidate"]
+        ):
+            ious.append(iou)
+            class_agreements.append(same_class)
+
+    if images == 0:
+        raise ValueError(f"No readable test images in {test_dir}")
+
+    return {
+        "images": images,
+        "reference": {
+            "path": reference_path,
+            "size_mb": round(os.path.getsize(reference_path) / 1024 / 1024, 2),
+            "latency_ms_p50": _percentile_ms(latencies["reference"], 50),
+            "latency_ms_p95": _percentile_ms(latencies["reference"], 95),
+            "detections": reference_count,
+        },
+        "candidate": {
+            "path": candidate_path,
+            "size_mb": round(os.path.getsize(candidate_path) / 1024 / 1024, 2),
+            "latency_ms_p50": _percentile_ms(latencies["candidate"], 50),
+            "latency_ms_p95": _percentile_ms(latencies["candidate"], 95),
+            "detections": candidate_count,
+        },
+        # Share of FP32 detections found again by the variant (IoU >= 0.5)
+        "match_rate": round(len(ious) / reference_count, 4) if reference_count else 1.0,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "class_agreement": (
+            round(float(np.mean(class_agreements)), 4) if class_agreements else None
+        ),
+    }
+
+
+def check_tolerance(report, min_match_rate=QUANT_MIN_MATCH_RATE,
+                    min_mean_iou=QUANT_MIN_MEAN_IOU,
+                    min_class_agreement=QUANT_MIN_CLASS_AGREEMENT):
+    """Return a list of gate failures (empty when the variant is accepted)"""
+    failures = []
+    if report["match_rate"] < min_match_rate:
+        failures.append(f"match rate {report['match_rate']} < {min_match_rate}")
+    if report["mean_iou"] is not None and report["mean_iou"] < min_mean_iou:
+        failures.append(f"mean IoU {report['mean_iou']} < {min_mean_iou}")
+    if (report["class_agreement"] is not None
+            and report["class_agreement"] < min_class_agreement):
+        failures.append(
+            f"class agreement {report['class_agreement']} < {min_class_agreement}"
+        )
+    return failures
+
+
+def build_variant(base_path, variant, calibration_dir=None, test_dir=None,
+                  **tolerances):
+    """
+    Quantize base_path into the variant's file, gated on the test set
+
+    The model is written to a temporary file first and only renamed to its
+    final path when the accuracy gate passes, so a test set is required.
+    Returns (accepted, report).
+    """
+    if not test_dir:
+        raise ValueError(
+            f"Building the {variant} variant needs a test set for the accuracy gate"
+        )
+    target_path = variant_path(base_path, variant)
+    temp_path = target_path + ".tmp"
+    quantize_model(base_path, temp_path, variant, calibration_dir)
+
+    try:
+        report = compare_models(base_path, temp_path, test_dir)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    failures = check_tolerance(report, **tolerances)
+    report["failures"] = failures
+    if failures:
+        os.remove(temp_path)
+        logger.error(f"Rejected {variant} variant: {'; '.join(failures)}")
+        return False, report
+
+    os.replace(temp_path, target_path)
+    report["candidate"]["path"] = target_path
+    logger.info(f"Accepted {variant} variant: {target_path}")
+    return True, report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build and gate INT8 model variants")
+    parser.add_argument("--model", default="yolov5m.onnx", help="FP32 ONNX model")
+    parser.add_argument("--mode", choices=["int8-dynamic", "int8-static"],
+                        default="int8-dynamic")
+    parser.add_argument("--calibration-dir", default=QUANT_CALIBRATION_DIR or None,
+                        help="Image folder for static calibration")
+    parser.add_argument("--test-dir", default=QUANT_TEST_DIR or None,
+                        help="Image folder for the FP32 comparison (required)")
+    parser.add_argument("--compare-only", metavar="VARIANT_PATH",
+                        help="Only compare an existing variant against FP32")
+    parser.add_argument("--min-match-rate", type=float, default=QUANT_MIN_MATCH_RATE)
+    parser.add_argument("--min-mean-iou", type=float, default=QUANT_MIN_MEAN_IOU)
+    parser.add_argument("--min-class-agreement", type=float,
+                        default=QUANT_MIN_CLASS_AGREEMENT)
+    parser.add_argument("--report", help="Write the comparison report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    args = parse_args(argv)
+    tolerances = {
+        "min_match_rate": args.min_match_rate,
+        "min_mean_iou": args.min_mean_iou,
+        "min_class_agreement": args.min_class_agreement,
+    }
+
+    if not args.test_dir:
+        raise SystemExit(
+            "--test-dir is required: variants are only accepted through the accuracy gate"
+        )
+    if args.compare_only:
+        report = compare_models(args.model, args.compare_only, args.test_dir)
+        report["failures"] = check_tolerance(report, **tolerances)
+        accepted = not report["failures"]
+    else:
+        accepted, report = build_variant(
+            args.model, args.mode, args.calibration_dir, args.test_dir,
+            **tolerances
+        )
+
+    if report is not None:
+        print(json.dumps(report, indent=2))
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+    return 0 if accepted else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Result rendering and transport
+
+Annotated results are drawn on a preview downscaled to RENDER_MAX_SIDE
+rather than on the full-resolution input, so drawing and encoding cost
+depends on what is shown and not on the upload size. Previews are
+encoded as JPEG or WebP at RENDER_QUALITY (PNG stays available for
+lossless output). In the UI they are written to small files so Gradio
+serves the compressed bytes as they are instead of re-encoding an RGB
+array (see PreviewFiles). Clients that draw their own boxes can skip
+rendering entirely and take the detections as JSON.
+"""
+import os
+import hashlib
+import tempfile
+import threading
+from collections import deque
+
+import cv2
+
+# Rendering configuration (overridable from the container environment)
+# Longest side of annotated previews (0 = input resolution)
+RENDER_MAX_SIDE = int(os.environ.get("RENDER_MAX_SIDE", "1280"))
+# jpeg, webp or png
+RENDER_FORMAT = os.environ.get("RENDER_FORMAT", "jpeg")
+RENDER_QUALITY = int(os.environ.get("RENDER_QUALITY", "85"))
+# Preview files kept on disk for the UI; older ones are deleted
+RENDER_KEEP_FILES = int(os.environ.get("RENDER_KEEP_FILES", "64"))
+
+# File extension, media type and quality flag per output format
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+    "png": (".png", "image/png", None),
+}
+
+
+def check_format(image_format):
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(
+            f"Unknown image format {image_format} (expected one of {tuple(IMAGE_FORMATS)})"
+        )
+    return image_format
+
+
+def media_type(image_format):
+    return IMAGE_FORMATS[check_format(image_format)][1]
+
+
+def preview_size(width, height, max_side=RENDER_MAX_SIDE):
+    """(width, height) of the preview; unchanged if it already fits"""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def downscale(rgb_image, size):
+    """
+    Shrink an image to size (width, height)
+    Halvings use OpenCV's fast 2x2 INTER_AREA path; the remaining factor,
+    below 2, is linear. A single INTER_AREA resize by an arbitrary factor
+    costs more than drawing and encoding the preview together.
+    """
+    width, height = size
+    while rgb_image.shape[1] >= 2 * width and rgb_image.shape[0] >= 2 * height:
+        rgb_image = cv2.resize(
+            rgb_image, (rgb_image.shape[1] // 2, rgb_image.shape[0] // 2),
+            interpolation=cv2.INTER_AREA
+        )
+    if (rgb_image.shape[1], rgb_image.shape[0]) != (width, height):
+        rgb_image = cv2.resize(rgb_image, size, interpolation=cv2.INTER_LINEAR)
+    return rgb_image
+
+
+def encode_image(rgb_image, image_format=RENDER_FORMAT, quality=RENDER_QUALITY,
+                 in_place=False):
+    """
+    Encode an RGB array as JPEG, WebP or PNG bytes
+    in_place converts the array itself to BGR instead of a full-size copy
+    """
+    extension, _, quality_flag = IMAGE_FORMATS[check_format(image_format)]
+    bgr_image = cv2.cvtColor(
+        rgb_image, cv2.COLOR_RGB2BGR, dst=rgb_image if in_place else None
+    )
+    params = [quality_flag, int(quality)] if quality_flag is not None else []
+    ok, encoded = cv2.imencode(extension, bgr_image, params)
+    if not ok:
+        raise ValueError(f"Unable to encode annotated image as {image_format}")
+    return encoded.tobytes()
+
+
+class PreviewFiles:
+    """
+    Encoded previews written to disk for Gradio to serve
+
+    Gradio copies every output file that lies outside its cache directory
+    (GRADIO_TEMP_DIR, by default <tmp>/gradio) into it before serving it.
+    The default directory is inside that cache, so the copy is skipped; a
+    directory elsewhere costs one extra copy per preview. Files go in one
+    subdirectory per content hash, and only the newest keep_files are kept.
+    """
+
+    def __init__(self, keep_files=RENDER_KEEP_FILES, directory=None):
+        self.keep_files = max(1, keep_files)
+        self.directory = directory or os.path.join(
+            os.environ.get("GRADIO_TEMP_DIR")
+            or os.path.join(tempfile.gettempdir(), "gradio"),
+            "previews"
+        )
+        self._paths = deque()
+        self._lock = threading.Lock()
+
+    def write(self, data, image_format=RENDER_FORMAT):
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        folder = os.path.join(self.directory, digest)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "result" + IMAGE_FORMATS[image_format][0])
+        with open(path, "wb") as f:
+            f.write(data)
+
+        with self._lock:
+            self._paths.append(path)
+            expired = []
+            while len(self._paths) > self.keep_files:
+                expired.append(self._paths.popleft())
+        for old_path in expired:
+            # The same picture may have been written again since
+            if old_path in self._paths:
+                continue
+            try:
+                os.remove(old_path)
+                os.rmdir(os.path.dirname(old_path))
+            except OSError:
+                pass
+        return path
@@ -0,0 +1,306 @@
+import os
+import threading
+import logging
+
+import numpy as np
+import onnxruntime
+
+from memory_profile import LOW_MEMORY_MODE
+
+logger = logging.getLogger("gradio_app")
+
+# Warm-up configuration (overridable from the container environment)
+WARMUP_RUNS = int(os.environ.get("MODEL_WARMUP_RUNS", "1"))
+WARMUP_BATCH_SIZES = [
+    int(size) for size in
+    os.environ.get("MODEL_WARMUP_BATCH_SIZES", "1").split(",") if size.strip()
+]
+RELOAD_POLL_INTERVAL = float(os.environ.get("MODEL_RELOAD_POLL_INTERVAL", "5"))
+
+# Inference backend and session options (overridable from the container environment)
+# LOW_MEMORY_MODE changes the defaults to keep weights memory-mapped and
+# release activation memory between runs (see memory_profile.py)
+# run: plain session.run; iobinding: bind numpy input/output buffers directly
+INFERENCE_BACKEND = os.environ.get("MODEL_INFERENCE_BACKEND", "run")
+# disable, basic, extended or all ("all" adds layout transforms that copy the weights)
+ORT_GRAPH_OPTIMIZATION = os.environ.get(
+    "ORT_GRAPH_OPTIMIZATION", "extended" if LOW_MEMORY_MODE else "all"
+)
+_MEMORY_DEFAULT = "0" if LOW_MEMORY_MODE else "1"
+ORT_ENABLE_CPU_MEM_ARENA = os.environ.get("ORT_ENABLE_CPU_MEM_ARENA", _MEMORY_DEFAULT) == "1"
+ORT_ENABLE_MEM_PATTERN = os.environ.get("ORT_ENABLE_MEM_PATTERN", _MEMORY_DEFAULT) == "1"
+# Prepacked weights are private copies; without prepacking, external-data
+# weights stay in the shared file mapping
+ORT_DISABLE_PREPACKING = os.environ.get(
+    "ORT_DISABLE_PREPACKING", "1" if LOW_MEMORY_MODE else "0"
+) == "1"
+# 0 lets ONNX Runtime pick (one thread per physical core)
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.environ.get("ORT_INTER_OP_THREADS", "0"))
+
+INFERENCE_BACKENDS = ("run", "iobinding")
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+TENSOR_DTYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+    "tensor(int64)": np.int64,
+    "tensor(int32)": np.int32,
+}
+
+
+def create_session_options(graph_optimization=ORT_GRAPH_OPTIMIZATION,
+                           cpu_mem_arena=ORT_ENABLE_CPU_MEM_ARENA,
+                           mem_pattern=ORT_ENABLE_MEM_PATTERN,
+                           intra_op_threads=ORT_INTRA_OP_THREADS,
+                           inter_op_threads=ORT_INTER_OP_THREADS,
+                           disable_prepacking=ORT_DISABLE_PREPACKING):
+    """ONNX Runtime SessionOptions from the tuning knobs"""
+    if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(
+            f"Unknown graph optimization level: {graph_optimization} "
+            f"(expected one of {tuple(GRAPH_OPTIMIZATION_LEVELS)})"
+        )
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    options.enable_cpu_mem_arena = cpu_mem_arena
+    options.enable_mem_pattern = mem_pattern
+    options.intra_op_num_threads = max(0, intra_op_threads)
+    options.inter_op_num_threads = max(0, inter_op_threads)
+    if disable_prepacking:
+        options.add_session_config_entry("session.disable_prepacking", "1")
+    return options
+
+
+class ModelHandle:
+    """
+    Immutable snapshot of a loaded model used for a single request
+
+    With the iobinding backend the input blob is bound in place and the
+    outputs are written straight into numpy arrays instead of being copied
+    out of ONNX Runtime. Callers that consume the outputs before their next
+    run can pass the same output_buffers() every time to avoid allocating
+    a new (batch, 25200, 85) array per inference.
+    """
+
+    def __init__(self, session, path, version, backend="run"):
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(
+                f"Unknown inference backend: {backend} "
+                f"(expected one of {INFERENCE_BACKENDS})"
+            )
+        self.session = session
+        self.path = path
+        self.version = version
+        self.backend = backend
+        self.input_name = session.get_inputs()[0].name
+        self.output_names = [output.name for output in session.get_outputs()]
+        # (shape after the batch axis, dtype) per output; None if not static
+        self._output_specs = []
+        for output in session.get_outputs():
+            tail = output.shape[1:]
+            static = all(isinstance(dim, int) for dim in tail)
+            dtype = TENSOR_DTYPES.get(output.type)
+            self._output_specs.append(
+                (tuple(tail), dtype) if static and dtype is not None else None
+            )
+        # IOBinding objects are not thread-safe; one per thread and batch size
+        self._local = threading.local()
+
+    def output_buffers(self, batch_size):
+        """Preallocated outputs for a batch size, or None for dynamic shapes"""
+        if any(spec is None for spec in self._output_specs):
+            return None
+        return [
+            np.empty((batch_size,) + tail, dtype=dtype)
+            for tail, dtype in self._output_specs
+        ]
+
+    def run(self, blob, outputs=None):
+        """
+        Run inference on a preprocessed NCHW blob
+        outputs: arrays from output_buffers() to fill (iobinding backend only)
+        """
+        if self.backend == "iobinding":
+            return self._run_bound(blob, outputs)
+        return self.session.run(self.output_names, {self.input_name: blob})
+
+    def _binding(self, batch_size):
+        bindings = getattr(self._local, "bindings", None)
+        if bindings is None:
+            bindings = self._local.bindings = {}
+        binding = bindings.get(batch_size)
+        if binding is None:
+            binding = bindings[batch_size] = self.session.io_binding()
+        return binding
+
+    def _run_bound(self, blob, outputs):
+        blob = np.ascontiguousarray(blob, dtype=np.float32)
+        batch_size = blob.shape[0]
+        binding = self._binding(batch_size)
+        binding.bind_input(
+            self.input_name, "cpu", 0, blob.dtype, blob.shape, blob.ctypes.data
+        )
+
+        if outputs is None:
+            outputs = self.output_buffers(batch_size)
+        if outputs is None:
+            # Dynamic output shape: let ONNX Runtime allocate
+            for name in self.output_names:
+                binding.bind_output(name, "cpu")
+            self.session.run_with_iobinding(binding)
+            return binding.copy_outputs_to_cpu()
+
+        for name, output in zip(self.output_names, outputs):
+            binding.bind_output(
+                name, "cpu", 0, output.dtype, output.shape, output.ctypes.data
+            )
+        self.session.run_with_iobinding(binding)
+        return outputs
+
+
+class SessionManager:
+    """
+    Keep one ONNX Runtime session per process.
+
+    The model is loaded and warmed up once. A background watcher polls the
+    model file and, when it changes, builds and warms up a new session
+    before swapping it in. Requests take a ModelHandle snapshot, so
+    in-flight inferences keep using the old session until they finish.
+    """
+
+    def __init__(self, model_path, input_width=640, input_height=640,
+                 providers=None, warmup_runs=WARMUP_RUNS,
+                 warmup_batch_sizes=None,
+                 poll_interval=RELOAD_POLL_INTERVAL,
+                 backend=INFERENCE_BACKEND, session_options=None):
+        self.model_path = model_path
+        self.input_width = input_width
+        self.input_height = input_height
+        self.providers = providers or ['CPUExecutionProvider']
+        self.backend = backend
+        self.session_options = session_options
+        self.warmup_runs = warmup_runs
+        self.warmup_batch_sizes = warmup_batch_sizes or WARMUP_BATCH_SIZES
+        self.poll_interval = poll_interval
+
+        self._handle = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._pending_version = None
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+    def _file_version(self):
+        """Identify the model file contents by modification time and size"""
+        stat = os.stat(self.model_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def _create_session(self):
+        return onnxruntime.InferenceSession(
+            self.model_path,
+            sess_options=self.session_options or create_session_options(),
+            providers=self.providers
+        )
+
+    def _warm_up(self, handle):
+        """Run dummy tensors through the session to trigger lazy allocation"""
+        for batch_size in self.warmup_batch_sizes:
+            dummy = np.zeros(
+                (batch_size, 3, self.input_height, self.input_width),
+                dtype=np.float32
+            )
+            for _ in range(self.warmup_runs):
+                handle.run(dummy)
+        logger.info(
+            f"Model warm-up complete: runs={self.warmup_runs}, "
+            f"batch sizes={self.warmup_batch_sizes}"
+        )
+
+    def load(self):
+        """Load (or reload) the model and atomically publish the new session"""
+        with self._reload_lock:
+            version = self._file_version()
+            logger.info(
+                f"Loading ONNX model {self.model_path} (version {version}, "
+                f"backend {self.backend})"
+            )
+            handle = ModelHandle(
+                self._create_session(), self.model_path, version, self.backend
+            )
+            self._warm_up(handle)
+            with self._lock:
+                previous = self._handle
+                self._handle = handle
+            if previous is not None:
+                logger.info(
+                    f"Model reloaded: {previous.version} -> {handle.version}"
+                )
+            return handle
+
+    def current(self):
+        """Return the active model snapshot, loading it on first use"""
+        with self._lock:
+            handle = self._handle
+        if handle is None:
+            handle = self.load()
+        return handle
+
+    def unload(self):
+        """Drop the session; the next current() loads it again"""
+        with self._lock:
+            self._handle = None
+
+    def check_for_update(self):
+        """Reload when the model file changed and has been stable for one poll"""
+        try:
+            version = self._file_version()
+        except FileNotFoundError:
+            return False
+
+        handle = self._handle
+        if handle is not None and version == handle.version:
+            self._pending_version = None
+            return False
+
+        # Wait one more poll so a file that is still being copied is not loaded
+        if version != self._pending_version:
+            self._pending_version = version
+            return False
+
+        self._pending_version = None
+        try:
+            self.load()
+            return True
+        except Exception as e:
+            logger.error(f"Model reload failed, keeping current session: {e}")
+            return False
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.check_for_update()
+
+    def start_watcher(self):
+        """Start polling the model file for hot reload"""
+        if self._watcher is not None or self.poll_interval <= 0:
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, name="model-reload-watcher", daemon=True
+        )
+        self._watcher.start()
+        logger.info(
+            f"Watching {self.model_path} for changes "
+            f"every {self.poll_interval}s"
+        )
+
+    def stop_watcher(self):
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
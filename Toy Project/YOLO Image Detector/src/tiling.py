@@ -0,0 +1,148 @@
+"""
+Tiled inference helpers for high-resolution images
+
+Large images are split into overlapping model-sized tiles (plus,
+optionally, the whole image squashed to the model size so large objects
+spanning several tiles are still seen). Boxes from every tile are shifted
+back to full-image coordinates and merged: class-aware NMS removes
+duplicates from the overlap regions, and fragments of objects cut off at
+a tile seam are merged back into one box.
+"""
+import os
+
+import numpy as np
+
+from nms import non_max_suppression
+from memory_profile import LOW_MEMORY_MODE
+
+# Tiling configuration (overridable from the container environment)
+# auto: tile when the long side exceeds TILE_AUTO_MIN_SIDE; always; never
+TILING_MODE = os.environ.get("TILING_MODE", "auto")
+TILE_SIZE = int(os.environ.get("TILE_SIZE", "640"))
+# Fraction of the tile shared with its neighbour
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.2"))
+TILE_AUTO_MIN_SIDE = int(os.environ.get("TILE_AUTO_MIN_SIDE", "1600"))
+TILE_INCLUDE_FULL_IMAGE = os.environ.get("TILE_INCLUDE_FULL_IMAGE", "1") == "1"
+# Tiles per session.run; bounds the (n, 25200, 85) output held in memory
+TILE_MAX_BATCH = int(
+    os.environ.get("TILE_MAX_BATCH", "2" if LOW_MEMORY_MODE else "8")
+)
+# Seam fragments overlapping a same-class box by this share (of the smaller
+# box) are merged into it
+TILE_MERGE_CONTAINMENT = float(os.environ.get("TILE_MERGE_CONTAINMENT", "0.5"))
+SEAM_MARGIN = 2
+
+TILING_MODES = ("auto", "always", "never")
+
+
+def should_tile(image_shape, mode=TILING_MODE, min_side=TILE_AUTO_MIN_SIDE):
+    if mode not in TILING_MODES:
+        raise ValueError(f"Unknown tiling mode: {mode} (expected one of {TILING_MODES})")
+    if mode == "never":
+        return False
+    if mode == "always":
+        return True
+    return max(image_shape[:2]) > min_side
+
+
+def _starts(length, tile, stride):
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    # The last tile is aligned to the edge instead of running past it
+    starts.append(length - tile)
+    return starts
+
+
+def tile_windows(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """(x, y, w, h) windows covering the image with the given overlap"""
+    stride = max(1, int(round(tile_size * (1 - overlap))))
+    return [
+        (x, y, min(tile_size, width), min(tile_size, height))
+        for y in _starts(height, tile_size, stride)
+        for x in _starts(width, tile_size, stride)
+    ]
+
+
+def seam_mask(boxes, window, width, height, margin=SEAM_MARGIN):
+    """Boxes touching an edge of their tile that lies inside the image"""
+    x, y, w, h = window
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    left, top = boxes[:, 0], boxes[:, 1]
+    right, bottom = left + boxes[:, 2], top + boxes[:, 3]
+    return (
+        ((x > 0) & (left <= x + margin))
+        | ((y > 0) & (top <= y + margin))
+        | ((x + w < width) & (right >= x + w - margin))
+        | ((y + h < height) & (bottom >= y + h - margin))
+    )
+
+
+def _containment_either_way(box, others):
+    """Largest share of either box's area covered by the other"""
+    left = np.maximum(box[0], others[:, 0])
+    top = np.maximum(box[1], others[:, 1])
+    right = np.minimum(box[0] + box[2], others[:, 0] + others[:, 2])
+    bottom = np.minimum(box[1] + box[3], others[:, 1] + others[:, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    smaller = np.minimum(box[2] * box[3], others[:, 2] * others[:, 3])
+    return inter / np.maximum(smaller, 1e-9)
+
+
+def merge_tile_detections(boxes, scores, class_ids, on_seam, confidence_threshold,
+                          nms_threshold, containment=TILE_MERGE_CONTAINMENT):
+    """
+    Merge full-image boxes gathered from all tiles
+
+    Boxes away from tile seams go through class-aware NMS as usual. Boxes
+    cut by a seam are only partial objects, so NMS alone keeps them next to
+    (or even instead of) the whole box; each one is instead merged into
+    the same-class box it mostly overlaps (union box, best score), or kept
+    as a new box. A final NMS pass cleans up the merged set.
+
+    Returns (boxes, scores, class_ids) arrays, highest score first.
+    """
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    class_ids = np.asarray(class_ids).reshape(-1)
+    on_seam = np.asarray(on_seam, dtype=bool).reshape(-1)
+
+    merged_boxes, merged_scores, merged_classes = [], [], []
+    for fragments in (False, True):
+        index = np.nonzero(on_seam == fragments)[0]
+        keep, kept_scores = non_max_suppression(
+            boxes[index], scores[index], class_ids[index],
+            nms_threshold, confidence_threshold
+        )
+        for i, score in zip(index[keep], kept_scores):
+            box = boxes[i].astype(np.float64)
+            if fragments and merged_boxes:
+                others = np.array(merged_boxes)
+                overlap = _containment_either_way(box, others)
+                overlap[np.array(merged_classes) != class_ids[i]] = 0.0
+                target = int(np.argmax(overlap))
+                if overlap[target] >= containment:
+                    # Grow the existing box to the union of both parts
+                    x1 = min(others[target, 0], box[0])
+                    y1 = min(others[target, 1], box[1])
+                    x2 = max(others[target, 0] + others[target, 2], box[0] + box[2])
+                    y2 = max(others[target, 1] + others[target, 3], box[1] + box[3])
+                    merged_boxes[target] = np.array([x1, y1, x2 - x1, y2 - y1])
+                    merged_scores[target] = max(merged_scores[target], score)
+                    continue
+            merged_boxes.append(box)
+            merged_scores.append(score)
+            merged_classes.append(class_ids[i])
+
+    if not merged_boxes:
+        return (
+            np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=class_ids.dtype)
+        )
+    merged_boxes = np.array(merged_boxes).astype(np.int32)
+    merged_scores = np.array(merged_scores, dtype=np.float32)
+    merged_classes = np.array(merged_classes)
+    keep, kept_scores = non_max_suppression(
+        merged_boxes, merged_scores, merged_classes, nms_threshold, 0.0
+    )
+    return merged_boxes[keep], kept_scores, merged_classes[keep]
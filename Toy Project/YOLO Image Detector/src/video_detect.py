@@ -0,0 +1,327 @@
+"""
+Streaming detection over video files and frame sequences
+
+Frames flow through a three-stage generator pipeline: a decode thread
+reads frames and builds blobs for keyframes, an inference thread runs
+them through the shared batch scheduler, and the consumer decodes boxes,
+applies NMS and tracking and yields one result per frame. Queues between
+stages are bounded, so long videos never sit in memory.
+
+Only every k-th frame is run through the model; boxes on the frames in
+between are carried forward by a lightweight IoU tracker.
+
+Example:
+    python video_detect.py input.mp4 --every 3 --output frames.jsonl \\
+        --annotated-output annotated.mp4
+"""
+import os
+import sys
+import json
+import queue
+import argparse
+import threading
+import logging
+
+import cv2
+import numpy as np
+
+from detector import (
+    batch_scheduler, create_blob, draw_detections, ensure_model_exists,
+    inference_backend, predictions_to_detections
+)
+from postprocess import box_iou
+
+logger = logging.getLogger("gradio_app")
+
+VIDEO_QUEUE_SIZE = int(os.environ.get("VIDEO_QUEUE_SIZE", "4"))
+FRAME_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+_END = object()
+
+
+def iter_frames(source):
+    """Yield (frame index, timestamp ms, BGR frame) from a video or frame directory"""
+    if os.path.isdir(source):
+        names = sorted(
+            name for name in os.listdir(source)
+            if os.path.splitext(name)[1].lower() in FRAME_EXTENSIONS
+        )
+        for index, name in enumerate(names):
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is None:
+                logger.error(f"Skipping unreadable frame: {name}")
+                continue
+            yield index, None, frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Unable to open video with OpenCV: {source}")
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield index, capture.get(cv2.CAP_PROP_POS_MSEC), frame
+            index += 1
+    finally:
+        capture.release()
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker that carries boxes between keyframes.
+
+    On each keyframe, detections are matched to existing tracks of the same
+    class by descending IoU. Matched tracks update a per-frame velocity,
+    which is used to extrapolate boxes on the skipped frames. Tracks that
+    go unmatched for more than max_missed keyframes are dropped.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=1):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, detections, frame_index):
+        """Match keyframe detections to tracks and return them with track ids"""
+        matched_tracks = set()
+        matched_detections = {}
+        if self.tracks and detections:
+            iou = box_iou(
+                [track["box"] for track in self.tracks],
+                [detection["box"] for detection in detections]
+            )
+            same_class = np.array([
+                [track["class_id"] == detection["class_id"] for detection in detections]
+                for track in self.tracks
+            ])
+            iou[~same_class] = 0.0
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                matched_tracks.add(t)
+                matched_detections[d] = t
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track["missed"] += 1
+                if track["missed"] <= self.max_missed:
+                    survivors.append(track)
+
+        results = []
+        for d, detection in enumerate(detections):
+            box = np.asarray(detection["box"], dtype=np.float64)
+            if d in matched_detections:
+                track = self.tracks[matched_detections[d]]
+                gap = max(1, frame_index - track["frame"])
+                track["velocity"] = (box - track["box"]) / gap
+                track["missed"] = 0
+            else:
+                track = {
+                    "id": self._next_id,
+                    "velocity": np.zeros(4),
+                    "missed": 0,
+                }
+                self._next_id += 1
+            track.update(
+                box=box, frame=frame_index,
+                class_id=detection["class_id"],
+                class_name=detection["class_name"],
+                confidence=detection["confidence"]
+            )
+            survivors.append(track)
+            results.append(dict(detection, track_id=track["id"]))
+
+        self.tracks = survivors
+        return results
+
+    def predict(self, frame_index):
+        """Extrapolate live tracks to a skipped frame"""
+        results = []
+        for track in self.tracks:
+            if track["missed"]:
+                continue
+            box = track["box"] + track["velocity"] * (frame_index - track["frame"])
+            results.append({
+                "class_id": track["class_id"],
+                "class_name": track["class_name"],
+                "confidence": track["confidence"],
+                "box": [int(v) for v in box],
+                "track_id": track["id"],
+            })
+        return results
+
+
+def _put(q, item, stop_event):
+    """Put with periodic stop checks so producers exit when the consumer does"""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop_event):
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def _decode_stage(source, every, out_q, stop_event):
+    try:
+        for index, timestamp_ms, frame in iter_frames(source):
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+            blob = create_blob(rgb) if index % every == 0 else None
+            if not _put(out_q, (index, timestamp_ms, rgb, blob), stop_event):
+                return
+        _put(out_q, _END, stop_event)
+    except Exception as e:
+        _put(out_q, e, stop_event)
+
+
+def _inference_stage(in_q, out_q, stop_event):
+    while True:
+        item = _get(in_q, stop_event)
+        if item is _END or isinstance(item, Exception):
+            _put(out_q, item, stop_event)
+            return
+        index, timestamp_ms, rgb, blob = item
+        predictions = None
+        if blob is not None:
+            try:
+                predictions = batch_scheduler.infer(blob)[0]
+            except Exception as e:
+                _put(out_q, e, stop_event)
+                return
+        if not _put(out_q, (index, timestamp_ms, rgb, predictions), stop_event):
+            return
+
+
+def detect_stream(source, every=1, confidence_threshold=0.45,
+                  nms_threshold=0.45, annotate=False,
+                  queue_size=VIDEO_QUEUE_SIZE):
+    """
+    Generator of per-frame detection results for a video or frame directory
+
+    Yields dicts with frame_index, timestamp_ms, keyframe, detections (with
+    track_id) and, when annotate is set, the annotated RGB frame as "image".
+    """
+    every = max(1, int(every))
+    stop_event = threading.Event()
+    decoded_q = queue.Queue(maxsize=queue_size)
+    inferred_q = queue.Queue(maxsize=queue_size)
+    workers = [
+        threading.Thread(
+            target=_decode_stage, args=(source, every, decoded_q, stop_event),
+            name="video-decode", daemon=True
+        ),
+        threading.Thread(
+            target=_inference_stage, args=(decoded_q, inferred_q, stop_event),
+            name="video-inference", daemon=True
+        ),
+    ]
+    for worker in workers:
+        worker.start()
+
+    tracker = IoUTracker()
+    try:
+        while True:
+            item = _get(inferred_q, stop_event)
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            index, timestamp_ms, rgb, predictions = item
+            keyframe = predictions is not None
+            if keyframe:
+                detections = tracker.update(
+                    predictions_to_detections(
+                        predictions, rgb.shape, confidence_threshold,
+                        nms_threshold
+                    ),
+                    index
+                )
+            else:
+                detections = tracker.predict(index)
+
+            result = {
+                "frame_index": index,
+                "timestamp_ms": timestamp_ms,
+                "keyframe": keyframe,
+                "detections": detections,
+            }
+            if annotate:
+                result["image"] = draw_detections(rgb, detections, copy=False)
+            yield result
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming YOLOv5 video detection")
+    parser.add_argument("source", help="Video file or directory of frame images")
+    parser.add_argument("--every", type=int, default=1,
+                        help="Run the model on every k-th frame and track in between")
+    parser.add_argument("--output", default="-", help="JSON Lines output file ('-' for stdout)")
+    parser.add_argument("--annotated-output", default=None,
+                        help="Optional path of an annotated MP4 to write")
+    parser.add_argument("--fps", type=float, default=25.0,
+                        help="Frame rate of the annotated output")
+    parser.add_argument("--confidence-threshold", type=float, default=0.45)
+    parser.add_argument("--nms-threshold", type=float, default=0.45)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    args = parse_args(argv)
+
+    ensure_model_exists()
+    inference_backend.current()
+
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    writer = None
+    try:
+        for result in detect_stream(
+            args.source, args.every, args.confidence_threshold,
+            args.nms_threshold, annotate=args.annotated_output is not None
+        ):
+            image = result.pop("image", None)
+            if image is not None:
+                if writer is None:
+                    height, width = image.shape[:2]
+                    writer = cv2.VideoWriter(
+                        args.annotated_output, cv2.VideoWriter_fourcc(*"mp4v"),
+                        args.fps, (width, height)
+                    )
+                writer.write(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+    finally:
+        if writer is not None:
+            writer.release()
+        if output_file is not sys.stdout:
+            output_file.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""
+Inference in a pool of worker processes
+
+Each worker process owns one ONNX Runtime session with a fixed thread
+budget (intra-op threads, one inter-op thread). Concurrent requests
+therefore use at most workers x threads cores, instead of every request
+thread driving a full-size ORT thread pool. Blobs and outputs are
+exchanged through per-worker shared-memory files (/dev/shm). Only a
+short JSON line per batch goes over the worker's stdin and a dedicated
+reply pipe; the worker's stdout is pointed at stderr, so stray prints
+from libraries cannot corrupt the protocol. Replies are polled up to the
+batch's request deadline (INFERENCE_WORKER_RUN_TIMEOUT without one); a
+worker that misses it is killed and restarted on its next use.
+
+Workers are plain `python worker_pool.py` subprocesses rather than
+multiprocessing children, so they never re-import the Gradio app. Each
+one hot-reloads the model file on its own. The pool has the same
+current()/run()/version interface as SessionManager, so the batch
+scheduler feeds it directly and keeps one batch in flight per worker.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import select
+import argparse
+import logging
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
+from batching import DeadlineExceededError, current_deadline
+from memory_profile import LOW_MEMORY_MODE
+
+logger = logging.getLogger("gradio_app")
+
+# Worker pool configuration (overridable from the container environment)
+# 0 runs inference in-process; "auto" starts one worker per two vCPUs
+INFERENCE_WORKERS = os.environ.get("INFERENCE_WORKERS", "0")
+# ORT intra-op threads per worker; 0 splits the vCPUs evenly between workers
+INFERENCE_WORKER_THREADS = int(os.environ.get("INFERENCE_WORKER_THREADS", "0"))
+# Images one shared-memory slot holds; larger blobs are split
+INFERENCE_WORKER_MAX_BATCH = int(
+    os.environ.get("INFERENCE_WORKER_MAX_BATCH", "2" if LOW_MEMORY_MODE else "8")
+)
+INFERENCE_WORKER_START_TIMEOUT = float(
+    os.environ.get("INFERENCE_WORKER_START_TIMEOUT", "120")
+)
+# Seconds a batch may take when no request deadline applies (0 = no limit)
+INFERENCE_WORKER_RUN_TIMEOUT = float(
+    os.environ.get("INFERENCE_WORKER_RUN_TIMEOUT", "300")
+)
+
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class WorkerTimeoutError(DeadlineExceededError):
+    """Raised when a worker did not reply before the deadline and was killed"""
+
+
+def resolve_worker_count(setting=INFERENCE_WORKERS, cpu_count=None):
+    """Number of worker processes for a setting of N, 0 or "auto" """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if str(setting).strip().lower() == "auto":
+        return max(1, cpu_count // 2)
+    return max(0, int(setting))
+
+
+def thread_budget(workers, threads=INFERENCE_WORKER_THREADS, cpu_count=None):
+    """ORT intra-op threads per worker"""
+    if threads > 0:
+        return threads
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, cpu_count // max(1, workers))
+
+
+def _shared_array(path, shape, dtype, create=False):
+    """numpy view of a file in shared memory, sized on creation"""
+    if create:
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "wb") as f:
+            f.truncate(size)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=tuple(shape))
+
+
+class _Worker:
+    """One worker subprocess and its shared input/output buffers"""
+
+    def __init__(self, index, model_path, input_width, input_height,
+                 max_batch, threads):
+        self.index = index
+        self.model_path = model_path
+        self.input_shape = (max_batch, 3, input_height, input_width)
+        self.max_batch = max_batch
+        self.threads = threads
+        self.version = None
+        self.process = None
+        self.inputs = None
+        self.outputs = []
+        # Read end of the reply pipe and the bytes read past the last line
+        self._reply_fd = None
+        self._poller = None
+        self._pending = b""
+
+    def _send(self, message):
+        self.process.stdin.write(json.dumps(message) + "\n")
+        self.process.stdin.flush()
+
+    def _receive(self, deadline=None):
+        """
+        Read one reply line, waiting until deadline (perf_counter) at most
+        A worker that misses the deadline is killed and WorkerTimeoutError raised
+        """
+        while b"\n" not in self._pending:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, int((deadline - time.perf_counter()) * 1000))
+            if not self._poller.poll(timeout):
+                self.process.kill()
+                self.process.wait()
+                raise WorkerTimeoutError(
+                    f"Inference worker {self.index} did not reply before the "
+                    f"deadline and was killed"
+                )
+            chunk = os.read(self._reply_fd, 65536)
+            if not chunk:
+                raise RuntimeError(
+                    f"Inference worker {self.index} exited "
+                    f"(code {self.process.poll()})"
+                )
+            self._pending += chunk
+        line, self._pending = self._pending.split(b"\n", 1)
+        return json.loads(line)
+
+    def start(self, timeout=None):
+        prefix = f"yolo-worker-{os.getpid()}-{self.index}-"
+        fd, input_path = tempfile.mkstemp(prefix=prefix, suffix=".in", dir=SHM_DIR)
+        os.close(fd)
+        output_paths = []
+        deadline = time.perf_counter() + timeout if timeout else None
+        try:
+            self.inputs = _shared_array(
+                input_path, self.input_shape, np.float32, create=True
+            )
+            self._reply_fd, reply_write_fd = os.pipe()
+            self._poller = select.poll()
+            self._poller.register(self._reply_fd, select.POLLIN)
+            self._pending = b""
+            try:
+                self.process = subprocess.Popen(
+                    [
+                        sys.executable, os.path.abspath(__file__),
+                        "--model", self.model_path,
+                        "--input", input_path,
+                        "--input-shape", ",".join(str(v) for v in self.input_shape),
+                        "--threads", str(self.threads),
+                        "--reply-fd", str(reply_write_fd),
+                    ],
+                    stdin=subprocess.PIPE, text=True, pass_fds=(reply_write_fd,),
+                    cwd=os.getcwd()
+                )
+            finally:
+                # Only the worker keeps the write end, so its exit reads as EOF
+                os.close(reply_write_fd)
+            ready = self._receive(deadline)
+            if "error" in ready:
+                raise RuntimeError(f"Inference worker {self.index}: {ready['error']}")
+
+            # Output sizes are only known once the worker has loaded the model
+            self.outputs = []
+            for tail, dtype in ready["outputs"]:
+                fd, path = tempfile.mkstemp(prefix=prefix, suffix=".out", dir=SHM_DIR)
+                os.close(fd)
+                output_paths.append(path)
+                self.outputs.append(_shared_array(
+                    path, (self.max_batch,) + tuple(tail), dtype, create=True
+                ))
+            self._send({"outputs": output_paths})
+            self._receive(deadline)
+            self.version = ready["version"]
+        except Exception:
+            self.close()
+            raise
+        finally:
+            # Both sides have the files mapped; unlinking now means nothing
+            # is left behind in /dev/shm even if a process crashes later
+            for path in [input_path] + output_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        logger.info(
+            f"Inference worker {self.index} ready: pid={self.process.pid}, "
+            f"threads={self.threads}, model version {self.version}"
+        )
+
+    def run(self, blob, deadline=None):
+        """Run up to max_batch images; returns copies of the outputs"""
+        size = blob.shape[0]
+        self.inputs[:size] = blob
+        self._send({"run": size})
+        reply = self._receive(deadline)
+        if "error" in reply:
+            raise RuntimeError(f"Inference worker {self.index}: {reply['error']}")
+        self.version = reply["version"]
+        # The slot is reused by the next batch, so hand out copies
+        return [np.array(output[:size]) for output in self.outputs]
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except Exception:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        if self._reply_fd is not None:
+            os.close(self._reply_fd)
+            self._reply_fd = None
+        self._poller = None
+        self._pending = b""
+        self.inputs = None
+        self.outputs = []
+
+
+class WorkerPool:
+    """
+    Fixed pool of inference worker processes
+
+    run() takes an idle worker (blocking until one is free), so at most
+    `workers` batches execute at once. A worker that dies, or misses the
+    deadline of the batch it runs, is restarted on its next use; the
+    failed batch raises.
+    """
+
+    def __init__(self, session_manager, workers, threads=None,
+                 max_batch=INFERENCE_WORKER_MAX_BATCH,
+                 start_timeout=INFERENCE_WORKER_START_TIMEOUT,
+                 run_timeout=INFERENCE_WORKER_RUN_TIMEOUT):
+        self.session_manager = session_manager
+        self.workers = max(1, workers)
+        self.threads = threads or thread_budget(self.workers)
+        self.max_batch = max(1, max_batch)
+        self.start_timeout = start_timeout
+        self.run_timeout = run_timeout
+
+        self._idle = queue.Queue()
+        self._all = []
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def _new_worker(self, index):
+        # Read at start time: ensure_model_exists may switch to the FP32 model
+        return _Worker(
+            index, self.session_manager.model_path,
+            self.session_manager.input_width, self.session_manager.input_height,
+            self.max_batch, self.threads
+        )
+
+    def start(self):
+        """Start every worker and wait until they have loaded the model"""
+        with self._start_lock:
+            if self._started:
+                return
+            workers = [self._new_worker(index) for index in range(self.workers)]
+            errors = []
+
+            def start(worker):
+                try:
+                    worker.start(self.start_timeout)
+                except Exception as e:
+                    errors.append(e)
+
+            # Workers load and warm up their sessions in parallel
+            threads = [threading.Thread(target=start, args=(w,)) for w in workers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(self.start_timeout)
+            if errors or any(thread.is_alive() for thread in threads):
+                for worker in workers:
+                    worker.close()
+                raise RuntimeError(
+                    f"Inference workers failed to start: {errors or 'timeout'}"
+                )
+            for worker in workers:
+                self._all.append(worker)
+                self._idle.put(worker)
+            self._started = True
+            logger.info(
+                f"Inference worker pool started: workers={self.workers}, "
+                f"threads per worker={self.threads}, max batch={self.max_batch}"
+            )
+
+    def stop(self):
+        with self._start_lock:
+            for worker in self._all:
+                worker.close()
+            self._all = []
+            self._idle = queue.Queue()
+            self._started = False
+
+    def current(self):
+        """The pool is its own model handle (SessionManager interface)"""
+        if not self._started:
+            self.start()
+        return self
+
+    @property
+    def version(self):
+        # Workers reload independently; mixed versions show up joined
+        return "+".join(sorted({str(worker.version) for worker in self._all}))
+
+    def run(self, blob):
+        """Run a (n, 3, H, W) blob on idle workers and return the outputs"""
+        if not self._started:
+            self.start()
+        if blob.shape[0] <= self.max_batch:
+            return self._run_chunk(blob)
+        parts = [
+            self._run_chunk(blob[start:start + self.max_batch])
+            for start in range(0, blob.shape[0], self.max_batch)
+        ]
+        return [np.concatenate(outputs) for outputs in zip(*parts)]
+
+    def _run_chunk(self, blob):
+        # The request (or batch) deadline, else the pool's own limit
+        deadline = current_deadline()
+        if deadline is None and self.run_timeout > 0:
+            deadline = time.perf_counter() + self.run_timeout
+        worker = self._idle.get()
+        try:
+            if not worker.alive():
+                logger.warning(f"Restarting inference worker {worker.index}")
+                worker.close()
+                worker.start(self.start_timeout)
+            return worker.run(blob, deadline)
+        except Exception:
+            if not worker.alive():
+                # Restarted on its next use
+                worker.close()
+            raise
+        finally:
+            self._idle.put(worker)
+
+
+def _worker_main(argv=None):
+    """Worker process: serve batches from the shared input buffer"""
+    parser = argparse.ArgumentParser(description="Inference worker process")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--input-shape", required=True)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--reply-fd", type=int, required=True)
+    args = parser.parse_args(argv)
+
+    # Replies go over their own pipe; anything printed to stdout by the
+    # libraries below ends up in the log instead of the protocol
+    replies = os.fdopen(args.reply_fd, "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - [worker %(process)d] %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+    from session_manager import SessionManager, create_session_options
+
+    def reply(message):
+        replies.write(json.dumps(message) + "\n")
+        replies.flush()
+
+    input_shape = tuple(int(v) for v in args.input_shape.split(","))
+    max_batch, _, input_height, input_width = input_shape
+    try:
+        manager = SessionManager(
+            args.model, input_width, input_height, backend="iobinding",
+            session_options=create_session_options(
+                intra_op_threads=args.threads, inter_op_threads=1
+            )
+        )
+        handle = manager.load()
+        manager.start_watcher()
+        buffers = handle.output_buffers(1)
+        if buffers is None:
+            raise ValueError("Worker processes need a model with static output shapes")
+        inputs = _shared_array(args.input, input_shape, np.float32)
+    except Exception as e:
+        reply({"error": f"{type(e).__name__}: {e}"})
+        return 1
+
+    reply({
+        "version": handle.version,
+        "outputs": [[list(b.shape[1:]), b.dtype.str] for b in buffers],
+    })
+    attach = json.loads(sys.stdin.readline())
+    outputs = [
+        _shared_array(path, (max_batch,) + b.shape[1:], b.dtype)
+        for path, b in zip(attach["outputs"], buffers)
+    ]
+    reply({"attached": True})
+
+    for line in sys.stdin:
+        size = json.loads(line)["run"]
+        try:
+            handle = manager.current()
+            # IOBinding writes the results straight into shared memory
+            handle.run(inputs[:size], [output[:size] for output in outputs])
+            reply({"version": handle.version})
+        except Exception as e:
+            reply({"error": f"{type(e).__name__}: {e}"})
+    manager.stop_watcher()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_worker_main())
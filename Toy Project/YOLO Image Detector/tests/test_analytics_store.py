@@ -0,0 +1,87 @@
+import pytest
+
+import analytics_store
+from analytics_store import RollupStore, create_analytics_store, detection_request
+
+
+def request(username, timestamp, detections, latency_ms):
+    return detection_request(username, timestamp, [
+        {"class_name": class_name, "confidence": confidence, "box": [0, 0, width, height]}
+        for class_name, confidence, width, height in detections
+    ], latency_ms)
+
+
+@pytest.fixture
+def rollups(tmp_path):
+    store = RollupStore(str(tmp_path / "rollups.db"))
+    yield store
+    store.close()
+
+
+def test_batches_are_upserted_into_existing_rows(rollups):
+    rollups.ingest([
+        request("alice", "2024-05-01T13:05:00", [("person", 0.9, 10, 10)], 100.0),
+        request("alice", "2024-05-01T13:40:00", [("dog", 0.6, 20, 5)], 300.0),
+    ])
+    # A later batch for the same hour and user updates the same rows
+    rollups.ingest([
+        request("alice", "2024-05-01T13:59:00", [("person", 0.5, 4, 5)], 50.0),
+        request("bob", "2024-05-01T14:01:00", [], 20.0),
+    ])
+
+    assert rollups.hourly() == [
+        {"hour": "2024-05-01T13", "requests": 3, "detections": 3,
+         "avg_latency_ms": 150.0, "max_latency_ms": 300.0},
+        {"hour": "2024-05-01T14", "requests": 1, "detections": 0,
+         "avg_latency_ms": 20.0, "max_latency_ms": 20.0},
+    ]
+    assert rollups.classes() == [
+        {"class_name": "person", "detections": 2, "avg_confidence": 0.7,
+         "min_confidence": 0.5, "max_confidence": 0.9, "avg_box_area": 60.0},
+        {"class_name": "dog", "detections": 1, "avg_confidence": 0.6,
+         "min_confidence": 0.6, "max_confidence": 0.6, "avg_box_area": 100.0},
+    ]
+
+
+def test_user_class_rollup_tracks_first_and_last_hour(rollups):
+    rollups.ingest([request("alice", "2024-05-02T09:00:00", [("cat", 0.8, 2, 2)], 10.0)])
+    rollups.ingest([request("alice", "2024-05-01T22:00:00", [("cat", 0.4, 4, 4)], 10.0)])
+    assert rollups.classes(username="alice") == [
+        {"class_name": "cat", "detections": 2, "avg_confidence": 0.6,
+         "avg_box_area": 10.0, "first_hour": "2024-05-01T22",
+         "last_hour": "2024-05-02T09"},
+    ]
+
+
+def test_ranges_and_user_filters(rollups):
+    rollups.ingest([
+        request("alice", "2024-05-01T10:00:00", [("car", 0.9, 1, 1)], 10.0),
+        request("bob", "2024-05-03T10:00:00", [("car", 0.7, 1, 1), ("bus", 0.8, 1, 1)], 30.0),
+    ])
+    assert [row["hour"] for row in rollups.hourly(start="2024-05-02T00")] == ["2024-05-03T10"]
+    assert [row["hour"] for row in rollups.hourly(username="alice")] == ["2024-05-01T10"]
+    assert [(row["username"], row["detections"]) for row in rollups.users()] == [
+        ("bob", 2), ("alice", 1)
+    ]
+
+
+def test_none_format_keeps_only_the_rollups(tmp_path):
+    store = create_analytics_store("none", str(tmp_path))
+    store.append_many([request("alice", "2024-05-01T13:00:00", [("person", 0.9, 1, 1)], 5.0)])
+    assert store.events is None
+    assert store.rollups.users()[0]["detections"] == 1
+    store.close()
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown analytics events format"):
+        create_analytics_store("csv", str(tmp_path))
+
+
+def test_missing_format_package_fails_instead_of_dropping_events(tmp_path, monkeypatch):
+    def missing(directory):
+        raise ImportError("No module named 'pyarrow'")
+
+    monkeypatch.setitem(analytics_store.EVENT_SINKS, "parquet", missing)
+    with pytest.raises(RuntimeError, match="ANALYTICS_EVENTS_FORMAT=none"):
+        create_analytics_store("parquet", str(tmp_path))
@@ -0,0 +1,147 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from batching import (
+    BatchScheduler, DeadlineExceededError, QueueFullError, current_deadline,
+    request_deadline
+)
+
+
+class GatedBackend:
+    """Session stand-in whose run() blocks until released and echoes the blob"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.batch_sizes = []
+        self.deadlines = []
+
+    def current(self):
+        return self
+
+    def run(self, blob):
+        self.batch_sizes.append(blob.shape[0])
+        self.deadlines.append(current_deadline())
+        self.started.set()
+        self.release.wait(10)
+        return [blob.copy()]
+
+
+def blob(value):
+    return np.full((1, 3, 4, 4), value, dtype=np.float32)
+
+
+@pytest.fixture
+def backend():
+    backend = GatedBackend()
+    yield backend
+    backend.release.set()
+
+
+def scheduler_for(backend, **options):
+    scheduler = BatchScheduler(backend, max_wait_ms=0, stats_log_every=0, **options)
+    shed = []
+    scheduler.on_shed = lambda reason, count: shed.append((reason, count))
+    return scheduler, shed
+
+
+def test_each_caller_gets_its_own_slice(backend):
+    backend.release.set()
+    scheduler, _ = scheduler_for(backend, max_batch_size=4)
+    scheduler.max_wait = 0.2
+    futures = [scheduler.submit(blob(value)) for value in (1, 2, 3)]
+    for value, future in zip((1, 2, 3), futures):
+        np.testing.assert_array_equal(future.result(5)[0], blob(value))
+    scheduler.stop()
+    assert sum(backend.batch_sizes) == 3
+
+
+def test_full_queue_sheds_new_requests(backend):
+    scheduler, shed = scheduler_for(backend, max_batch_size=1, max_queue_depth=2)
+    running = scheduler.submit(blob(0))
+    assert backend.started.wait(5)
+    queued = [scheduler.submit(blob(1)), scheduler.submit(blob(2))]
+
+    with pytest.raises(QueueFullError):
+        scheduler.submit(blob(3))
+    assert shed == [("queue_full", 1)]
+    assert scheduler.stats()["shed_queue_full"] == 1
+
+    backend.release.set()
+    for future in [running] + queued:
+        future.result(5)
+    # Dequeued requests free their slots again
+    scheduler.submit(blob(4)).result(5)
+    scheduler.stop()
+
+
+def test_concurrent_submitters_never_overshoot_the_limit(backend):
+    scheduler, shed = scheduler_for(backend, max_batch_size=1, max_queue_depth=4)
+    running = scheduler.submit(blob(0))
+    assert backend.started.wait(5)
+
+    admitted, barrier = [], threading.Barrier(16)
+
+    def submit():
+        barrier.wait()
+        try:
+            admitted.append(scheduler.submit(blob(1)))
+        except QueueFullError:
+            pass
+
+    threads = [threading.Thread(target=submit) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(admitted) == 4
+    assert scheduler.queue_depth() == 4
+    assert sum(count for _, count in shed) == 12
+
+    backend.release.set()
+    for future in [running] + admitted:
+        future.result(5)
+    scheduler.stop()
+
+
+def test_expired_requests_are_cancelled_before_running(backend):
+    scheduler, shed = scheduler_for(backend, max_batch_size=1)
+    running = scheduler.submit(blob(0))
+    assert backend.started.wait(5)
+    with request_deadline(0.05):
+        expired = scheduler.submit(blob(1))
+    fresh = scheduler.submit(blob(2))
+    time.sleep(0.1)
+
+    backend.release.set()
+    with pytest.raises(DeadlineExceededError):
+        expired.result(5)
+    np.testing.assert_array_equal(fresh.result(5)[0], blob(2))
+    running.result(5)
+    scheduler.stop()
+    assert shed == [("expired", 1)]
+    # Only the two live requests reached the backend
+    assert backend.batch_sizes == [1, 1]
+
+
+def test_batch_runs_with_the_latest_deadline_of_its_requests(backend):
+    backend.release.set()
+    scheduler, _ = scheduler_for(backend, max_batch_size=1)
+    deadline = time.perf_counter() + 30
+    scheduler.submit(blob(0), deadline=deadline).result(5)
+    scheduler.submit(blob(1)).result(5)
+    scheduler.stop()
+    assert backend.deadlines == [deadline, None]
+
+
+def test_request_deadline_nests_to_the_earliest():
+    with request_deadline(10):
+        outer = current_deadline()
+        with request_deadline(60):
+            assert current_deadline() == outer
+        with request_deadline(1):
+            assert current_deadline() < outer
+    assert current_deadline() is None
@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+
+from dedup_cache import DedupCache, detections_agree, hamming_distance, perceptual_hash
+
+SHAPE = (480, 640, 3)
+TAG = ("yolov5m@640", "v1")
+
+
+def photo(seed=0):
+    """Smooth synthetic picture (blurred noise), like a photo's gradients"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    return cv2.resize(small, (SHAPE[1], SHAPE[0]), interpolation=cv2.INTER_CUBIC)
+
+
+def predictions(confidence=0.9):
+    rows = np.zeros((1, 3, 85), dtype=np.float32)
+    rows[0, :, :4] = [320, 240, 50, 40]
+    rows[0, :, 4] = confidence
+    rows[0, :, 5] = confidence
+    return rows
+
+
+def detection(class_id, box):
+    return {"class_id": class_id, "box": box}
+
+
+def test_hash_survives_reencoding_and_resizing():
+    img = photo()
+    _, jpeg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 60])
+    reencoded = cv2.resize(cv2.imdecode(jpeg, cv2.IMREAD_COLOR), (320, 240))
+    assert hamming_distance(perceptual_hash(img), perceptual_hash(reencoded)) <= 6
+    assert hamming_distance(perceptual_hash(img), perceptual_hash(photo(1))) > 6
+
+
+def test_near_hashes_match_and_far_ones_do_not():
+    cache = DedupCache(max_distance=6, max_bytes=1 << 20, min_confidence=0.1)
+    image_hash = perceptual_hash(photo())
+    cache.put(image_hash, SHAPE, TAG, predictions())
+
+    entry, distance = cache.lookup(image_hash ^ 0b10110, SHAPE, TAG)
+    assert distance == 3
+    assert entry.image_hash == image_hash
+    assert cache.lookup(image_hash ^ 0b1111111, SHAPE, TAG) is None
+    # Other models and other framings never match
+    assert cache.lookup(image_hash, SHAPE, ("yolov5n@320", "v1")) is None
+    assert cache.lookup(image_hash, (480, 720, 3), TAG) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_nearest_entry_wins_and_exact_reuploads_replace():
+    cache = DedupCache(max_distance=6, max_bytes=1 << 20, min_confidence=0.1)
+    image_hash = perceptual_hash(photo())
+    cache.put(image_hash ^ 0b111, SHAPE, TAG, predictions(0.5))
+    cache.put(image_hash ^ 0b1, SHAPE, TAG, predictions(0.6))
+    cache.put(image_hash ^ 0b1, SHAPE, TAG, predictions(0.7))
+    assert cache.stats()["entries"] == 2
+
+    entry, distance = cache.lookup(image_hash, SHAPE, TAG)
+    assert distance == 1
+    assert entry.predictions[0, 0, 4] == np.float32(0.7)
+
+
+def test_cache_stays_under_its_byte_limit():
+    # Hashes at least 32 bits apart from each other
+    hashes = [0, 0xFFFFFFFF00000000, 0x00000000FFFFFFFF, 0xFFFF0000FFFF0000]
+    cache = DedupCache(max_distance=2, max_bytes=1 << 20, min_confidence=0.1)
+    cache.put(hashes[0], SHAPE, TAG, predictions())
+    cache.max_bytes = cache.stats()["bytes"] * 2
+    for image_hash in hashes[1:]:
+        cache.put(image_hash, SHAPE, TAG, predictions())
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    # Least recently used first
+    assert cache.lookup(hashes[0], SHAPE, TAG) is None
+    assert cache.lookup(hashes[1], SHAPE, TAG) is None
+    assert cache.lookup(hashes[3], SHAPE, TAG) is not None
+
+
+def test_false_matches_are_counted_and_dropped():
+    cache = DedupCache(max_distance=6, max_bytes=1 << 20, min_confidence=0.1,
+                       verify_rate=1.0)
+    cache.put(42, SHAPE, TAG, predictions())
+    entry, distance = cache.lookup(43, SHAPE, TAG)
+    assert cache.should_verify()
+
+    cache.record_verification(entry, distance, agreed=True)
+    assert cache.lookup(43, SHAPE, TAG) is not None
+    cache.record_verification(entry, distance, agreed=False)
+    assert cache.lookup(43, SHAPE, TAG) is None
+    stats = cache.stats()
+    assert (stats["verified"], stats["false_matches"]) == (2, 1)
+    assert stats["false_match_rate"] == 0.5
+    assert not DedupCache(verify_rate=0).should_verify()
+
+
+def test_detections_agree_by_class_and_overlap():
+    cached = [detection(0, [100, 100, 50, 80]), detection(16, [300, 200, 40, 40])]
+    shifted = [detection(16, [302, 201, 40, 40]), detection(0, [104, 102, 50, 80])]
+    assert detections_agree(cached, shifted)
+    assert not detections_agree(cached, shifted[:1])
+    assert not detections_agree(cached, [detection(0, [300, 200, 40, 40]), shifted[1]])
+    assert not detections_agree(cached, [detection(16, [400, 300, 40, 40]), shifted[1]])
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+import pytest
+
+import image_decode
+from image_decode import ImageHeader, decode_image, read_header, reduction_factor
+
+
+def encode(extension, width, height):
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[:, : width // 2] = (0, 0, 255)
+    ok, data = cv2.imencode(extension, img)
+    assert ok
+    return data.tobytes()
+
+
+@pytest.mark.parametrize("extension, image_format", [
+    (".jpg", "jpeg"), (".png", "png"), (".bmp", "bmp"),
+])
+def test_header_gives_format_and_size(extension, image_format):
+    header = read_header(encode(extension, 321, 123))
+    assert header == ImageHeader(image_format, 321, 123)
+
+
+def test_webp_is_recognised_without_a_size():
+    header = read_header(encode(".webp", 64, 32))
+    assert header == ImageHeader("webp", None, None)
+
+
+def test_jpeg_size_is_found_after_other_segments():
+    data = encode(".jpg", 200, 100)
+    # An extra APP1 segment between SOI and the frame header
+    app1 = b"\xff\xe1" + (2 + 10).to_bytes(2, "big") + b"\x00" * 10
+    assert read_header(data[:2] + app1 + data[2:]) == ImageHeader("jpeg", 200, 100)
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"GIF89a" + b"\x00" * 32, "Unsupported image format"),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "Truncated JPEG header"),
+    (b"\x89PNG\r\n\x1a\n" + b"\x00" * 8, "Corrupt PNG header"),
+])
+def test_bad_headers_are_rejected(data, message):
+    with pytest.raises(ValueError, match=message):
+        read_header(data)
+
+
+def test_oversized_images_are_rejected_before_decoding(monkeypatch):
+    monkeypatch.setattr(image_decode, "DECODE_MAX_PIXELS", 100 * 100)
+    with pytest.raises(ValueError, match="Image too large"):
+        read_header(encode(".png", 101, 100))
+
+
+@pytest.mark.parametrize("long_side, target_side, factor", [
+    (4000, 640, 4),
+    (5120, 640, 8),
+    (1279, 640, 1),
+    (1280, 640, 2),
+    (4000, 0, 1),
+])
+def test_reduction_factor_keeps_the_long_side_above_the_target(long_side, target_side, factor):
+    header = ImageHeader("jpeg", long_side, long_side // 2)
+    assert reduction_factor(header, target_side) == factor
+
+
+def test_only_jpegs_are_reduced():
+    assert reduction_factor(ImageHeader("png", 4000, 3000), 640) == 1
+
+
+def test_reduced_decode_reports_the_original_size():
+    data = encode(".jpg", 2600, 1300)
+    img, original_size = decode_image(data, target_side=640, max_side=0)
+    # 2600 // 4 still covers a 640 input
+    assert img.shape[:2] == (325, 650)
+    assert original_size == (2600, 1300)
+    # RGB order: the left half was encoded as BGR red
+    assert img[160, 100].tolist()[0] > 200
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+
+from letterbox import (
+    PAD_VALUE, BlobBuffers, letterbox_blob, letterbox_geometry, letterbox_image
+)
+
+
+def test_geometry_keeps_aspect_ratio_and_centres_the_image():
+    geometry = letterbox_geometry(1280, 720, 640, 640)
+    assert (int(geometry.resized_width), int(geometry.resized_height)) == (640, 360)
+    assert (int(geometry.pad_x), int(geometry.pad_y)) == (0, 140)
+    assert float(geometry.x_factor) == float(geometry.y_factor) == 2.0
+
+
+def test_geometry_of_an_array_of_sizes_matches_scalars():
+    widths, heights = np.array([1280, 300, 641]), np.array([720, 900, 479])
+    batch = letterbox_geometry(widths, heights, 640, 640)
+    for i, (width, height) in enumerate(zip(widths, heights)):
+        single = letterbox_geometry(width, height, 640, 640)
+        for field in single._fields:
+            assert getattr(batch, field)[i] == getattr(single, field)
+
+
+def test_geometry_maps_the_image_corners_back_exactly():
+    # Odd sizes round the resized size; per-axis factors undo it
+    width, height = 1001, 333
+    geometry = letterbox_geometry(width, height, 640, 640)
+    # Bottom-right corner of the image area in model pixels
+    model_x = geometry.pad_x + geometry.resized_width
+    model_y = geometry.pad_y + geometry.resized_height
+    assert float((model_x - geometry.pad_x) * geometry.x_factor) == width
+    assert float((model_y - geometry.pad_y) * geometry.y_factor) == height
+
+
+def test_blob_pads_with_grey_and_normalizes_the_image():
+    img = np.full((100, 200, 3), 255, dtype=np.uint8)
+    blob = letterbox_blob(img, 64, 64)
+    assert blob.shape == (1, 3, 64, 64) and blob.dtype == np.float32
+    # 200x100 -> 64x32, padded by 16 rows above and below
+    np.testing.assert_allclose(blob[0, :, :16], PAD_VALUE / 255.0, rtol=1e-6)
+    np.testing.assert_allclose(blob[0, :, 48:], PAD_VALUE / 255.0, rtol=1e-6)
+    np.testing.assert_allclose(blob[0, :, 16:48], 1.0)
+
+
+def test_blob_matches_the_uint8_canvas():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (90, 130, 3), dtype=np.uint8)
+    canvas = letterbox_image(img, 64, 64)
+    blob = letterbox_blob(img, 64, 64)
+    expected = canvas.transpose(2, 0, 1).astype(np.float32) / 255.0
+    np.testing.assert_allclose(blob[0], expected, atol=1e-6)
+
+
+def test_blob_is_written_into_the_given_buffer():
+    out = np.full((1, 3, 32, 32), -1, dtype=np.float32)
+    result = letterbox_blob(np.zeros((32, 16, 3), dtype=np.uint8), 32, 32, out=out)
+    assert result is out
+    assert (out >= 0).all()
+
+
+def test_buffers_are_reused_per_thread():
+    buffers = BlobBuffers(32, 32, max_retained=2)
+    first = buffers.get(1)
+    assert buffers.get(1).base is first.base
+    # Growing to the retained maximum replaces the buffer once
+    pair = buffers.get(2)
+    assert pair.shape == (2, 3, 32, 32)
+    assert buffers.get(1).base is pair.base
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(buffers.get(1)))
+    thread.start()
+    thread.join()
+    assert other[0].base is not pair.base
+
+
+def test_batches_beyond_the_retained_size_get_a_temporary_buffer():
+    buffers = BlobBuffers(32, 32, max_retained=1)
+    retained = buffers.get(1)
+    chunk = buffers.get(4)
+    assert chunk.shape == (4, 3, 32, 32)
+    assert chunk.base is not retained.base
+    assert buffers.get(1).base is retained.base
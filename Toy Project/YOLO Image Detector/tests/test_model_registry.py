@@ -0,0 +1,130 @@
+import pytest
+
+from model_registry import ModelRegistry, RegisteredModel, parse_registry
+
+MB = 1024 * 1024
+
+
+class FakeSessionManager:
+    """Counts loads and unloads of a weight file of a given size"""
+
+    def __init__(self, path):
+        self.model_path = str(path)
+        self.loaded = False
+        self.loads = 0
+
+    def current(self):
+        if not self.loaded:
+            self.loaded = True
+            self.loads += 1
+        return self
+
+    def unload(self):
+        self.loaded = False
+
+
+def model(tmp_path, name, input_size, size_mb=1):
+    path = tmp_path / f"{name}-{input_size}.onnx"
+    path.write_bytes(b"\0" * int(size_mb * MB))
+    return RegisteredModel(name, input_size, FakeSessionManager(path))
+
+
+@pytest.fixture
+def models(tmp_path):
+    return {
+        "n": model(tmp_path, "yolov5n", 320),
+        "s": model(tmp_path, "yolov5s", 480),
+        "m": model(tmp_path, "yolov5m", 640),
+        "l": model(tmp_path, "yolov5l", 640),
+    }
+
+
+def registry_for(models, **options):
+    return ModelRegistry(
+        [models["n"], models["s"], models["l"]], models["m"], **options
+    )
+
+
+def test_parse_registry():
+    assert parse_registry("yolov5n@320, yolov5s@480,yolov5m") == [
+        ("yolov5n", 320), ("yolov5s", 480), ("yolov5m", 640)
+    ]
+    with pytest.raises(ValueError, match="Unknown model"):
+        parse_registry("yolov8n@640")
+    with pytest.raises(ValueError, match="multiple of 32"):
+        parse_registry("yolov5n@300")
+
+
+def test_routes_by_key_tier_and_default(models):
+    registry = registry_for(models)
+    assert [m.key for m in registry.models] == [
+        "yolov5n@320", "yolov5s@480", "yolov5m@640", "yolov5l@640"
+    ]
+    assert registry.route() is models["m"]
+    assert registry.route(model="yolov5s@480") is models["s"]
+    assert registry.route(quality="fast") is models["n"]
+    assert registry.route(quality="balanced") is models["s"]
+    assert registry.route(quality="best") is models["l"]
+    with pytest.raises(ValueError):
+        registry.route(quality="ultra")
+    with pytest.raises(ValueError):
+        registry.route(model="yolov5x@640")
+
+
+def test_latency_budget_picks_the_largest_model_that_fits(models):
+    registry = registry_for(models, ms_per_gflop=1)
+    # Unmeasured models are estimated from GFLOPs; never above the default
+    assert registry.route(latency_budget_ms=1000) is models["m"]
+    assert registry.route(latency_budget_ms=20) is models["s"]
+    # Nothing fits: the cheapest model
+    assert registry.route(latency_budget_ms=0.1) is models["n"]
+
+    # A slow measurement on the default moves budgeted requests down
+    registry.observe(models["m"], 0.5)
+    assert registry.route(latency_budget_ms=200) is models["s"]
+    # The quality tier still allows models above the default
+    assert registry.route(latency_budget_ms=2000, quality="best") is models["l"]
+
+
+def test_stale_measurements_fall_back_to_the_estimate(models):
+    registry = registry_for(models, stale_after=0)
+    registry.observe(models["s"], 0.5)
+    estimate = registry.expected_latency(models["s"], now=models["s"].measured_at + 1)
+    # Scaled from the best measured speed instead of the slow average
+    assert estimate == pytest.approx(0.5)
+    registry.observe(models["n"], 0.001)
+    estimate = registry.expected_latency(models["s"], now=models["s"].measured_at + 1)
+    assert estimate < 0.5
+
+
+def test_least_recently_used_models_are_evicted(models):
+    registry = registry_for(models, max_bytes=int(2.5 * MB))
+    for key in ("m", "n", "s"):
+        registry.release(registry.acquire(models[key]))
+    # m (default) + n + s = 3 MB > 2.5 MB: n was used least recently
+    assert not models["n"].session_manager.loaded
+    assert models["s"].session_manager.loaded
+    assert models["m"].session_manager.loaded
+    assert registry.cached_bytes() == 2 * MB
+
+    # Reloaded on its next use, evicting s this time
+    registry.release(registry.acquire(models["n"]))
+    assert models["n"].session_manager.loads == 2
+    assert not models["s"].session_manager.loaded
+
+
+def test_default_and_pinned_models_are_never_evicted(models):
+    registry = registry_for(models, max_bytes=1 * MB)
+    registry.release(registry.acquire(models["m"]))
+    pinned = registry.acquire(models["n"])
+    registry.acquire(models["s"])
+    # Over the limit, but all three are in use or the default
+    assert all(models[key].session_manager.loaded for key in ("m", "n", "s"))
+
+    registry.release(pinned)
+    assert not models["n"].session_manager.loaded
+    assert models["s"].session_manager.loaded
+    registry.release(models["s"])
+    assert not models["s"].session_manager.loaded
+    assert models["m"].session_manager.loaded
+    assert registry.stats()["yolov5m@640"]["weights_mb"] == 1.0
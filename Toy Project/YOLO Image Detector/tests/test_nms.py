@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+from nms import batched_nms, non_max_suppression
+
+# Two overlapping clusters plus a lone box, [left, top, width, height]
+BOXES = np.array([
+    [100, 100, 50, 80],
+    [104, 102, 50, 80],
+    [110, 96, 48, 78],
+    [300, 200, 60, 60],
+    [305, 205, 60, 60],
+    [500, 50, 20, 20],
+    [98, 108, 52, 70],
+], dtype=np.int32)
+SCORES = np.array([0.90, 0.85, 0.60, 0.70, 0.95, 0.40, 0.75], dtype=np.float32)
+CLASS_IDS = np.array([0, 0, 16, 2, 2, 5, 16])
+
+
+def test_class_agnostic_matches_opencv():
+    for iou_threshold in (0.3, 0.45, 0.7):
+        for score_threshold in (0.0, 0.5):
+            expected = cv2.dnn.NMSBoxes(
+                BOXES.tolist(), SCORES.tolist(), score_threshold, iou_threshold
+            )
+            keep, kept_scores = non_max_suppression(
+                BOXES, SCORES, CLASS_IDS, iou_threshold, score_threshold,
+                class_agnostic=True, top_k=0, max_det=0, soft=False
+            )
+            assert keep.tolist() == np.asarray(expected).reshape(-1).tolist()
+            np.testing.assert_array_equal(kept_scores, SCORES[keep])
+
+
+def test_class_aware_keeps_overlapping_boxes_of_other_classes():
+    # A person box and a dog box almost on top of each other
+    boxes = np.array([[100, 100, 50, 80], [102, 101, 50, 80]])
+    scores = np.array([0.9, 0.8], dtype=np.float32)
+    class_ids = np.array([0, 16])
+
+    keep, _ = non_max_suppression(
+        boxes, scores, class_ids, 0.45, class_agnostic=False, soft=False
+    )
+    assert keep.tolist() == [0, 1]
+
+    keep, _ = non_max_suppression(
+        boxes, scores, class_ids, 0.45, class_agnostic=True, soft=False
+    )
+    assert keep.tolist() == [0]
+
+
+def test_class_aware_still_suppresses_within_a_class():
+    keep, kept_scores = non_max_suppression(
+        BOXES, SCORES, CLASS_IDS, 0.45, class_agnostic=False, top_k=0,
+        max_det=0, soft=False
+    )
+    # One box per overlapping same-class cluster, highest score first
+    assert keep.tolist() == [4, 0, 6, 5]
+    np.testing.assert_array_equal(kept_scores, SCORES[[4, 0, 6, 5]])
+
+
+def test_max_det_and_batched_input():
+    keep, _ = non_max_suppression(
+        BOXES, SCORES, CLASS_IDS, 0.45, class_agnostic=False, top_k=0,
+        max_det=2, soft=False
+    )
+    assert keep.tolist() == [4, 0]
+
+    empty = (np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.float32),
+             np.empty(0, dtype=np.int64))
+    results = batched_nms(
+        [(BOXES, SCORES, CLASS_IDS), empty], 0.45, class_agnostic=False,
+        top_k=0, max_det=0, soft=False
+    )
+    assert results[0][0].tolist() == [4, 0, 6, 5]
+    assert len(results[1][0]) == 0
+
+
+def test_batched_single_pass_matches_per_image():
+    # The same boxes in every image must not suppress each other across images
+    shifted = BOXES + np.array([3, -2, 0, 0], dtype=np.int32)
+    decoded = [(BOXES, SCORES, CLASS_IDS), (shifted, SCORES[::-1].copy(), CLASS_IDS)]
+    for options in (
+        dict(class_agnostic=False, top_k=0, max_det=0, soft=False),
+        dict(class_agnostic=True, top_k=4, max_det=2, soft=False),
+        dict(class_agnostic=False, top_k=0, max_det=3, soft=True),
+    ):
+        results = batched_nms(decoded, 0.45, 0.3, **options)
+        for (boxes, scores, class_ids), (keep, kept_scores) in zip(decoded, results):
+            expected, expected_scores = non_max_suppression(
+                boxes, scores, class_ids, 0.45, 0.3, **options
+            )
+            assert keep.tolist() == expected.tolist()
+            np.testing.assert_allclose(kept_scores, expected_scores)
@@ -0,0 +1,80 @@
+import numpy as np
+
+from postprocess import decode_predictions
+
+NUM_CLASSES = 80
+
+
+def decode_loop(predictions, confidence_threshold, x_factor, y_factor):
+    """The per-row loop decode_predictions replaced"""
+    boxes, confidences, class_ids = [], [], []
+    for prediction in predictions[0]:
+        confidence = prediction[4]
+        if confidence >= confidence_threshold:
+            class_scores = prediction[5:]
+            class_id = np.argmax(class_scores)
+            if class_scores[class_id] > confidence_threshold:
+                cx, cy, w, h = prediction[0:4]
+                left = int((cx - w / 2) * x_factor)
+                top = int((cy - h / 2) * y_factor)
+                width = int(w * x_factor)
+                height = int(h * y_factor)
+                boxes.append([left, top, width, height])
+                confidences.append(float(confidence))
+                class_ids.append(class_id)
+    return boxes, confidences, class_ids
+
+
+def make_predictions():
+    rows = []
+
+    def row(cx, cy, w, h, objectness, class_id, class_score):
+        scores = [0.01] * NUM_CLASSES
+        scores[class_id] = class_score
+        rows.append([cx, cy, w, h, objectness] + scores)
+
+    row(320.0, 240.0, 100.0, 50.0, 0.90, 0, 0.80)   # kept
+    row(10.5, 20.25, 30.0, 41.5, 0.50, 16, 0.60)    # kept, fractional coords
+    row(100.0, 100.0, 20.0, 20.0, 0.20, 2, 0.90)    # objectness too low
+    row(200.0, 200.0, 40.0, 40.0, 0.60, 3, 0.25)    # class score too low
+    row(5.0, 5.0, 30.0, 30.0, 0.25, 5, 0.70)        # objectness == threshold
+    row(50.0, 60.0, 12.0, 14.0, 0.70, 7, 0.25)      # class score == threshold
+    row(630.0, 635.0, 60.0, 30.0, 0.99, 79, 0.95)   # kept, crosses the edge
+    return np.array([rows], dtype=np.float32)
+
+
+def assert_matches_loop(predictions, threshold, x_factor, y_factor):
+    expected_boxes, expected_scores, expected_classes = decode_loop(
+        predictions, threshold, x_factor, y_factor
+    )
+    [(boxes, scores, class_ids)] = decode_predictions(
+        predictions, threshold, x_factor, y_factor
+    )
+    assert boxes.tolist() == expected_boxes
+    np.testing.assert_array_equal(scores, np.array(expected_scores, dtype=np.float32))
+    assert class_ids.tolist() == expected_classes
+
+
+def test_decode_matches_per_row_loop():
+    predictions = make_predictions()
+    assert_matches_loop(predictions, 0.25, 2.0, 1.5)
+    assert_matches_loop(predictions, 0.25, 1.0, 1.0)
+
+
+def test_decode_keeps_threshold_edge_cases_of_loop():
+    [(boxes, scores, class_ids)] = decode_predictions(make_predictions(), 0.25, 1.0, 1.0)
+    # objectness uses >=, the class score a strict >
+    assert class_ids.tolist() == [0, 16, 5, 79]
+    assert boxes[0].tolist() == [270, 215, 100, 50]
+
+
+def test_decode_batch_splits_per_image():
+    single = make_predictions()
+    empty = np.zeros_like(single)
+    batch = np.concatenate([single, empty, single])
+    decoded = decode_predictions(batch, 0.25, [1.0, 1.0, 2.0], [1.0, 1.0, 1.5])
+    assert [len(boxes) for boxes, _, _ in decoded] == [4, 0, 4]
+    assert_matches_loop(batch[2:], 0.25, 2.0, 1.5)
+    np.testing.assert_array_equal(
+        decoded[2][0], decode_predictions(single, 0.25, 2.0, 1.5)[0][0]
+    )
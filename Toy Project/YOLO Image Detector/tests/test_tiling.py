@@ -0,0 +1,71 @@
+import numpy as np
+
+from tiling import merge_tile_detections, seam_mask, tile_windows
+
+WIDTH, HEIGHT = 1152, 640
+
+
+def gather(tile_boxes):
+    """Concatenate per-window (window, boxes, scores, class_ids) into merge input"""
+    boxes, scores, class_ids, on_seam = [], [], [], []
+    for window, window_boxes, window_scores, window_classes in tile_boxes:
+        window_boxes = np.array(window_boxes)
+        boxes.append(window_boxes)
+        scores.extend(window_scores)
+        class_ids.extend(window_classes)
+        on_seam.append(seam_mask(window_boxes, window, WIDTH, HEIGHT))
+    return np.concatenate(boxes), scores, class_ids, np.concatenate(on_seam)
+
+
+def test_windows_overlap_and_cover_the_image():
+    windows = tile_windows(WIDTH, HEIGHT, tile_size=640, overlap=0.2)
+    assert windows == [(0, 0, 640, 640), (512, 0, 640, 640)]
+
+
+def test_box_split_across_two_tiles_is_merged():
+    left_tile, right_tile = tile_windows(WIDTH, HEIGHT, tile_size=640, overlap=0.2)
+    # A car spanning x 500..800 is cut at x=640 in the left tile and at
+    # x=512 in the right one; a person lies inside the left tile only
+    boxes, scores, class_ids, on_seam = gather([
+        (left_tile, [[500, 200, 140, 100], [100, 100, 50, 120]], [0.8, 0.9], [2, 0]),
+        (right_tile, [[512, 200, 288, 100]], [0.7], [2]),
+    ])
+    assert on_seam.tolist() == [True, False, True]
+
+    merged_boxes, merged_scores, merged_classes = merge_tile_detections(
+        boxes, scores, class_ids, on_seam, 0.25, 0.45
+    )
+    assert merged_boxes.tolist() == [[100, 100, 50, 120], [500, 200, 300, 100]]
+    np.testing.assert_allclose(merged_scores, [0.9, 0.8])
+    assert merged_classes.tolist() == [0, 2]
+
+
+def test_fragments_merge_into_the_full_image_box():
+    left_tile, right_tile = tile_windows(WIDTH, HEIGHT, tile_size=640, overlap=0.2)
+    full_image = (0, 0, WIDTH, HEIGHT)
+    boxes, scores, class_ids, on_seam = gather([
+        (full_image, [[498, 198, 304, 104]], [0.6], [2]),
+        (left_tile, [[500, 200, 140, 100]], [0.8], [2]),
+        (right_tile, [[512, 200, 288, 100]], [0.7], [2]),
+    ])
+
+    merged_boxes, merged_scores, merged_classes = merge_tile_detections(
+        boxes, scores, class_ids, on_seam, 0.25, 0.45
+    )
+    assert merged_boxes.tolist() == [[498, 198, 304, 104]]
+    np.testing.assert_allclose(merged_scores, [0.8])
+    assert merged_classes.tolist() == [2]
+
+
+def test_fragments_of_other_classes_are_not_merged():
+    left_tile, right_tile = tile_windows(WIDTH, HEIGHT, tile_size=640, overlap=0.2)
+    boxes, scores, class_ids, on_seam = gather([
+        (left_tile, [[500, 200, 140, 100]], [0.8], [2]),
+        (right_tile, [[512, 200, 288, 100]], [0.7], [7]),
+    ])
+
+    merged_boxes, _, merged_classes = merge_tile_detections(
+        boxes, scores, class_ids, on_seam, 0.25, 0.45
+    )
+    assert len(merged_boxes) == 2
+    assert sorted(merged_classes.tolist()) == [2, 7]
@@ -0,0 +1,73 @@
+import os
+import signal
+
+import numpy as np
+import onnx
+import pytest
+from onnx import TensorProto, helper
+
+from batching import request_deadline
+from session_manager import SessionManager
+from worker_pool import WorkerPool, WorkerTimeoutError
+
+SIZE = 32
+
+
+@pytest.fixture
+def pool(tmp_path):
+    # Identity model: outputs echo the input, so results are easy to check
+    graph = helper.make_graph(
+        [helper.make_node("Identity", ["images"], ["output0"])], "echo",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, SIZE, SIZE])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", 3, SIZE, SIZE])],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    path = str(tmp_path / "echo.onnx")
+    onnx.save(model, path)
+
+    pool = WorkerPool(
+        SessionManager(path, SIZE, SIZE), workers=1, threads=1, max_batch=2,
+        start_timeout=60, run_timeout=1.0
+    )
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def blob(value):
+    return np.full((1, 3, SIZE, SIZE), value, dtype=np.float32)
+
+
+def hang(worker):
+    """Freeze the worker process so it never replies"""
+    os.kill(worker.process.pid, signal.SIGSTOP)
+
+
+def test_runs_in_the_worker(pool):
+    [output] = pool.run(blob(0.5))
+    np.testing.assert_array_equal(output, blob(0.5))
+
+
+def test_hung_worker_is_killed_at_the_request_deadline(pool):
+    [worker] = pool._all
+    hang(worker)
+    with request_deadline(0.3), pytest.raises(WorkerTimeoutError):
+        pool.run(blob(1.0))
+    assert not worker.alive()
+
+    # Restarted on its next use
+    [output] = pool.run(blob(2.0))
+    np.testing.assert_array_equal(output, blob(2.0))
+    assert worker.alive()
+
+
+def test_run_timeout_applies_without_a_deadline(pool):
+    [worker] = pool._all
+    pid = worker.process.pid
+    hang(worker)
+    with pytest.raises(WorkerTimeoutError):
+        pool.run(blob(1.0))
+    assert not worker.alive()
+    pool.run(blob(1.0))
+    assert worker.process.pid != pid